@@ -29,7 +29,10 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 from app.models import (
     users,
-    episodes
+    episodes,
+    leaderboard,
+    images,
+    email,
 
 )
 
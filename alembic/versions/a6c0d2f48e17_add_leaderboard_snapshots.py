@@ -0,0 +1,60 @@
+"""Add leaderboard snapshots
+
+Revision ID: a6c0d2f48e17
+Revises: f19c2e7b5a80
+Create Date: 2026-10-18 14:21:05.417392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6c0d2f48e17'
+down_revision: Union[str, None] = 'f19c2e7b5a80'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'score_checkpoints',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('points', sa.Integer(), nullable=False),
+        sa.Column('no_of_khatmis', sa.Integer(), nullable=False),
+        sa.Column('taken_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_table(
+        'leaderboard_snapshots',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('period', sa.String(), nullable=False),
+        sa.Column('period_start', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('points', sa.Integer(), nullable=False),
+        sa.Column('no_of_khatmis', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_leaderboard_snapshots_window_rank', 'leaderboard_snapshots', ['period', 'period_start', 'rank'], unique=False)
+    op.create_index('ix_leaderboard_snapshots_window_user', 'leaderboard_snapshots', ['period', 'period_start', 'user_id'], unique=True)
+    op.create_index('ix_leaderboard_snapshots_user', 'leaderboard_snapshots', ['user_id', 'period', 'period_start'], unique=False)
+    # Points earned before snapshots existed belong to no window, so every
+    # existing user starts from their current totals. Users created later
+    # have no checkpoint and are counted from zero.
+    op.execute(
+        "INSERT INTO score_checkpoints (user_id, points, no_of_khatmis, taken_at) "
+        "SELECT id, points, no_of_khatmis, CURRENT_TIMESTAMP FROM users"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_leaderboard_snapshots_user', table_name='leaderboard_snapshots')
+    op.drop_index('ix_leaderboard_snapshots_window_user', table_name='leaderboard_snapshots')
+    op.drop_index('ix_leaderboard_snapshots_window_rank', table_name='leaderboard_snapshots')
+    op.drop_table('leaderboard_snapshots')
+    op.drop_table('score_checkpoints')
@@ -0,0 +1,38 @@
+"""Add stored images
+
+Revision ID: b5d17e8f2a64
+Revises: e4b9a7c31f05
+Create Date: 2026-10-18 17:05:52.730418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d17e8f2a64'
+down_revision: Union[str, None] = 'e4b9a7c31f05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stored_images',
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('content_type', sa.String(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('variants', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('released_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('key'),
+    )
+    op.create_index('ix_stored_images_released_at', 'stored_images', ['released_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_stored_images_released_at', table_name='stored_images')
+    op.drop_table('stored_images')
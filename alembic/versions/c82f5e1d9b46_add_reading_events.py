@@ -0,0 +1,41 @@
+"""Add reading events
+
+Revision ID: c82f5e1d9b46
+Revises: a6c0d2f48e17
+Create Date: 2026-10-18 15:03:41.226950
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c82f5e1d9b46'
+down_revision: Union[str, None] = 'a6c0d2f48e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'reading_events',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('client_event_id', sa.String(), nullable=False),
+        sa.Column('episode_id', sa.Integer(), nullable=False),
+        sa.Column('juz', sa.Integer(), nullable=False),
+        sa.Column('read_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['episode_id'], ['episodes.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'client_event_id', name='uq_reading_events_user_client_event'),
+    )
+    op.create_index('ix_reading_events_episode_id', 'reading_events', ['episode_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reading_events_episode_id', table_name='reading_events')
+    op.drop_table('reading_events')
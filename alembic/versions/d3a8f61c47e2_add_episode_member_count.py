@@ -0,0 +1,31 @@
+"""Add episode member count
+
+Revision ID: d3a8f61c47e2
+Revises: b7e41c9a2d35
+Create Date: 2026-10-18 10:02:47.903115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a8f61c47e2'
+down_revision: Union[str, None] = 'b7e41c9a2d35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('episodes', sa.Column('member_count', sa.Integer(), server_default='0', nullable=False))
+    # Backfill from the members table
+    op.execute(
+        "UPDATE episodes SET member_count = "
+        "(SELECT COUNT(members.id) FROM members WHERE members.episode_id = episodes.id)"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('episodes', 'member_count')
@@ -0,0 +1,26 @@
+"""Add user profile image variants
+
+Revision ID: e4b9a7c31f05
+Revises: c82f5e1d9b46
+Create Date: 2026-10-18 16:12:09.583104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b9a7c31f05'
+down_revision: Union[str, None] = 'c82f5e1d9b46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('profile_image_variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'profile_image_variants')
@@ -0,0 +1,28 @@
+"""
+Send the emails queued in the outbox.
+
+Runs until stopped. Run it as its own process and set
+EMAIL_OUTBOX_IN_APP=false so the web workers leave the outbox to it:
+
+    poetry run python -m app.commands.email_worker
+"""
+import asyncio
+
+from app.config.database import sessionmanager
+from app.config.email import email_renderer
+from app.services.email_outbox import run_outbox_worker
+
+
+async def main():
+    try:
+        await run_outbox_worker()
+    finally:
+        email_renderer.shutdown()
+        await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
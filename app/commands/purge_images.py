@@ -0,0 +1,22 @@
+"""
+Delete profile images nobody has used for IMAGE_PURGE_GRACE_HOURS.
+
+Schedule it e.g. daily from cron:
+
+    poetry run python -m app.commands.purge_images
+"""
+import asyncio
+
+from app.config.database import sessionmanager
+from app.services.images import purge_released_images
+
+
+async def main():
+    async with sessionmanager.session() as db:
+        purged = await purge_released_images(db)
+    await sessionmanager.close()
+    print(f"Purged {purged} images")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,23 @@
+"""
+Delete expired user tokens, AUTH_TOKEN_PURGE_BATCH_SIZE rows at a time.
+
+Schedule it e.g. hourly from cron and set AUTH_TOKEN_PURGE_IN_APP=false so
+the web workers leave the purge to it:
+
+    poetry run python -m app.commands.purge_tokens
+"""
+import asyncio
+
+from app.config.database import sessionmanager
+from app.services.tokens import purge_expired_tokens
+
+
+async def main():
+    async with sessionmanager.session() as db:
+        purged = await purge_expired_tokens(db)
+    await sessionmanager.close()
+    print(f"Purged {purged} expired tokens")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,24 @@
+"""
+Rebuild the Redis leaderboards from the users and members tables.
+
+Run it after restoring Redis or if the boards ever drift from User.points:
+
+    poetry run python -m app.commands.rebuild_leaderboards
+"""
+import asyncio
+
+from app.config.database import sessionmanager
+from app.config.redis import redis_client
+from app.services.leaderboard import rebuild_leaderboards
+
+
+async def main():
+    async with sessionmanager.session() as db:
+        users = await rebuild_leaderboards(db)
+    await redis_client.aclose()
+    await sessionmanager.close()
+    print(f"Rebuilt the leaderboards for {users} users")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
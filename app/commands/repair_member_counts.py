@@ -0,0 +1,23 @@
+"""
+Recompute Episode.member_count from the members table.
+
+Run it if the counts ever drift, e.g. after members were edited by hand:
+
+    poetry run python -m app.commands.repair_member_counts
+"""
+import asyncio
+
+from app.config.database import sessionmanager
+from app.models import users  # noqa: F401
+from app.services.episodes import repair_member_counts_service
+
+
+async def main():
+    async with sessionmanager.session() as db:
+        repaired = await repair_member_counts_service(db)
+    await sessionmanager.close()
+    print(f"Repaired the member count of {repaired} episodes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
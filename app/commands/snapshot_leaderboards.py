@@ -0,0 +1,27 @@
+"""
+Fold recent points into the daily, weekly and monthly leaderboard snapshots.
+
+Schedule it every few minutes, e.g. from cron:
+
+    poetry run python -m app.commands.snapshot_leaderboards
+"""
+import asyncio
+
+from app.config.database import sessionmanager
+from app.config.redis import redis_client
+from app.services.leaderboard import snapshot_leaderboards
+
+
+async def main():
+    async with sessionmanager.session() as db:
+        changed = await snapshot_leaderboards(db)
+    await redis_client.aclose()
+    await sessionmanager.close()
+    if changed is None:
+        print("Another snapshot run is in progress")
+    else:
+        print(f"Snapshot taken, {changed} users changed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
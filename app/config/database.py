@@ -1,10 +1,19 @@
+import asyncio
 import contextlib
+import itertools
+import logging
+import time
+from dataclasses import dataclass
+from app.config.redis import redis_client
 from app.config.settings import settings
-from typing import AsyncIterator
-from sqlalchemy.orm import declarative_base
-from sqlalchemy import NullPool
+from typing import AsyncIterator, Optional
+from sqlalchemy.orm import Session, declarative_base
+from sqlalchemy import NullPool, event, text
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
+    AsyncEngine,
     AsyncSession,
     AsyncConnection,
     async_sessionmaker
@@ -12,6 +21,155 @@ from sqlalchemy.ext.asyncio import (
 
 Base = declarative_base()
 
+
+@dataclass
+class PoolStats:
+    """
+    Running counters for connection pool checkouts.
+
+    The counters are kept for the lifetime of the session manager and are
+    exposed through `DatabaseSessionManager.pool_status()` for monitoring.
+    """
+    checkouts: int = 0
+    checkins: int = 0
+    timeouts: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def record_checkout(self, wait: float):
+        self.checkouts += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self) -> dict:
+        return {
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool that records how long each checkout waits for a connection.
+
+    The wait covers queueing for a free connection, opening a new one when
+    the pool may still grow, and the pre-ping round trip.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except TimeoutError:
+            self.stats.timeouts += 1
+            raise
+        self.stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def _do_return_conn(self, record):
+        self.stats.checkins += 1
+        super()._do_return_conn(record)
+
+    def recreate(self):
+        # Keep the counters when the engine is disposed and the pool rebuilt
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def engine_options(engine_kwargs: dict) -> dict:
+    """
+    Build the `create_async_engine` keyword arguments for the configured pool mode.
+
+    `DATABASE_POOL_MODE=null` selects `NullPool`, which opens a new connection
+    for every checkout and is only meant for tests. Any other value uses a
+    pooled engine sized by the `DATABASE_POOL_*` settings. Values passed in
+    `engine_kwargs` always win over the settings.
+    """
+    options = {"echo": settings.DATABASE_ECHO, **engine_kwargs}
+    if settings.DATABASE_POOL_MODE == "null":
+        options.setdefault("poolclass", NullPool)
+    else:
+        options.setdefault("poolclass", InstrumentedQueuePool)
+
+    if options["poolclass"] is not NullPool:
+        options.setdefault("pool_size", settings.DATABASE_POOL_SIZE)
+        options.setdefault("max_overflow", settings.DATABASE_MAX_OVERFLOW)
+        options.setdefault("pool_pre_ping", settings.DATABASE_POOL_PRE_PING)
+        options.setdefault("pool_recycle", settings.DATABASE_POOL_RECYCLE)
+        options.setdefault("pool_timeout", settings.DATABASE_POOL_TIMEOUT)
+    return options
+
+
+# WAL positions as byte offsets, so they compare as plain numbers. The
+# primary's current position is past the commit record of every transaction
+# it has acknowledged, a standby has applied everything up to its replay one.
+POSTGRES_WRITE_POSITION_QUERY = text("SELECT pg_current_wal_lsn() - '0/0'::pg_lsn")
+POSTGRES_REPLAY_POSITION_QUERY = text("SELECT pg_last_wal_replay_lsn() - '0/0'::pg_lsn")
+
+# Sorted set holding the primary's latest write position as the score of a
+# single member, so every worker can raise it atomically with ZADD GT
+WRITE_POSITION_KEY = "db:write-position"
+WRITE_POSITION_MEMBER = "primary"
+
+
+class WriteTrackingSession(Session):
+    """
+    Session used for the primary engine.
+
+    It flags committed transactions that wrote something, so the session
+    manager records the primary's write position once the session closes
+    and reads can avoid replicas that have not replayed it yet.
+    """
+
+
+@event.listens_for(WriteTrackingSession, "after_flush")
+def _mark_flush(session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(WriteTrackingSession, "do_orm_execute")
+def _mark_write_statement(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(WriteTrackingSession, "after_commit")
+def _record_write(session):
+    if session.info.pop("has_writes", False):
+        session.info["committed_writes"] = True
+
+
+@event.listens_for(WriteTrackingSession, "after_rollback")
+def _forget_writes(session):
+    session.info.pop("has_writes", None)
+
+
+@dataclass
+class ReadReplica:
+    """A read-only engine together with how much of the primary's WAL it has replayed."""
+    engine: AsyncEngine
+    sessionmaker: async_sessionmaker
+    replay_position: float = 0.0
+    healthy: bool = False
+    reads: int = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "host": self.engine.url.render_as_string(hide_password=True),
+            "healthy": self.healthy,
+            "replay_position": self.replay_position,
+            "reads": self.reads,
+        }
+
+
 class DatabaseSessionManager:
      def __init__(self, host: str, engine_kwargs: dict[str] = {}):
         """
@@ -23,40 +181,15 @@ class DatabaseSessionManager:
         Args:
             host (str): The database connection URI.
             engine_kwargs (dict[str]): Additional keyword arguments to pass
-                to the `create_async_engine` function.
+                to the `create_async_engine` function. They override the
+                pool options taken from the settings.
         """
-        # Create an async engine, which is an instance of the
-        # sqlalchemy.ext.asyncio.AsyncEngine class. This is an async version
-        # of the standard Engine class.
-        self._engine = create_async_engine(
-            host,
-            # Set the pool class to NullPool, which is a special pool class
-            # that does not pool connections. This is useful for testing, as
-            # it allows you to easily test the database code without having to
-            # worry about connections being returned to the pool.
-            poolclass=NullPool,
-            # Pass any additional keyword arguments to the create_async_engine
-            # function.
-            **engine_kwargs
-        )
-        # Create an async session maker, which is an instance of the
-        # sqlalchemy.ext.asyncio.async_sessionmaker class. This is an async
-        # version of the standard sessionmaker class.
-        self._sessionmaker = async_sessionmaker(
-            # Set the autocommit argument to False, which means that the session
-            # will not automatically commit any changes.
-            autocommit=False,
-            # Set the bind argument to the async engine, which means that the
-            # session will use the engine to connect to the database.
-            bind=self._engine,
-            # Set the expire_on_commit argument to False, which means that the
-            # session will not expire any objects that are changed when a commit
-            # is made. This is useful for testing, as it allows you to easily
-            # test the database code without having to worry about objects being
-            # expired.
-            expire_on_commit=False
-        )
-     def init(self, host: str):
+        self._engine = None
+        self._sessionmaker = None
+        self._replicas = []
+        self.init(host, engine_kwargs)
+
+     def init(self, host: str, engine_kwargs: dict[str] = {}, replica_hosts: list[str] = ()):
         """
         Initialize the database session manager.
 
@@ -65,33 +198,150 @@ class DatabaseSessionManager:
 
         Args:
             host (str): The database connection URI.
+            engine_kwargs (dict[str]): Additional keyword arguments to pass
+                to the `create_async_engine` function.
+            replica_hosts (list[str]): Connection URIs of read replicas used
+                by `read_session()`. They share the primary's engine options.
 
         Notes:
             This method is used by the application to create a database session
             manager. It is called once when the application is started.
 
-            The async engine is created using the `create_async_engine` function
-            from `sqlalchemy.ext.asyncio`. The `poolclass` argument is set to
-            `NullPool`, which means that the engine will not use a connection pool.
-            This is useful for testing, as it allows you to easily test the
-            database code without having to worry about connections being
-            returned to the pool.
-
-            The async session maker is created using the `async_sessionmaker`
-            function from `sqlalchemy.ext.asyncio`. The `autocommit` argument is
-            set to `False`, which means that the session will not automatically
-            commit any changes. The `bind` argument is set to the async engine,
-            which means that the session will use the engine to connect to the
-            database. The `expire_on_commit` argument is set to `False`, which
-            means that the session will not expire any objects that are changed
-            when a commit is made. This is useful for testing, as it allows you
-            to easily test the database code without having to worry about
-            objects being expired.
-        """
-        self._engine = create_async_engine(host, poolclass=NullPool)
+            The engine keeps a pool of open connections sized by the
+            `DATABASE_POOL_*` settings, so requests reuse connections instead
+            of opening a new one each time. Set `DATABASE_POOL_MODE=null` to
+            fall back to `NullPool` when running tests.
+
+            The async session maker is created with `autocommit=False` and
+            `expire_on_commit=False`, so objects stay usable after a commit.
+
+            Replicas start out as not caught up, so reads go to the primary
+            until `check_replicas()` has run at least once.
+
+            When replicas are configured, every session on the primary that
+            committed a write records the primary's WAL position in Redis as
+            it closes, before a route's response is sent. Reads from any
+            worker only use replicas that have replayed up to it.
+        """
+        self._engine = create_async_engine(host, **engine_options(engine_kwargs))
         self._sessionmaker = async_sessionmaker(
-            autocommit=False, bind=self._engine, expire_on_commit=False
+            autocommit=False,
+            bind=self._engine,
+            expire_on_commit=False,
+            sync_session_class=WriteTrackingSession,
+            info={"manager": self},
         )
+        self._write_position = 0.0
+        self._replicas = []
+        for replica_host in replica_hosts:
+            engine = create_async_engine(replica_host, **engine_options(engine_kwargs))
+            self._replicas.append(ReadReplica(
+                engine=engine,
+                sessionmaker=async_sessionmaker(
+                    autocommit=False, bind=engine, expire_on_commit=False
+                ),
+            ))
+        self._replica_cycle = itertools.cycle(range(len(self._replicas)))
+
+     async def record_write(self):
+        """
+        Share the primary's WAL position after a committed write with every worker.
+
+        Only done when replicas are configured, the setting rather than this
+        manager's replicas decides, so commands writing from their own process
+        are seen by the web workers too. Databases other than Postgres have no
+        WAL position and record nothing.
+        """
+        if not settings.DATABASE_REPLICA_URIS or self._engine.dialect.name != "postgresql":
+            return
+        try:
+            async with self._engine.connect() as connection:
+                position = float((await connection.execute(POSTGRES_WRITE_POSITION_QUERY)).scalar())
+            self._write_position = max(self._write_position, position)
+            await redis_client.zadd(WRITE_POSITION_KEY, {WRITE_POSITION_MEMBER: position}, gt=True)
+        except Exception as exc:
+            logging.warning(f"Could not record the primary's write position: {exc}")
+
+     async def write_position(self) -> Optional[float]:
+        """
+        The latest write position recorded by any worker, None if Redis is
+        unavailable and it cannot be known.
+        """
+        try:
+            shared = await redis_client.zscore(WRITE_POSITION_KEY, WRITE_POSITION_MEMBER)
+        except Exception as exc:
+            logging.warning(f"Could not read the primary's write position: {exc}")
+            return None
+        return max(self._write_position, shared or 0.0)
+
+     async def check_replicas(self):
+        """
+        Refresh how much of the primary's WAL each read replica has replayed.
+
+        Databases other than Postgres have no such notion and count as caught
+        up whenever they are reachable. A replica that cannot be reached is
+        skipped until the next check.
+        """
+        for replica in self._replicas:
+            try:
+                async with replica.engine.connect() as connection:
+                    if connection.dialect.name == "postgresql":
+                        position = (await connection.execute(POSTGRES_REPLAY_POSITION_QUERY)).scalar()
+                    else:
+                        await connection.execute(text("SELECT 1"))
+                        position = float("inf")
+            except Exception:
+                logging.warning(f"Read replica {replica.engine.url!r} is unreachable")
+                replica.healthy = False
+                continue
+            replica.healthy = True
+            replica.replay_position = float(position or 0.0)
+
+     async def monitor_replicas(self, interval: float):
+        """Run `check_replicas()` every `interval` seconds until cancelled."""
+        while True:
+            await self.check_replicas()
+            await asyncio.sleep(interval)
+
+     async def _pick_replica(self):
+        # Only replicas that already replayed the primary's latest write are
+        # safe, which keeps read-your-writes flows (join, then fetch) correct
+        # whichever worker served the write.
+        if not self._replicas:
+            return None
+        write_position = await self.write_position()
+        if write_position is None:
+            return None
+        for _ in range(len(self._replicas)):
+            replica = self._replicas[next(self._replica_cycle)]
+            if replica.healthy and replica.replay_position >= write_position:
+                return replica
+        return None
+
+     def pool_status(self) -> dict:
+        """
+        Return a snapshot of the connection pool for monitoring.
+
+        Raises:
+            Exception: If the session manager is not initialized.
+        """
+        if self._engine is None:
+            raise Exception("DatabaseSessionManager is not initialized")
+
+        pool = self._engine.pool
+        status = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            status.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        if isinstance(pool, InstrumentedQueuePool):
+            status.update(pool.stats.as_dict())
+        if self._replicas:
+            status["replicas"] = [replica.as_dict() for replica in self._replicas]
+        return status
 
 
      async def close(self):
@@ -109,13 +359,16 @@ class DatabaseSessionManager:
         if self._engine is None:
             raise Exception("DatabaseSessionManager is not initialized")
 
-        # Dispose of the engine, releasing any resources associated with it
+        # Dispose of the engines, releasing any resources associated with them
         await self._engine.dispose()
+        for replica in self._replicas:
+            await replica.engine.dispose()
 
         # Remove the engine and session maker references, so that this object can be
         # garbage collected
         self._engine = None
         self._sessionmaker = None
+        self._replicas = []
 
 
      @contextlib.asynccontextmanager
@@ -188,10 +441,43 @@ class DatabaseSessionManager:
             # Reraise the exception
             raise
         finally:
+            # Share the write position before the caller can answer anyone
+            if session.info.pop("committed_writes", False):
+                await self.record_write()
             # When the context manager is exited, close the session
             await session.close()
 
 
+     @contextlib.asynccontextmanager
+     async def read_session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Asynchronously create a read-only session and yield it.
+
+        The session is bound to a read replica that has replayed the
+        primary's latest committed write. When no replica qualifies, none are
+        configured, or the write position is unavailable, the session falls
+        back to the primary.
+
+        Yields:
+            AsyncIterator[AsyncSession]: An async session for reads only.
+        """
+        replica = await self._pick_replica()
+        if replica is None:
+            async with self.session() as session:
+                yield session
+            return
+
+        replica.reads += 1
+        session = replica.sessionmaker()
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
             # This method is used to create all tables in the database.
             # The tables are defined in the `Base` class, which is a subclass of `declarative_base`.
             # The `create_all` method is used to create all tables defined in the `Base` class.
@@ -236,4 +522,4 @@ class DatabaseSessionManager:
 
 
 
-sessionmanager = DatabaseSessionManager(settings.DATABASE_URI, {"echo": True})
+sessionmanager = DatabaseSessionManager(settings.DATABASE_URI)
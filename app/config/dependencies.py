@@ -3,6 +3,7 @@ from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import AsyncIterator
 from app.config.database import sessionmanager
+from app.config.settings import settings
 
 
 
@@ -31,4 +32,45 @@ async def get_db() -> AsyncIterator[AsyncSession]:
 
 
 db_dependency = Annotated[AsyncSession, Depends(get_db)]
+
+
+async def get_read_db() -> AsyncIterator[AsyncSession]:
+    """
+    This function returns a read-only database session dependency.
+
+    The session comes from `sessionmanager.read_session()`, which serves it from a
+    read replica that has caught up with the primary, or from the primary itself
+    when no replica qualifies. Only use it in routes that do not write.
+
+    Routes that derive ETags from a version bumped on writes read from the
+    primary instead: a replica can still lag behind the write that moved the
+    version, and its old rows would be served under it.
+    """
+
+    async with sessionmanager.read_session() as session:
+        yield session
+
+
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
+
+
+async def get_cached_read_db() -> AsyncIterator[AsyncSession]:
+    """
+    This function returns a read-only session for routes whose responses are cached.
+
+    A cached response outlives the read. A replica lagging behind a write
+    that already invalidated the cache would have its old rows stored until
+    the next write, so while RESPONSE_CACHE_ENABLED the session is on the
+    primary. Without the cache it comes from `get_read_db`'s replicas.
+    """
+
+    if not settings.RESPONSE_CACHE_ENABLED:
+        async with sessionmanager.read_session() as session:
+            yield session
+        return
+    async with sessionmanager.session() as session:
+        yield session
+
+
+cached_read_db_dependency = Annotated[AsyncSession, Depends(get_cached_read_db)]
 # cache_dependency = Annotated[AsyncSession, Depends(get_db)]
@@ -0,0 +1,143 @@
+import asyncio
+import ipaddress
+import logging
+import time
+from math import ceil
+from fastapi import HTTPException, Request, status
+from app.config.redis import redis_client
+from app.config.settings import settings
+from app.utils.rate_limit import LocalBuckets, RateLimitStats
+from app.utils.string import unique_string
+
+# Sliding window log: the sorted set holds one member per allowed request,
+# scored by its time in milliseconds. Returns {allowed, retry after in ms}.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+if redis.call('ZCARD', key) < limit then
+    redis.call('ZADD', key, now, ARGV[4])
+    redis.call('PEXPIRE', key, window)
+    return {1, 0}
+end
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+return {0, tonumber(oldest[2]) + window - now}
+"""
+
+sliding_window = redis_client.register_script(SLIDING_WINDOW_SCRIPT)
+rate_limit_stats = RateLimitStats()
+# Every RateLimit, for the local bucket counts in the metrics
+rate_limits = []
+trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.RATE_LIMIT_TRUSTED_PROXIES]
+
+
+async def load_rate_limit_script():
+    """
+    Load the sliding window script into Redis ahead of the first request.
+
+    A failure is only logged, the script is loaded again on first use.
+    """
+    try:
+        await redis_client.script_load(SLIDING_WINDOW_SCRIPT)
+    except Exception as exc:
+        logging.warning(f"Could not load the rate limit script: {exc}")
+
+
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+
+def client_identifier(request: Request) -> str:
+    """
+    Address of the client that sent a request.
+
+    X-Forwarded-For is only read when the request comes from a trusted proxy.
+    Each proxy appends the address it received from, so the client is the
+    right-most hop that is not a trusted proxy: anything left of it was sent
+    by the client and can be made up.
+    """
+    host = request.client.host if request.client else ""
+    forwarded = request.headers.get("X-Forwarded-For")
+    if not forwarded or not is_trusted_proxy(host):
+        return host
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else host
+
+
+class RateLimit:
+    """
+    Route dependency allowing a client `times` requests per sliding window.
+
+    Each request first takes a token from an in-process bucket, which turns
+    away clients that are clearly over the limit without a Redis round trip.
+    The rest are counted in Redis with one script call. If Redis fails or
+    takes longer than RATE_LIMIT_REDIS_TIMEOUT the request is let through
+    when failing open, RATE_LIMIT_FAIL_OPEN unless `fail_open` is given,
+    and refused with a 503 otherwise.
+
+    Clients are told apart by IP address and limited per route.
+    """
+
+    def __init__(self, times: int, seconds: int = 0, minutes: int = 0, hours: int = 0, fail_open: bool = None):
+        self.times = times
+        self.window = seconds + 60 * minutes + 3600 * hours
+        self.fail_open = fail_open
+        self.local = LocalBuckets(times, self.window, settings.RATE_LIMIT_LOCAL_MAXSIZE)
+        rate_limits.append(self)
+
+    async def __call__(self, request: Request):
+        route = request.scope.get("route")
+        path = route.path if route is not None else request.scope["path"]
+        client = f"{request.method}:{path}:{client_identifier(request)}"
+
+        retry_after = self.local.take(client)
+        if retry_after:
+            rate_limit_stats.local_limited += 1
+            self._refuse(retry_after)
+
+        window_ms = self.window * 1000
+        started = time.perf_counter()
+        try:
+            allowed, retry_after_ms = await asyncio.wait_for(
+                sliding_window(
+                    keys=[f"ratelimit:{self.times}/{self.window}:{client}"],
+                    args=[int(time.time() * 1000), window_ms, self.times, unique_string(6)],
+                ),
+                settings.RATE_LIMIT_REDIS_TIMEOUT,
+            )
+        except Exception as exc:
+            rate_limit_stats.redis_errors += 1
+            logging.warning(f"Rate limit check failed for {path}: {exc!r}")
+            fail_open = settings.RATE_LIMIT_FAIL_OPEN if self.fail_open is None else self.fail_open
+            if fail_open:
+                rate_limit_stats.failed_open += 1
+                return
+            rate_limit_stats.failed_closed += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Service is temporarily unavailable, please try again shortly",
+            )
+        rate_limit_stats.record_check(time.perf_counter() - started)
+
+        if not allowed:
+            rate_limit_stats.limited += 1
+            self.local.block(client, retry_after_ms / 1000)
+            self._refuse(retry_after_ms / 1000)
+        rate_limit_stats.allowed += 1
+
+    @staticmethod
+    def _refuse(retry_after: float):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too Many Requests",
+            headers={"Retry-After": str(ceil(retry_after))},
+        )
@@ -0,0 +1,6 @@
+import redis.asyncio as redis
+from app.config.settings import settings
+
+# Shared connection pool for every Redis user in the app (rate limiter, caches).
+# Creating the client does not connect, the first command does.
+redis_client = redis.from_url(settings.REDIS_URI, encoding="utf8")
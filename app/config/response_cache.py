@@ -0,0 +1,95 @@
+import logging
+from typing import Annotated, Optional
+from fastapi import Depends, Request
+from fastapi.encoders import jsonable_encoder
+from app.config.redis import redis_client
+from app.config.settings import settings
+from app.utils.cache import TwoTierCache
+from app.utils.string import unique_string
+
+# Read endpoint bodies, keyed by route and parameters and tagged with the
+# rows they show, so writes can drop every response that includes a row
+response_cache = TwoTierCache(
+    "response",
+    maxsize=settings.RESPONSE_CACHE_MAXSIZE,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    local_ttl=settings.RESPONSE_CACHE_LOCAL_TTL,
+    redis_client=redis_client if settings.RESPONSE_CACHE_REDIS else None,
+)
+
+# Tag of every episode list page
+EPISODE_LIST_TAG = "episodes"
+# Changes to a new random value whenever any episode changes, list ETags are
+# derived from it so a conditional request is answered without the rows
+EPISODE_COLLECTION_VERSION_KEY = "episodes:version"
+
+
+def episode_tag(episode_id: int) -> str:
+    return f"episode:{episode_id}"
+
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def cache_bypass(request: Request) -> bool:
+    """A request sent with `Cache-Control: no-cache` is served fresh, and refreshes the cache."""
+    return "no-cache" in request.headers.get("Cache-Control", "")
+
+
+cache_bypass_dependency = Annotated[bool, Depends(cache_bypass)]
+
+
+async def cached_response(key: str, compute, tags: list[str] = (), model=None, bypass: bool = False):
+    """
+    Serve a read endpoint's body through the response cache.
+
+    `compute` returns the body, as rows or plain data. It is encoded to JSON
+    types before caching, through the pydantic `model` if given, so only the
+    fields the endpoint exposes are stored.
+    """
+    async def encoded():
+        value = await compute()
+        if model is not None and value is not None:
+            return model.model_validate(value).model_dump(mode="json")
+        return jsonable_encoder(value)
+
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return await encoded()
+    return await response_cache.get_or_set(key, encoded, tags=tags, refresh=bypass)
+
+
+async def episode_collection_version() -> Optional[str]:
+    """
+    Current version of the episode collection, None if Redis is unavailable.
+
+    A random value rather than a counter, so a version lost with Redis can
+    never come back and match an ETag a client still holds.
+    """
+    try:
+        version = await redis_client.get(EPISODE_COLLECTION_VERSION_KEY)
+        if version is None:
+            await redis_client.set(EPISODE_COLLECTION_VERSION_KEY, unique_string(), nx=True)
+            version = await redis_client.get(EPISODE_COLLECTION_VERSION_KEY)
+    except Exception as exc:
+        logging.warning(f"Could not read the episode collection version: {exc}")
+        return None
+    return version.decode() if isinstance(version, bytes) else version
+
+
+async def invalidate_episode_responses(*episode_ids: int):
+    """
+    Drop the cached responses of episodes, and every episode list page, and
+    move the episode collection to a new version.
+    """
+    for episode_id in episode_ids:
+        await response_cache.invalidate_tag(episode_tag(episode_id))
+    await response_cache.invalidate_tag(EPISODE_LIST_TAG)
+    try:
+        await redis_client.set(EPISODE_COLLECTION_VERSION_KEY, unique_string())
+    except Exception as exc:
+        logging.warning(f"Could not bump the episode collection version: {exc}")
+
+
+async def invalidate_user_responses(user_id: int):
+    await response_cache.invalidate_tag(user_tag(user_id))
@@ -1,5 +1,8 @@
 from datetime import datetime, timedelta
+import hashlib
+import hmac
 import logging
+import time
 from typing import Annotated
 from fastapi import Depends, HTTPException
 from passlib.context import CryptContext
@@ -8,17 +11,39 @@ import jwt
 from sqlalchemy import bindparam, select
 from sqlalchemy.orm import joinedload
 
-from app.config import settings
-from app.models.users import UserToken
+from app.config.settings import settings
+from app.models.users import User, UserToken
 from fastapi.security import OAuth2PasswordBearer
 
 from app.config.dependencies import db_dependency
+from app.config.redis import redis_client
+from app.config.response_cache import invalidate_user_responses
+from app.utils.cache import MISSING, TwoTierCache
+from app.utils.executor import BoundedExecutor, ExecutorBusy
+from app.utils.revocation import RevokedTokens
 
 SPECIAL_CHARACTERS = ["@", "#", "$", "%", "=", ":", "?", ".", "/", "|", "~", ">"]
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-from app.config.settings import settings
+
+# Resolved token -> user lookups, keyed by UserToken.id and tagged with the user id
+user_cache = TwoTierCache(
+    "auth:user",
+    maxsize=settings.AUTH_CACHE_MAXSIZE,
+    ttl=settings.AUTH_CACHE_TTL,
+    local_ttl=settings.AUTH_CACHE_LOCAL_TTL,
+    redis_client=redis_client if settings.AUTH_CACHE_REDIS else None,
+)
+
+USER_CACHE_FIELDS = (
+    "id", "first_name", "last_name", "email", "profile_image", "profile_image_variants", "points",
+    "no_of_khatmis", "is_active", "is_firstlogin", "is_superuser",
+)
+USER_CACHE_DATETIME_FIELDS = ("verified_at", "created_at", "updated_at")
+
+# Token ids that stateless mode must reject before their access tokens expire
+revoked_tokens = RevokedTokens(redis_client)
 
 
 def hash_password(password):
@@ -29,6 +54,30 @@ def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# bcrypt takes hundreds of milliseconds, so request handlers hash in this pool
+password_hasher = BoundedExecutor(
+    "password-hash",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
+async def _run_password_hasher(fn, *args):
+    try:
+        return await password_hasher.run(fn, *args)
+    except ExecutorBusy:
+        raise HTTPException(status_code=503, detail="Server is busy. Please try again later.")
+
+
+async def hash_password_async(password):
+    return await _run_password_hasher(hash_password, password)
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_password_hasher(verify_password, plain_password, hashed_password)
+
+
 def is_password_strong_enough(password: str) -> bool:
     """
     Checks if a password is strong enough.
@@ -56,6 +105,43 @@ def str_encode(string: str) -> str:
 
 
 
+def _context_signature(user, context: str, expires_at: int) -> str:
+    message = f"{context}:{user.id}:{expires_at}:{user.get_context_string(context=context)}"
+    digest = hmac.new(settings.SECRET_KEY.encode(), message.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def generate_context_token(user, context: str, expire: timedelta) -> str:
+    """
+    Create a signed token for an emailed link, such as account verification.
+
+    The token carries its expiry and an HMAC over the purpose, the user and
+    `User.get_context_string`, so it stops working once it expires or once
+    the user's password or `updated_at` changes.
+    """
+    expires_at = int(time.time() + expire.total_seconds())
+    return f"{expires_at}.{_context_signature(user, context, expires_at)}"
+
+
+async def verify_context_token(user, context: str, token: str) -> bool:
+    """
+    Check a token created by `generate_context_token` for the same purpose.
+
+    Links sent before signed tokens existed hold a bcrypt hash of the context
+    string. They are still verified that way while EMAIL_TOKEN_ACCEPT_LEGACY
+    is enabled.
+    """
+    if token.startswith("$2"):
+        if not settings.EMAIL_TOKEN_ACCEPT_LEGACY:
+            return False
+        return await verify_password_async(user.get_context_string(context=context), token)
+
+    expires_at, _, signature = token.partition(".")
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(signature, _context_signature(user, context, int(expires_at)))
+
+
 def generate_token(payload: dict, secret_key: str, algorithm: str, expire: timedelta) -> str:
     expire_datetime = datetime.utcnow() + expire
     payload.update({"exp": expire_datetime})
@@ -81,8 +167,6 @@ def str_decode(string: str) -> str:
 
 
 
-import logging
-
 def verify_token(token: str, secret: str, algo: str):
     """
     Verify and decode the JWT token using the specified secret and algorithm.
@@ -112,6 +196,34 @@ def verify_token(token: str, secret: str, algo: str):
 
 
 
+def _user_to_cache(user: User) -> dict:
+    data = {field: getattr(user, field) for field in USER_CACHE_FIELDS}
+    for field in USER_CACHE_DATETIME_FIELDS:
+        value = getattr(user, field)
+        data[field] = value.isoformat() if value else None
+    return data
+
+
+def _user_from_cache(data: dict) -> User:
+    """Build a detached `User` from cached columns. The password is never cached."""
+    data = dict(data)
+    for field in USER_CACHE_DATETIME_FIELDS:
+        if data[field]:
+            data[field] = datetime.fromisoformat(data[field])
+    return User(**data)
+
+
+async def invalidate_user_cache(user_id: int):
+    """Drop every cached token lookup and profile response of a user, e.g. after their row changed."""
+    await user_cache.invalidate_tag(f"user:{user_id}")
+    await invalidate_user_responses(user_id)
+
+
+async def invalidate_token_cache(user_token_id: int):
+    """Drop the cached lookup of a single token, e.g. after it was rotated."""
+    await user_cache.delete(str(user_token_id))
+
+
 async def get_token_user(token: str, db) -> dict:
     payload = verify_token(token, settings.JWT_SECRET, settings.JWT_ALGORITHM)
     if payload:
@@ -119,6 +231,15 @@ async def get_token_user(token: str, db) -> dict:
         user_id = str_decode(payload.get("sub"))
         access_key = payload.get("a")
         if user_token_id and user_id and access_key:
+            cached = await user_cache.get(user_token_id)
+            if (
+                cached is not MISSING
+                and str(cached["user"]["id"]) == user_id
+                and cached["expires_at"] > time.time()
+                and hmac.compare_digest(cached["access_key"], access_key)
+            ):
+                return _user_from_cache(cached["user"])
+
             user = await db.execute(
                 select(UserToken)
                 .options(joinedload(UserToken.user))
@@ -132,11 +253,65 @@ async def get_token_user(token: str, db) -> dict:
             user_token = user.scalars().first()
             logging.debug(f"User Token: {user_token}")
             if user_token:
+                ttl = (user_token.expires_at - datetime.utcnow()).total_seconds()
+                await user_cache.set(
+                    user_token_id,
+                    {
+                        "user": _user_to_cache(user_token.user),
+                        "access_key": access_key,
+                        "expires_at": time.time() + ttl,
+                    },
+                    ttl=ttl,
+                    tags=[f"user:{user_token.user_id}"],
+                )
                 return user_token.user
     return None
 
+async def revoke_token(user_token_id: int):
+    """
+    Reject the access tokens of a `UserToken` from now on.
+
+    Only stateless mode needs this, the database lookup already ignores
+    tokens that were replaced or removed. If Redis is unavailable the token
+    is still revoked in this process, and the failure is only logged so a
+    logout or refresh does not fail with it.
+    """
+    await invalidate_token_cache(user_token_id)
+    if settings.AUTH_STATELESS:
+        expires_at = time.time() + settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+        try:
+            await revoked_tokens.revoke(user_token_id, expires_at)
+        except Exception as exc:
+            logging.warning(f"Could not share the revocation of token {user_token_id}: {exc}")
+
+
+def get_claims_user(token: str) -> dict:
+    """
+    Resolve the user from the access token claims alone, without the database.
+
+    Only the id, first name and superuser flag are available on the returned
+    `User`. Tokens issued for inactive or unverified users, tokens without the
+    stateless claims and revoked tokens are rejected.
+    """
+    payload = verify_token(token, settings.JWT_SECRET, settings.JWT_ALGORITHM)
+    if not payload or not payload.get("act") or not payload.get("vrf"):
+        return None
+    user_token_id = str_decode(payload.get("r"))
+    if revoked_tokens.is_revoked(user_token_id):
+        return None
+    return User(
+        id=int(str_decode(payload.get("sub"))),
+        first_name=str_decode(payload.get("n")),
+        is_active=True,
+        is_superuser=bool(payload.get("su")),
+    )
+
+
 async def get_current_user(db: db_dependency, token: Annotated[str, Depends(oauth2_scheme)]) -> dict:
-    user = await get_token_user(token, db)
+    if settings.AUTH_STATELESS:
+        user = get_claims_user(token)
+    else:
+        user = await get_token_user(token, db)
     if user:
         return user
     raise HTTPException(status_code=401, detail="Not authorised.")
@@ -145,6 +320,15 @@ async def get_current_user(db: db_dependency, token: Annotated[str, Depends(oaut
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
+async def get_current_superuser(user: user_dependency) -> dict:
+    if not user.is_superuser:
+        raise HTTPException(status_code=403, detail="Not allowed.")
+    return user
+
+
+admin_dependency = Annotated[dict, Depends(get_current_superuser)]
+
+
 
 
 def get_token_payload(token: str, secret: str, algo: str):
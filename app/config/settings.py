@@ -3,6 +3,7 @@
 import os
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 class Settings(BaseSettings):
     """Application settings."""
@@ -12,6 +13,22 @@ class Settings(BaseSettings):
     DATABASE_URI: str
     FRONTEND_HOST: str
 
+    # database pool
+    # "queue" keeps a pool of open connections, "null" opens a new
+    # connection per checkout and is meant for tests only
+    DATABASE_POOL_MODE: str = "queue"
+    DATABASE_POOL_SIZE: int = 10
+    DATABASE_MAX_OVERFLOW: int = 20
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_TIMEOUT: int = 30
+    DATABASE_ECHO: bool = False
+
+    # read replicas, given as a JSON list of connection URIs
+    DATABASE_REPLICA_URIS: list[str] = []
+    # seconds between replica catch-up checks
+    DATABASE_REPLICA_CHECK_INTERVAL: float = 1.0
+
     # email
     # EMAIL_PASSWORD: str
     # EMAIL_PORT: int
@@ -27,6 +44,55 @@ class Settings(BaseSettings):
     EMAIL_SERVER: str = os.getenv("EMAIL_SERVER")
     EMAIL_STARTTLS: bool = os.getenv("EMAIL_TLS") == "True"
     EMAIL_SSL_TLS: bool = os.getenv("EMAIL_SSL") == "True"
+    # run the outbox worker inside the app, turn off when running
+    # app.commands.email_worker separately
+    EMAIL_OUTBOX_IN_APP: bool = True
+    # seconds between polls of an empty outbox
+    EMAIL_OUTBOX_POLL_INTERVAL: float = 1.0
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    # attempts before an email is marked failed, retried with exponential backoff
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 8
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS: float = 30.0
+    EMAIL_OUTBOX_RETRY_MAX_SECONDS: float = 3600.0
+    # days sent emails are kept in the outbox
+    EMAIL_OUTBOX_RETENTION_DAYS: int = 7
+    EMAIL_SMTP_TIMEOUT: float = 30.0
+    # recompile email templates when their files change, for development
+    EMAIL_TEMPLATES_RELOAD: bool = False
+    # threads rendering emails
+    EMAIL_RENDER_WORKERS: int = 2
+
+    # rate limiting, let requests through ("fail open") when Redis is down
+    # or slower than RATE_LIMIT_REDIS_TIMEOUT seconds
+    RATE_LIMIT_FAIL_OPEN: bool = True
+    RATE_LIMIT_REDIS_TIMEOUT: float = 0.1
+    # clients tracked by the in-process tier of each limit
+    RATE_LIMIT_LOCAL_MAXSIZE: int = 10000
+    # addresses or networks of the proxies in front of the app, whose
+    # X-Forwarded-For is trusted to name the client
+    RATE_LIMIT_TRUSTED_PROXIES: list[str] = []
+
+    # read-through cache of episode and profile responses
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_TTL: float = 60.0
+    # other processes may serve a response for this long after it changed
+    RESPONSE_CACHE_LOCAL_TTL: float = 5.0
+    RESPONSE_CACHE_MAXSIZE: int = 10000
+    RESPONSE_CACHE_REDIS: bool = True
+
+    # password hashing runs in a "thread" or "process" pool
+    PASSWORD_HASH_EXECUTOR: str = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    # hashing requests allowed to wait for a worker before new ones get a 503
+    PASSWORD_HASH_MAX_PENDING: int = 256
+
+    # episode listing
+    EPISODE_PAGE_SIZE: int = 20
+    EPISODE_MAX_PAGE_SIZE: int = 100
+
+    # leaderboard pages
+    LEADERBOARD_PAGE_SIZE: int = 20
+    LEADERBOARD_MAX_PAGE_SIZE: int = 100
 
     # jwt config
     JWT_SECRET: str
@@ -35,13 +101,59 @@ class Settings(BaseSettings):
     REFRESH_TOKEN_EXPIRE_MINUTES: int
     # App Secret Key
     SECRET_KEY: str
+    # signed links sent by email, keyed with SECRET_KEY
+    VERIFY_ACCOUNT_TOKEN_EXPIRE_MINUTES: int = 60 * 24
+    PASSWORD_RESET_TOKEN_EXPIRE_MINUTES: int = 60
+    # keep accepting the bcrypt links sent before signed links existed
+    EMAIL_TOKEN_ACCEPT_LEGACY: bool = True
     REDIS_URI: str
 
+    # authenticated user cache
+    AUTH_CACHE_TTL: float = 60.0
+    AUTH_CACHE_LOCAL_TTL: float = 10.0
+    AUTH_CACHE_MAXSIZE: int = 10000
+    # share cached users between workers through Redis
+    AUTH_CACHE_REDIS: bool = False
+
+    # trust the access token claims instead of looking the token up in the
+    # database, revoked tokens are shared through Redis
+    AUTH_STATELESS: bool = False
+    AUTH_REVOCATION_SYNC_INTERVAL: float = 1.0
+    # sessions a user may hold at once, logging in beyond it ends the one
+    # left unused the longest
+    AUTH_MAX_SESSIONS: int = 10
+    # purge expired sessions inside the app, turn off when running
+    # app.commands.purge_tokens separately
+    AUTH_TOKEN_PURGE_IN_APP: bool = True
+    AUTH_TOKEN_PURGE_INTERVAL: float = 3600.0
+    AUTH_TOKEN_PURGE_BATCH_SIZE: int = 1000
+
     # AWS
     AWS_ACCESS_KEY_ID: str
     AWS_SECRET_ACCESS_KEY: str
     # AWS_REGION_NAME: str
     AWS_S3_BUCKET_NAME: str
+    # "s3", or "local" to keep objects in STORAGE_LOCAL_PATH and serve them
+    # from this app under STORAGE_LOCAL_BASE_URL, for working offline
+    STORAGE_BACKEND: str = "s3"
+    STORAGE_LOCAL_PATH: str = "storage"
+    STORAGE_LOCAL_BASE_URL: str = "http://localhost:8000/storage"
+    # seconds a presigned profile image upload stays valid
+    PROFILE_UPLOAD_EXPIRE_SECONDS: int = 600
+    # largest profile image accepted, in bytes
+    PROFILE_IMAGE_MAX_SIZE: int = 1024 * 1024
+    # processes making profile image thumbnails
+    IMAGE_WORKERS: int = 2
+    IMAGE_MAX_PENDING: int = 64
+    # hours an image nobody uses is kept before it is deleted from storage
+    IMAGE_PURGE_GRACE_HOURS: int = 24
+    # a custom S3 endpoint, e.g. a local stand-in like moto or minio
+    AWS_S3_ENDPOINT_URL: Optional[str] = None
+    AWS_S3_MAX_POOL_CONNECTIONS: int = 20
+    AWS_S3_CONNECT_TIMEOUT: float = 2.0
+    AWS_S3_READ_TIMEOUT: float = 10.0
+    # seconds a whole storage call may take, retries included
+    AWS_S3_CALL_TIMEOUT: float = 15.0
 
     class Config:
         """Settings configuration."""
@@ -0,0 +1,404 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from app.config.settings import settings
+from app.utils.executor import BoundedExecutor
+from app.utils.string import unique_string
+
+
+# Objects larger than this are uploaded in parts of this size. S3 needs parts
+# of at least 5 MB, so a stream is buffered up to one part at a time.
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+
+
+class StorageTimeout(Exception):
+    """Raised when a storage call takes longer than its timeout."""
+
+
+class StorageNotFound(Exception):
+    """Raised when an object does not exist."""
+
+
+@dataclass
+class OperationStats:
+    calls: int = 0
+    errors: int = 0
+    timeouts: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+
+    def record(self, latency: float):
+        self.calls += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "avg_latency_ms": round(self.total_latency / self.calls * 1000, 3) if self.calls else 0.0,
+            "max_latency_ms": round(self.max_latency * 1000, 3),
+        }
+
+
+@dataclass
+class StorageStats:
+    operations: dict[str, OperationStats] = field(default_factory=dict)
+
+    def operation(self, name: str) -> OperationStats:
+        return self.operations.setdefault(name, OperationStats())
+
+    def as_dict(self) -> dict:
+        return {name: stats.as_dict() for name, stats in self.operations.items()}
+
+
+class Storage:
+    """
+    Runs the blocking calls of a storage backend off the event loop.
+
+    Calls run in a bounded thread pool and are cut off after `call_timeout`
+    seconds. Latency, errors and timeouts are recorded per operation.
+    """
+
+    def __init__(self, workers: int, call_timeout: float):
+        self.call_timeout = call_timeout
+        self.stats = StorageStats()
+        self._executor = BoundedExecutor("storage", workers)
+
+    async def _run(self, operation: str, call):
+        stats = self.stats.operation(operation)
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(self._executor.run(call), self.call_timeout)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            raise StorageTimeout(f"{operation} took longer than {self.call_timeout}s")
+        except StorageNotFound:
+            raise
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.record(time.perf_counter() - started)
+
+    def key_from_url(self, url: str) -> str:
+        """Object key of a URL built by `url()`."""
+        return url.rsplit("/", 1)[-1]
+
+    def pool_status(self) -> dict:
+        return {"executor": self._executor.stats.as_dict(), "operations": self.stats.as_dict()}
+
+    def shutdown(self):
+        self._executor.shutdown()
+
+
+class S3Storage(Storage):
+    """
+    One S3 client shared by the whole app, called off the event loop.
+
+    boto3 clients are thread safe, so a single client and its connection pool
+    serve every call. Calls run in a bounded thread pool as large as the
+    connection pool, so no call waits for a connection inside boto3, and each
+    one is cut off after `call_timeout` seconds. Latency, errors and timeouts
+    are recorded per operation. The client is created on first use.
+
+    Args:
+        bucket (str): The bucket objects are stored in.
+        endpoint_url (str): A custom endpoint, e.g. a local S3 stand-in.
+        max_pool_connections (int): Size of the connection pool and thread pool.
+        connect_timeout (float): Seconds to wait for a connection to S3.
+        read_timeout (float): Seconds to wait for a response from S3.
+        call_timeout (float): Seconds a whole call may take, retries included.
+        client_kwargs (dict): Extra arguments for `boto3.client`, e.g. credentials.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: str = None,
+        max_pool_connections: int = 20,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 10.0,
+        call_timeout: float = 15.0,
+        client_kwargs: dict = {},
+    ):
+        super().__init__(max_pool_connections, call_timeout)
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self._config = Config(
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retries={"max_attempts": 3, "mode": "standard"},
+        )
+        self._client_kwargs = client_kwargs
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = boto3.client(
+                "s3", endpoint_url=self.endpoint_url, config=self._config, **self._client_kwargs
+            )
+        return self._client
+
+    async def _call(self, operation: str, **kwargs):
+        return await self._run(operation, functools.partial(getattr(self.client, operation), **kwargs))
+
+    async def put_object(self, key: str, body: bytes, content_type: str, cache_control: str = None):
+        extra = {"CacheControl": cache_control} if cache_control else {}
+        return await self._call(
+            "put_object", Bucket=self.bucket, Key=key, Body=body, ContentType=content_type, **extra
+        )
+
+    async def get_object(self, key: str) -> bytes:
+        def read():
+            try:
+                return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+            except self.client.exceptions.NoSuchKey:
+                raise StorageNotFound(key)
+        return await self._run("get_object", read)
+
+    async def head_object(self, key: str) -> int:
+        """Size of an object in bytes."""
+        try:
+            head = await self._call("head_object", Bucket=self.bucket, Key=key)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                raise StorageNotFound(key)
+            raise
+        return head["ContentLength"]
+
+    async def copy_object(self, source_key: str, key: str, content_type: str, cache_control: str = None):
+        extra = {"CacheControl": cache_control} if cache_control else {}
+        return await self._call(
+            "copy_object", Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": source_key},
+            ContentType=content_type, MetadataDirective="REPLACE", **extra,
+        )
+
+    def presigned_post(self, key: str, content_type: str, max_size: int, expires_in: int) -> dict:
+        """
+        Let a client upload one object straight to the bucket with a form POST.
+
+        The upload must use `content_type` and be at most `max_size` bytes.
+        Signing is local, no request is made.
+        """
+        return self.client.generate_presigned_post(
+            Bucket=self.bucket,
+            Key=key,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}, ["content-length-range", 1, max_size]],
+            ExpiresIn=expires_in,
+        )
+
+    async def upload_stream(self, key: str, chunks, content_type: str):
+        """
+        Upload an object from an async iterator of byte chunks.
+
+        Objects up to `MULTIPART_PART_SIZE` go up with a single put, larger
+        ones as a multipart upload, so at most one part is held in memory. If
+        the iterator raises, e.g. to reject the upload, nothing is stored.
+        """
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+
+        async def upload_part():
+            part = await self._call(
+                "upload_part", Bucket=self.bucket, Key=key, UploadId=upload_id,
+                PartNumber=len(parts) + 1, Body=bytes(buffer),
+            )
+            parts.append({"PartNumber": len(parts) + 1, "ETag": part["ETag"]})
+
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= MULTIPART_PART_SIZE:
+                    if upload_id is None:
+                        upload = await self._call(
+                            "create_multipart_upload", Bucket=self.bucket, Key=key, ContentType=content_type
+                        )
+                        upload_id = upload["UploadId"]
+                    await upload_part()
+                    buffer.clear()
+            if upload_id is None:
+                return await self.put_object(key, bytes(buffer), content_type)
+            if buffer:
+                await upload_part()
+            return await self._call(
+                "complete_multipart_upload", Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except Exception:
+            if upload_id is not None:
+                try:
+                    await self._call("abort_multipart_upload", Bucket=self.bucket, Key=key, UploadId=upload_id)
+                except Exception:
+                    logging.warning(f"Could not abort multipart upload {upload_id} of {key}")
+            raise
+
+    async def delete_objects(self, *keys: str):
+        return await self._call(
+            "delete_objects", Bucket=self.bucket, Delete={"Objects": [{"Key": key} for key in keys]}
+        )
+
+    def url(self, key: str) -> str:
+        """Public URL of an object."""
+        if self.endpoint_url:
+            return f"{self.endpoint_url.rstrip('/')}/{self.bucket}/{key}"
+        return f"https://{self.bucket}.s3.amazonaws.com/{key}"
+
+
+class LocalStorage(Storage):
+    """
+    Keeps objects as files in a directory, to work offline without S3.
+
+    Objects are served from `base_url`, which `app.main` mounts, and
+    presigned uploads post to `upload_url`, where `app.routes.storage` checks
+    the signed policy before writing the file.
+
+    Args:
+        root (str): Directory the objects are stored in.
+        base_url (str): URL the directory is served from.
+        upload_url (str): URL presigned uploads are posted to.
+        secret (str): Key presigned upload policies are signed with.
+    """
+
+    def __init__(self, root: str, base_url: str, upload_url: str, secret: str, workers: int = 4, call_timeout: float = 15.0):
+        super().__init__(workers, call_timeout)
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+        self.base_url = base_url.rstrip("/")
+        self.upload_url = upload_url
+        self._secret = secret.encode()
+
+    def path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid key: {key}")
+        return path
+
+    def _write(self, key: str, body: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(body)
+
+    def _read(self, key: str) -> bytes:
+        try:
+            with open(self.path(key), "rb") as file:
+                return file.read()
+        except FileNotFoundError:
+            raise StorageNotFound(key)
+
+    def _size(self, key: str) -> int:
+        try:
+            return os.path.getsize(self.path(key))
+        except FileNotFoundError:
+            raise StorageNotFound(key)
+
+    def _delete(self, *keys: str):
+        for key in keys:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+        return {}
+
+    async def put_object(self, key: str, body: bytes, content_type: str, cache_control: str = None):
+        return await self._run("put_object", functools.partial(self._write, key, body))
+
+    async def get_object(self, key: str) -> bytes:
+        return await self._run("get_object", functools.partial(self._read, key))
+
+    async def head_object(self, key: str) -> int:
+        return await self._run("head_object", functools.partial(self._size, key))
+
+    async def copy_object(self, source_key: str, key: str, content_type: str, cache_control: str = None):
+        return await self._run("copy_object", lambda: self._write(key, self._read(source_key)))
+
+    async def upload_stream(self, key: str, chunks, content_type: str):
+        # Written to a part file as the chunks arrive and moved in place at
+        # the end, so a rejected upload leaves nothing behind
+        path = self.path(key)
+        part = f"{path}.{unique_string(8)}.part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        file = await self._run("upload_stream", functools.partial(open, part, "wb"))
+        try:
+            async for chunk in chunks:
+                await self._run("upload_stream", functools.partial(file.write, chunk))
+            file.close()
+            os.replace(part, path)
+        except BaseException:
+            file.close()
+            os.remove(part)
+            raise
+
+    async def delete_objects(self, *keys: str):
+        return await self._run("delete_objects", functools.partial(self._delete, *keys))
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def _sign(self, policy: str) -> str:
+        return base64.urlsafe_b64encode(hmac.new(self._secret, policy.encode(), hashlib.sha256).digest()).decode()
+
+    def presigned_post(self, key: str, content_type: str, max_size: int, expires_in: int) -> dict:
+        policy = base64.urlsafe_b64encode(json.dumps({
+            "key": key,
+            "content_type": content_type,
+            "max_size": max_size,
+            "expires": int(time.time()) + expires_in,
+        }).encode()).decode()
+        return {
+            "url": self.upload_url,
+            "fields": {"key": key, "Content-Type": content_type, "policy": policy, "signature": self._sign(policy)},
+        }
+
+    def verify_policy(self, policy: str, signature: str) -> dict:
+        """The conditions of a presigned upload, None if forged or expired."""
+        if not hmac.compare_digest(self._sign(policy).encode(), signature.encode()):
+            return None
+        conditions = json.loads(base64.urlsafe_b64decode(policy))
+        if conditions["expires"] < time.time():
+            return None
+        return conditions
+
+
+def create_storage() -> Storage:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorage(
+            settings.STORAGE_LOCAL_PATH,
+            base_url=f"{settings.STORAGE_LOCAL_BASE_URL.rstrip('/')}/files",
+            upload_url=f"{settings.STORAGE_LOCAL_BASE_URL.rstrip('/')}/upload",
+            secret=settings.SECRET_KEY,
+            call_timeout=settings.AWS_S3_CALL_TIMEOUT,
+        )
+    return S3Storage(
+        settings.AWS_S3_BUCKET_NAME,
+        endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+        max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+        connect_timeout=settings.AWS_S3_CONNECT_TIMEOUT,
+        read_timeout=settings.AWS_S3_READ_TIMEOUT,
+        call_timeout=settings.AWS_S3_CALL_TIMEOUT,
+        client_kwargs={
+            "aws_access_key_id": settings.AWS_ACCESS_KEY_ID,
+            "aws_secret_access_key": settings.AWS_SECRET_ACCESS_KEY,
+        },
+    )
+
+
+storage = create_storage()
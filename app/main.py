@@ -1,25 +1,61 @@
+import asyncio
 from fastapi import  FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from app.config.database import sessionmanager
+from app.config.email import email_renderer
+from app.config.rate_limit import load_rate_limit_script
+from app.config.redis import redis_client
+from app.config.security import password_hasher, revoked_tokens
 from app.config.settings import settings
-from app.routes import episodes, users
-
-import redis.asyncio as redis
-from fastapi_limiter import FastAPILimiter
-from app.config.settings import settings
+from app.config.storage import LocalStorage, storage
+from app.services.email_outbox import run_outbox_worker
+from app.services.tokens import run_token_purger
+from app.services.images import image_processor
+from app.routes import episodes, leaderboard, metrics, storage as storage_routes, users
 
 version = "0.0.1"
 
-sessionmanager.init(settings.DATABASE_URI)
+sessionmanager.init(settings.DATABASE_URI, replica_hosts=settings.DATABASE_REPLICA_URIS)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # async with sessionmanager._engine.begin() as conn:     # this is ok if you are not using alembic for migrations
     #     await sessionmanager.create_all(conn)
-    redis_connection = redis.from_url(settings.REDIS_URI, encoding="utf8")
-    await FastAPILimiter.init(redis_connection)
+    await load_rate_limit_script()
+    replica_monitor = None
+    if settings.DATABASE_REPLICA_URIS:
+        replica_monitor = asyncio.create_task(
+            sessionmanager.monitor_replicas(settings.DATABASE_REPLICA_CHECK_INTERVAL)
+        )
+    revocation_sync = None
+    if settings.AUTH_STATELESS:
+        revocation_sync = asyncio.create_task(
+            revoked_tokens.run(settings.AUTH_REVOCATION_SYNC_INTERVAL)
+        )
+    email_worker = None
+    if settings.EMAIL_OUTBOX_IN_APP:
+        email_worker = asyncio.create_task(run_outbox_worker())
+    token_purger = None
+    if settings.AUTH_TOKEN_PURGE_IN_APP:
+        token_purger = asyncio.create_task(run_token_purger())
     yield
+    if token_purger is not None:
+        token_purger.cancel()
+        await asyncio.gather(token_purger, return_exceptions=True)
+    if email_worker is not None:
+        email_worker.cancel()
+        await asyncio.gather(email_worker, return_exceptions=True)
+    if replica_monitor is not None:
+        replica_monitor.cancel()
+    if revocation_sync is not None:
+        revocation_sync.cancel()
+    password_hasher.shutdown()
+    storage.shutdown()
+    image_processor.shutdown()
+    email_renderer.shutdown()
+    await redis_client.aclose()
     if sessionmanager._engine is not None:
         await sessionmanager.close()
 
@@ -55,4 +91,10 @@ app.include_router(users.user_router)
 app.include_router(users.guest_router)
 app.include_router(users.profile_router)
 app.include_router(episodes.episode_router)
+app.include_router(leaderboard.leaderboard_router)
+app.include_router(metrics.metrics_router)
+
+if isinstance(storage, LocalStorage):
+    app.include_router(storage_routes.storage_router)
+    app.mount("/storage/files", StaticFiles(directory=storage.root), name="storage")
 
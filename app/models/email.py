@@ -0,0 +1,32 @@
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy import JSON, Index
+from datetime import datetime
+from app.config.database import Base
+from app.utils.enum import EmailStatus
+
+
+class EmailOutbox(Base):
+    """
+    An email waiting to be sent, or already sent.
+
+    Rows are added in the same transaction as the action the email is about,
+    so an email is queued exactly when that action commits. The outbox worker
+    sends them, pushing `next_attempt_at` back while it holds a row and after
+    each failed attempt.
+    """
+    __tablename__ = "email_outbox"
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    recipients: Mapped[list] = mapped_column(JSON, nullable=False)
+    subject: Mapped[str] = mapped_column(nullable=False)
+    template_name: Mapped[str] = mapped_column(nullable=False)
+    context: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[str] = mapped_column(default=EmailStatus.PENDING.value)
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    last_error: Mapped[str] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    sent_at: Mapped[datetime] = mapped_column(nullable=True)
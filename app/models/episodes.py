@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING, List
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import ForeignKey, func
+from sqlalchemy import ForeignKey, Index, UniqueConstraint, func
 from datetime import datetime
 from app.config.database import Base
 
@@ -9,6 +9,9 @@ if TYPE_CHECKING:
 
 class Episode(Base):
     __tablename__ = "episodes"
+    __table_args__ = (
+        Index("ix_episodes_juz", "juz"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     juz: Mapped[int] = mapped_column(nullable=False)
     description: Mapped[str] = mapped_column(nullable=False)
@@ -16,6 +19,8 @@ class Episode(Base):
     progress: Mapped[int] = mapped_column(default=0)
     created_at: Mapped[datetime] = mapped_column(default=func.now())
     is_full: Mapped[bool] = mapped_column(default=False)
+    # kept in step with the members table by join, exit and create
+    member_count: Mapped[int] = mapped_column(default=0, server_default="0")
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
 
     user: Mapped["User"] = relationship("User", back_populates="episodes")
@@ -24,9 +29,26 @@ class Episode(Base):
 class Member(Base):
     __tablename__ = "members"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    # a user can only be a member of one episode at a time
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, unique=True, index=True)
     episode_id: Mapped[int] = mapped_column(ForeignKey("episodes.id"), nullable=False)
     joined_at: Mapped[datetime] = mapped_column(default=func.now())
 
     user: Mapped["User"] = relationship("User", back_populates="members")
     episode: Mapped["Episode"] = relationship("Episode", back_populates="members")
+
+
+class ReadingEvent(Base):
+    """A juz a member finished reading, as reported by their client."""
+    __tablename__ = "reading_events"
+    __table_args__ = (
+        # clients resend events after going offline, their own ids deduplicate them
+        UniqueConstraint("user_id", "client_event_id", name="uq_reading_events_user_client_event"),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    client_event_id: Mapped[str] = mapped_column(nullable=False)
+    episode_id: Mapped[int] = mapped_column(ForeignKey("episodes.id", ondelete="CASCADE"), nullable=False, index=True)
+    juz: Mapped[int] = mapped_column(nullable=False)
+    read_at: Mapped[datetime] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(default=func.now())
@@ -0,0 +1,29 @@
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy import JSON, Index, func
+from datetime import datetime
+from app.config.database import Base
+
+
+class StoredImage(Base):
+    """
+    An image object in storage, keyed by the hash of its content.
+
+    `refcount` counts the users showing it. Identical uploads share the row
+    and the object. An image nobody uses anymore keeps both until
+    `purge_released_images` removes them after a grace period, so re-uploading
+    it in the meantime is free.
+    """
+    __tablename__ = "stored_images"
+    __table_args__ = (
+        Index("ix_stored_images_released_at", "released_at"),
+    )
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    content_type: Mapped[str] = mapped_column(nullable=False)
+    size: Mapped[int] = mapped_column(nullable=False)
+    refcount: Mapped[int] = mapped_column(default=0)
+    # derivative URLs by variant, once made
+    variants: Mapped[dict] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(default=func.now())
+    # when refcount last dropped to zero
+    released_at: Mapped[datetime] = mapped_column(nullable=True)
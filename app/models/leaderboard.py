@@ -0,0 +1,37 @@
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy import ForeignKey, Index, func
+from datetime import date, datetime
+from app.config.database import Base
+
+
+class ScoreCheckpoint(Base):
+    """A user's totals when the snapshot job last ran, to compute deltas from."""
+    __tablename__ = "score_checkpoints"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    points: Mapped[int] = mapped_column(default=0)
+    no_of_khatmis: Mapped[int] = mapped_column(default=0)
+    taken_at: Mapped[datetime] = mapped_column(default=func.now())
+
+
+class LeaderboardSnapshot(Base):
+    """
+    Points and khatmis a user earned within one window, with their rank in it.
+
+    A window, e.g. ("weekly", 2026-10-12), is one partition: only users that
+    earned something in it have a row, and every read stays within it.
+    """
+    __tablename__ = "leaderboard_snapshots"
+    __table_args__ = (
+        Index("ix_leaderboard_snapshots_window_rank", "period", "period_start", "rank"),
+        Index("ix_leaderboard_snapshots_window_user", "period", "period_start", "user_id", unique=True),
+        Index("ix_leaderboard_snapshots_user", "user_id", "period", "period_start"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    period: Mapped[str] = mapped_column(nullable=False)
+    period_start: Mapped[date] = mapped_column(nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    points: Mapped[int] = mapped_column(default=0)
+    no_of_khatmis: Mapped[int] = mapped_column(default=0)
+    rank: Mapped[int] = mapped_column(nullable=True)
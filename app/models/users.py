@@ -1,5 +1,5 @@
 from sqlalchemy.orm import mapped_column, Mapped , relationship
-from sqlalchemy import func, ForeignKey
+from sqlalchemy import JSON, Index, func, ForeignKey
 from typing import TYPE_CHECKING
 from datetime import datetime
 from app.config.database import Base
@@ -16,6 +16,8 @@ class User(Base):
     email: Mapped[str] = mapped_column(nullable=False, unique=True)
     password: Mapped[str] = mapped_column(nullable=False)
     profile_image: Mapped[str] = mapped_column(nullable=True)
+    # thumbnail URLs by variant, e.g. "small_webp", made after each upload
+    profile_image_variants: Mapped[dict] = mapped_column(JSON, nullable=True)
     points: Mapped[int] = mapped_column(default=0)
     no_of_khatmis: Mapped[int] = mapped_column(default=0)
     is_active: Mapped[bool] = mapped_column(default=False)
@@ -35,6 +37,12 @@ class User(Base):
 
 class UserToken(Base):
     __tablename__ = "user_tokens"
+    __table_args__ = (
+        # a user's sessions, for the session cap and password resets
+        Index("ix_user_tokens_user_id_expires_at", "user_id", "expires_at"),
+        # expired sessions, for the purge
+        Index("ix_user_tokens_expires_at", "expires_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True , index=True , autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -1,4 +1,6 @@
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from pydantic_core import to_json
 
 class BaseResponse(BaseModel):
     model_config = {
@@ -6,3 +8,10 @@ class BaseResponse(BaseModel):
         'arbitrary_types_allowed': True
 
     }
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded by pydantic-core rather than the json module."""
+
+    def render(self, content) -> bytes:
+        return to_json(content)
@@ -1,5 +1,7 @@
-from pydantic import BaseModel
+from datetime import datetime
+from pydantic import BaseModel, TypeAdapter
 from typing import Optional
+from app.responses.base import BaseResponse
 from app.utils.enum import Juz
 
 class AddEpisodeResponse(BaseModel):
@@ -7,4 +9,48 @@ class AddEpisodeResponse(BaseModel):
     description: str
     no_of_khatmis: int
     progress: int
-    
+
+
+class EpisodeResponse(BaseResponse):
+    id: int
+    juz: int
+    description: str
+    no_of_khatmis: int
+    progress: int
+    created_at: datetime
+    is_full: bool
+    member_count: int
+    user_id: int
+
+
+# Validates and dumps a list of episode rows in one pass
+episode_list_adapter = TypeAdapter(list[EpisodeResponse])
+
+
+class EpisodePageResponse(BaseModel):
+    items: list[EpisodeResponse]
+    next_cursor: Optional[str] = None
+
+
+class BulkMemberResult(BaseModel):
+    user_id: int
+    status: str
+
+
+class BulkMembershipResponse(BaseModel):
+    episode_id: int
+    member_count: int
+    results: list[BulkMemberResult]
+
+
+class ReadingEventResult(BaseModel):
+    client_event_id: str
+    status: str
+
+
+class ReadingProgressResponse(BaseModel):
+    episode_id: Optional[int] = None
+    progress: Optional[int] = None
+    no_of_khatmis: Optional[int] = None
+    points: Optional[int] = None
+    results: list[ReadingEventResult]
@@ -0,0 +1,57 @@
+from datetime import date
+from pydantic import BaseModel, Field
+from typing import Optional
+from app.utils.enum import LeaderboardPeriod
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    first_name: str
+    last_name: str
+    profile_image: Optional[str] = None
+    profile_image_thumbnail: Optional[str] = None
+    points: int
+
+
+class BoardRank(BaseModel):
+    rank: Optional[int] = None
+    points: Optional[int] = None
+
+
+class EpisodeBoardRank(BoardRank):
+    episode_id: int
+
+
+class JuzBoardRank(BoardRank):
+    juz: int
+
+
+class MyRanksResponse(BaseModel):
+    global_: BoardRank = Field(alias="global")
+    episode: Optional[EpisodeBoardRank] = None
+    juz: Optional[JuzBoardRank] = None
+
+
+class SnapshotEntry(BaseModel):
+    rank: int
+    user_id: int
+    first_name: str
+    last_name: str
+    profile_image: Optional[str] = None
+    profile_image_thumbnail: Optional[str] = None
+    points: int
+    no_of_khatmis: int
+
+
+class SnapshotPageResponse(BaseModel):
+    period: LeaderboardPeriod
+    period_start: date
+    items: list[SnapshotEntry]
+
+
+class MySnapshotEntry(BaseModel):
+    period_start: date
+    rank: int
+    points: int
+    no_of_khatmis: int
@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Optional, Union
 from datetime import datetime
 from pydantic import EmailStr, BaseModel
 from app.responses.base import BaseResponse
@@ -9,10 +9,12 @@ class UserResponse(BaseResponse):
     first_name: str
     email: EmailStr
     profile_image: str
+    profile_image_variants: Optional[dict[str, str]] = None
     points: int
     no_of_khatmis: int
     is_active: bool
     created_at: Union[str, None, datetime] = None
+    updated_at: Union[str, None, datetime] = None
 
 
 class LoginResponse(BaseModel):
@@ -20,3 +22,10 @@ class LoginResponse(BaseModel):
     # refresh_token: str
     expires_in: int
     token_type: str = "Bearer"
+
+
+class ProfileUploadResponse(BaseModel):
+    url: str
+    fields: dict[str, str]
+    key: str
+    expires_in: int
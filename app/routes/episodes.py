@@ -1,11 +1,17 @@
-from fastapi import APIRouter, HTTPException, status
+from typing import Annotated, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
-from app.config.dependencies import db_dependency
-from app.config.security import user_dependency
+from app.config.dependencies import cached_read_db_dependency, db_dependency, read_db_dependency
+from app.config.response_cache import EPISODE_LIST_TAG, cache_bypass_dependency, cached_response, episode_collection_version, episode_tag
+from app.config.security import admin_dependency, user_dependency
+from app.config.settings import settings
 from app.models.episodes import Episode
-from app.services.episodes import create_episode, exit_episode_service, get_all_episodes_service, get_episode_by_id_service, get_episode_by_juz_service, get_episode_members_service, join_episode_service
-from app.schemas.episodes import AddEpisodeRequest, JoinEpisodeRequest
-from app.responses.episodes import AddEpisodeResponse
+from app.services.episodes import bulk_exit_episode_service, bulk_join_episode_service, bulk_transfer_episode_service, create_episode, exit_episode_service, export_episodes_service, get_all_episodes_service, get_episode_by_id_service, get_episode_by_juz_service, get_episode_members_service, ingest_progress_service, join_episode_service
+from app.schemas.episodes import AddEpisodeRequest, BulkMembershipRequest, BulkTransferRequest, EpisodeFilters, JoinEpisodeRequest, ReadingProgressRequest
+from app.responses.base import FastJSONResponse
+from app.responses.episodes import AddEpisodeResponse, BulkMembershipResponse, EpisodePageResponse, EpisodeResponse, ReadingProgressResponse, episode_list_adapter
+from app.utils.etag import EPISODE_VERSION_FIELDS, etag_matches, make_etag, not_modified, row_etag
 
 episode_router = APIRouter(
     prefix="/episodes",
@@ -22,25 +28,96 @@ async def add_episode(data: AddEpisodeRequest, db: db_dependency, user: user_dep
 async def join_episode(data: JoinEpisodeRequest, db: db_dependency, user: user_dependency):
     return await join_episode_service(data, db, user)
 
-@episode_router.get("/episodes", status_code=status.HTTP_200_OK)
-async def get_all_episodes(db: db_dependency):
-    return await get_all_episodes_service(db )
+@episode_router.post("/progress", status_code=status.HTTP_200_OK, response_model=ReadingProgressResponse)
+async def report_progress(data: ReadingProgressRequest, db: db_dependency, user: user_dependency):
+    return await ingest_progress_service(data, db, user)
 
-@episode_router.get("/episodes/{episode_id}", status_code=status.HTTP_200_OK)
-async def get_episode_by_id(episode_id: int, db: db_dependency):
-    return await get_episode_by_id_service(episode_id, db)
+@episode_router.get("/episodes", status_code=status.HTTP_200_OK, response_model=EpisodePageResponse)
+async def get_all_episodes(
+    db: db_dependency,
+    filters: Annotated[EpisodeFilters, Depends()],
+    bypass: cache_bypass_dependency,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.EPISODE_PAGE_SIZE, ge=1, le=settings.EPISODE_MAX_PAGE_SIZE),
+    if_none_match: Optional[str] = Header(None),
+):
+    # Read the version before the rows, a change in between only costs a
+    # full response on the next request. The rows come from the primary: a
+    # lagging replica could still show them from before the version moved.
+    version = await episode_collection_version()
+    key = f"{filters.model_dump_json()}:{cursor}:{limit}"
+    headers = {}
+    if version is not None:
+        etag = make_etag(version, key)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        headers["ETag"] = etag
+    page = await cached_response(
+        f"episodes:{version}:{key}",
+        lambda: get_all_episodes_service(db, filters, cursor, limit),
+        tags=[EPISODE_LIST_TAG],
+        model=EpisodePageResponse,
+        bypass=bypass,
+    )
+    # Cached bodies are already validated, send them as they are
+    return FastJSONResponse(page, headers=headers)
 
-@episode_router.get("/episode_members/{episode_id}", status_code=status.HTTP_200_OK)
-async def get_episode_members(episode_id: int, db: db_dependency):
-    return await get_episode_members_service(episode_id, db)
+@episode_router.get("/export", status_code=status.HTTP_200_OK)
+async def export_episodes(user: admin_dependency, filters: Annotated[EpisodeFilters, Depends()]):
+    return StreamingResponse(export_episodes_service(filters), media_type="application/json")
 
-@episode_router.get("/episodes/{episode_juz}", status_code=status.HTTP_200_OK)
-async def get_episode_by_juz(episode_juz: int, db: db_dependency):
-    episode = await get_episode_by_juz_service(episode_juz, db)
-    if not episode:
+@episode_router.get("/episodes/{episode_id}", status_code=status.HTTP_200_OK, response_model=Optional[EpisodeResponse])
+async def get_episode_by_id(
+    episode_id: int,
+    db: cached_read_db_dependency,
+    bypass: cache_bypass_dependency,
+    if_none_match: Optional[str] = Header(None),
+):
+    episode = await cached_response(
+        f"episode:{episode_id}",
+        lambda: get_episode_by_id_service(episode_id, db),
+        tags=[episode_tag(episode_id)],
+        model=EpisodeResponse,
+        bypass=bypass,
+    )
+    headers = {}
+    if episode is not None:
+        etag = row_etag(episode, EPISODE_VERSION_FIELDS)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        headers["ETag"] = etag
+    return FastJSONResponse(episode, headers=headers)
+
+@episode_router.get("/episode_members/{episode_id}", status_code=status.HTTP_200_OK, response_model=int)
+async def get_episode_members(episode_id: int, db: cached_read_db_dependency, bypass: cache_bypass_dependency):
+    member_count = await cached_response(
+        f"episode_members:{episode_id}",
+        lambda: get_episode_members_service(episode_id, db),
+        tags=[episode_tag(episode_id)],
+        bypass=bypass,
+    )
+    return FastJSONResponse(member_count)
+
+@episode_router.get("/episodes/{episode_juz}", status_code=status.HTTP_200_OK, response_model=list[EpisodeResponse])
+async def get_episode_by_juz(episode_juz: int, db: read_db_dependency):
+    episodes = await get_episode_by_juz_service(episode_juz, db)
+    if not episodes:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Episode not found")
-    return episode
+    episodes = episode_list_adapter.validate_python(episodes)
+    return Response(episode_list_adapter.dump_json(episodes), media_type="application/json")
 
 @episode_router.delete("/exit/{episode_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def exit_episode(episode_id: int, db: db_dependency, user: user_dependency):
     return await exit_episode_service(episode_id, db, user)
+
+@episode_router.post("/bulk/join", status_code=status.HTTP_200_OK, response_model=BulkMembershipResponse)
+async def bulk_join_episode(data: BulkMembershipRequest, db: db_dependency, user: admin_dependency):
+    return await bulk_join_episode_service(data, db)
+
+@episode_router.post("/bulk/exit", status_code=status.HTTP_200_OK, response_model=BulkMembershipResponse)
+async def bulk_exit_episode(data: BulkMembershipRequest, db: db_dependency, user: admin_dependency):
+    return await bulk_exit_episode_service(data, db)
+
+@episode_router.post("/bulk/transfer", status_code=status.HTTP_200_OK, response_model=BulkMembershipResponse)
+async def bulk_transfer_episode(data: BulkTransferRequest, db: db_dependency, user: admin_dependency):
+    return await bulk_transfer_episode_service(data, db)
@@ -0,0 +1,73 @@
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Path, Query, status
+from app.config.dependencies import db_dependency, read_db_dependency
+from app.config.security import admin_dependency, user_dependency
+from app.config.settings import settings
+from app.utils.enum import LeaderboardPeriod
+from app.responses.leaderboard import LeaderboardEntry, MyRanksResponse, MySnapshotEntry, SnapshotPageResponse
+from app.services.leaderboard import (
+    GLOBAL_BOARD,
+    episode_board,
+    get_my_ranks_service,
+    get_my_snapshots_service,
+    get_snapshot_service,
+    get_top_service,
+    juz_board,
+    rebuild_leaderboards,
+)
+
+leaderboard_router = APIRouter(
+    prefix="/leaderboard",
+    tags=["Leaderboard"],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+page_offset = Query(0, ge=0)
+page_limit = Query(settings.LEADERBOARD_PAGE_SIZE, ge=1, le=settings.LEADERBOARD_MAX_PAGE_SIZE)
+
+
+@leaderboard_router.get("/global", status_code=status.HTTP_200_OK, response_model=list[LeaderboardEntry])
+async def global_leaderboard(db: read_db_dependency, offset: int = page_offset, limit: int = page_limit):
+    return await get_top_service(GLOBAL_BOARD, offset, limit, db)
+
+
+@leaderboard_router.get("/juz/{juz}", status_code=status.HTTP_200_OK, response_model=list[LeaderboardEntry])
+async def juz_leaderboard(
+    db: read_db_dependency,
+    juz: int = Path(ge=1, le=30),
+    offset: int = page_offset,
+    limit: int = page_limit,
+):
+    return await get_top_service(juz_board(juz), offset, limit, db)
+
+
+@leaderboard_router.get("/episode/{episode_id}", status_code=status.HTTP_200_OK, response_model=list[LeaderboardEntry])
+async def episode_leaderboard(episode_id: int, db: read_db_dependency, offset: int = page_offset, limit: int = page_limit):
+    return await get_top_service(episode_board(episode_id), offset, limit, db)
+
+
+@leaderboard_router.get("/me", status_code=status.HTTP_200_OK, response_model=MyRanksResponse)
+async def my_ranks(db: read_db_dependency, user: user_dependency):
+    return await get_my_ranks_service(user, db)
+
+
+@leaderboard_router.get("/snapshots/{period}", status_code=status.HTTP_200_OK, response_model=SnapshotPageResponse)
+async def snapshot_leaderboard(
+    period: LeaderboardPeriod,
+    db: read_db_dependency,
+    day: Optional[date] = None,
+    offset: int = page_offset,
+    limit: int = page_limit,
+):
+    return await get_snapshot_service(period, day, offset, limit, db)
+
+
+@leaderboard_router.get("/snapshots/{period}/me", status_code=status.HTTP_200_OK, response_model=list[MySnapshotEntry])
+async def my_snapshots(period: LeaderboardPeriod, db: read_db_dependency, user: user_dependency, limit: int = page_limit):
+    return await get_my_snapshots_service(user, period, limit, db)
+
+
+@leaderboard_router.post("/rebuild", status_code=status.HTTP_200_OK)
+async def rebuild(db: db_dependency, user: admin_dependency):
+    return {"users": await rebuild_leaderboards(db)}
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, status
+from app.config.database import sessionmanager
+from app.config.email import email_renderer
+from app.config.rate_limit import rate_limit_stats, rate_limits
+from app.config.response_cache import response_cache
+from app.config.dependencies import read_db_dependency
+from app.config.security import admin_dependency, password_hasher, user_cache
+from app.config.storage import storage
+from app.services.email_outbox import outbox_stats, outbox_status
+
+metrics_router = APIRouter(
+    prefix="/metrics",
+    tags=["Metrics"],
+    responses={401: {"description": "Unauthorized"}}
+)
+
+
+@metrics_router.get("/database", status_code=status.HTTP_200_OK)
+async def database_metrics(user: admin_dependency):
+    return sessionmanager.pool_status()
+
+
+@metrics_router.get("/auth-cache", status_code=status.HTTP_200_OK)
+async def auth_cache_metrics(user: admin_dependency):
+    return {**user_cache.stats.as_dict(), "local_entries": len(user_cache.local)}
+
+
+@metrics_router.get("/password-hashing", status_code=status.HTTP_200_OK)
+async def password_hashing_metrics(user: admin_dependency):
+    return {"executor": password_hasher.kind, "workers": password_hasher.max_workers, **password_hasher.stats.as_dict()}
+
+
+
+@metrics_router.get("/storage", status_code=status.HTTP_200_OK)
+async def storage_metrics(user: admin_dependency):
+    return storage.pool_status()
+
+
+@metrics_router.get("/email", status_code=status.HTTP_200_OK)
+async def email_metrics(user: admin_dependency, db: read_db_dependency):
+    return {
+        "worker": outbox_stats.as_dict(),
+        "outbox": await outbox_status(db),
+        "rendering": email_renderer.stats.as_dict(),
+    }
+
+
+@metrics_router.get("/rate-limit", status_code=status.HTTP_200_OK)
+async def rate_limit_metrics(user: admin_dependency):
+    return {**rate_limit_stats.as_dict(), "local_clients": sum(len(limit.local) for limit in rate_limits)}
+
+
+@metrics_router.get("/response-cache", status_code=status.HTTP_200_OK)
+async def response_cache_metrics(user: admin_dependency):
+    return {**response_cache.stats.as_dict(), "local_entries": len(response_cache.local)}
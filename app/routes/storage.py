@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from app.config.storage import storage
+from app.utils.profile import iter_upload_file
+
+# Only mounted with the local storage backend, stands in for the presigned
+# POST endpoint of the bucket
+storage_router = APIRouter(
+    prefix="/storage",
+    tags=["Storage"],
+)
+
+
+@storage_router.post("/upload", status_code=status.HTTP_204_NO_CONTENT)
+async def upload_object(request: Request):
+    # Read the form by hand, S3 names the field "Content-Type"
+    form = await request.form()
+    key, content_type, file = form.get("key"), form.get("Content-Type"), form.get("file")
+    conditions = storage.verify_policy(form.get("policy", ""), form.get("signature", ""))
+    if not conditions or conditions["key"] != key or conditions["content_type"] != content_type:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired upload policy")
+    if file is None or isinstance(file, str):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file provided")
+
+    body = bytearray()
+    async for chunk in iter_upload_file(file):
+        body += chunk
+        if len(body) > conditions["max_size"]:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload is too large")
+    await storage.put_object(key, bytes(body), content_type)
@@ -1,12 +1,16 @@
-from fastapi import APIRouter, File, HTTPException, Request, UploadFile, status, BackgroundTasks, Depends, Response
+from typing import Optional
+from fastapi import APIRouter, File, Header, HTTPException, Request, UploadFile, status, BackgroundTasks, Depends, Response
 from fastapi.responses import JSONResponse
 from sqlalchemy import select
 
 
 from app.models.users import User
-from app.responses.user import UserResponse
-from app.schemas.users import EmailRequest, RegisterUserRequest, ResetRequest, VerifyUserRequest
-from app.config.dependencies import db_dependency
+from app.responses.user import ProfileUploadResponse, UserResponse
+from app.schemas.users import ConfirmProfileUploadRequest, EmailRequest, ProfileUploadRequest, RegisterUserRequest, ResetRequest, VerifyUserRequest
+from app.config.dependencies import cached_read_db_dependency, db_dependency, read_db_dependency
+from app.config.response_cache import cache_bypass_dependency, cached_response, user_tag
+from app.utils.etag import PROFILE_VERSION_FIELDS, etag_matches, not_modified, row_etag
+from app.config.settings import settings
 from app.services.user import (
     create_user,
     activate_user_account,
@@ -15,14 +19,16 @@ from app.services.user import (
     email_forgot_password_link,
     reset_user_password,
     fetch_user_details,
-    upload_profile
+    logout,
+    upload_profile,
+    create_profile_upload,
+    confirm_profile_upload
 )
+from app.utils.profile import iter_upload_file
 from fastapi.security import OAuth2PasswordRequestForm
 from app.config.security import (
     oauth2_scheme, get_current_user, user_dependency)
-from fastapi_limiter.depends import RateLimiter
-
-from app.services.profile import upload_profile_image
+from app.config.rate_limit import RateLimit
 
 
 user_router = APIRouter(
@@ -50,30 +56,47 @@ profile_router = APIRouter(
 @user_router.post("/Signup", status_code=status.HTTP_201_CREATED)
 async def register_new_user(
     data: RegisterUserRequest,
-    background_tasks: BackgroundTasks,
     db: db_dependency,
 
 ):
-    return await create_user(data, background_tasks, db)
+    return await create_user(data, db)
 
 
 
 @user_router.post("/verify-account", status_code=status.HTTP_200_OK)
 async def verify_user_account(
-    data: VerifyUserRequest, background_tasks: BackgroundTasks, db: db_dependency
+    data: VerifyUserRequest, db: db_dependency
 ):
-    await activate_user_account(data, db, background_tasks)
+    await activate_user_account(data, db)
     return JSONResponse({"message": "Account is activated successfully."})
 
-@profile_router.put("/upload-profile-image", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimiter(times=5, hours=24))])
+@profile_router.put("/upload-profile-image", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimit(times=5, hours=24))])
 async def upload_profile_pic(
     db: db_dependency,
     user: user_dependency,
+    background_tasks: BackgroundTasks,
     profile_image: UploadFile = File(...)
 ):
-   return await upload_profile(profile_image=profile_image, db=db, user=user)
-
-@guest_router.post("/login", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+   return await upload_profile(iter_upload_file(profile_image), db=db, user=user, background_tasks=background_tasks)
+
+@profile_router.put("/image", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimit(times=5, hours=24))])
+async def upload_profile_image_stream(request: Request, db: db_dependency, user: user_dependency, background_tasks: BackgroundTasks):
+    # The raw image as the request body, streamed straight to storage
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.PROFILE_IMAGE_MAX_SIZE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Profile image is too large")
+    return await upload_profile(request.stream(), db=db, user=user, background_tasks=background_tasks)
+
+@profile_router.post("/image/upload-url", status_code=status.HTTP_200_OK, response_model=ProfileUploadResponse, dependencies=[Depends(RateLimit(times=5, hours=24))])
+async def create_profile_image_upload(data: ProfileUploadRequest, user: user_dependency):
+    # The client uploads the image straight to storage, then confirms it
+    return await create_profile_upload(data, user)
+
+@profile_router.post("/image/confirm", status_code=status.HTTP_200_OK)
+async def confirm_profile_image_upload(data: ConfirmProfileUploadRequest, db: db_dependency, user: user_dependency, background_tasks: BackgroundTasks):
+    return await confirm_profile_upload(data, db, user, background_tasks)
+
+@guest_router.post("/login", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimit(times=5, seconds=60))])
 async def login_user(
     response: Response,
     db: db_dependency,
@@ -82,34 +105,52 @@ async def login_user(
     return await get_login_token(data, db, response)
 
 
-@guest_router.post("/logout", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def logout_user(response: Response):
-    response.delete_cookie(key="refresh_token")
+@guest_router.post("/logout", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimit(times=5, seconds=60))])
+async def logout_user(request: Request, response: Response):
+    await logout(request, response)
     return JSONResponse({"message": "Logout successfully."})
 
 
-@guest_router.post("/refresh", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+@guest_router.post("/refresh", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimit(times=5, seconds=60))])
 async def refresh_token(response: Response, request: Request, db: db_dependency):
     return await get_refresh_token(request, response, db)
 
 
-@guest_router.post("/forgot-password", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-async def forgot_password(data: EmailRequest, background_tasks: BackgroundTasks, db: db_dependency):
-    await email_forgot_password_link(data, background_tasks, db)
+@guest_router.post("/forgot-password", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimit(times=5, seconds=60))])
+async def forgot_password(data: EmailRequest, db: db_dependency):
+    await email_forgot_password_link(data, db)
     return JSONResponse({"message": "Password reset link is sent to your email."})
 
 
-@guest_router.put("/reset-password", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimiter(times=5, seconds=60))])
+@guest_router.put("/reset-password", status_code=status.HTTP_200_OK, dependencies=[Depends(RateLimit(times=5, seconds=60))])
 async def reset_password(data: ResetRequest,  db: db_dependency):
     await reset_user_password(data, db)
     return JSONResponse({"message": "Password reset successfully."})
 
 
 @profile_router.get("/me", status_code=status.HTTP_200_OK, response_model=UserResponse)
-async def fetch_user(user=Depends(get_current_user)):
+async def fetch_user(response: Response, db: read_db_dependency, user=Depends(get_current_user), if_none_match: Optional[str] = Header(None)):
+    # Stateless authentication only carries a few claims, load the full profile
+    if settings.AUTH_STATELESS:
+        user = await fetch_user_details(user.id, db)
+    etag = row_etag(user, PROFILE_VERSION_FIELDS)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return user
 
 
 @profile_router.get("/{pk}", status_code=status.HTTP_200_OK, response_model=UserResponse)
-async def get_user_info(id, db: db_dependency):
-    return await fetch_user_details(id, db)
+async def get_user_info(id, response: Response, db: cached_read_db_dependency, bypass: cache_bypass_dependency, if_none_match: Optional[str] = Header(None)):
+    profile = await cached_response(
+        f"profile:{id}",
+        lambda: fetch_user_details(id, db),
+        tags=[user_tag(id)],
+        model=UserResponse,
+        bypass=bypass,
+    )
+    etag = row_etag(profile, PROFILE_VERSION_FIELDS)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return profile
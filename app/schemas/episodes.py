@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
 from app.utils.enum import Juz
 from typing import Optional
@@ -7,10 +8,38 @@ class AddEpisodeRequest(BaseModel):
     description: str = Field(..., min_length=20 , max_length=150)
 
 
+class EpisodeFilters(BaseModel):
+    juz: Optional[int] = Field(None, ge=1, le=30)
+    is_full: Optional[bool] = None
+    min_progress: Optional[int] = Field(None, ge=0)
+    max_progress: Optional[int] = Field(None, ge=0)
+
+
 class JoinEpisodeRequest(BaseModel):
     episode_id: int
 
 class MemberRequest(BaseModel):
     user_id: int
     episode_id: int
-   
+
+
+class BulkMembershipRequest(BaseModel):
+    episode_id: int
+    user_ids: list[int] = Field(..., min_length=1, max_length=500)
+
+
+class BulkTransferRequest(BaseModel):
+    from_episode_id: int
+    to_episode_id: int
+    user_ids: list[int] = Field(..., min_length=1, max_length=500)
+
+
+class ReadingEventRequest(BaseModel):
+    client_event_id: str = Field(..., min_length=1, max_length=64)
+    episode_id: int
+    juz: int = Field(..., ge=1, le=30)
+    read_at: datetime
+
+
+class ReadingProgressRequest(BaseModel):
+    events: list[ReadingEventRequest] = Field(..., min_length=1, max_length=500)
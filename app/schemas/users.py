@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import Literal, Optional
 class RegisterUserRequest(BaseModel):
     first_name: str
     last_name: str
@@ -17,3 +17,11 @@ class ResetRequest(BaseModel):
     token: str
     email: EmailStr
     password: str
+
+
+class ProfileUploadRequest(BaseModel):
+    content_type: Literal["image/jpeg", "image/png", "image/webp"]
+
+
+class ConfirmProfileUploadRequest(BaseModel):
+    key: str
@@ -1,14 +1,14 @@
 
-from app.config.security import hash_password
-from fastapi.background import BackgroundTasks
+from datetime import timedelta
+from app.config.security import generate_context_token
 from app.config.settings import settings
 from app.models.users import User
 from app.config.email import send_email
 from app.utils.email_context import FORGOT_PASSWORD, USER_VERIFY_ACCOUNT
 
-async def send_account_verification_email(user: User, background_tasks: BackgroundTasks):
-    string_context = user.get_context_string(context=USER_VERIFY_ACCOUNT)
-    token = hash_password(string_context)
+async def send_account_verification_email(user: User, db):
+    token = generate_context_token(
+        user, USER_VERIFY_ACCOUNT, timedelta(minutes=settings.VERIFY_ACCOUNT_TOKEN_EXPIRE_MINUTES))
     activate_url = f"{
         settings.FRONTEND_HOST}/auth/account-verify?token={token}&email={user.email}"
     data = {
@@ -22,11 +22,11 @@ async def send_account_verification_email(user: User, background_tasks: Backgrou
         subject=subject,
         template_name="account-verification.html",
         context=data,
-        background_tasks=background_tasks
+        db=db
     )
 
 
-async def send_account_activation_confirmation_email(user: User, background_tasks: BackgroundTasks):
+async def send_account_activation_confirmation_email(user: User, db):
     data = {
         'app_name': settings.APP_NAME,
         "name": user.first_name,
@@ -38,13 +38,13 @@ async def send_account_activation_confirmation_email(user: User, background_task
         subject=subject,
         template_name="account-verification-confirmation.html",
         context=data,
-        background_tasks=background_tasks
+        db=db
     )
 
 
-async def send_password_reset_email(user: User, background_tasks: BackgroundTasks):
-    sting_context = user.get_context_string(context=FORGOT_PASSWORD)
-    token = hash_password(sting_context)
+async def send_password_reset_email(user: User, db):
+    token = generate_context_token(
+        user, FORGOT_PASSWORD, timedelta(minutes=settings.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES))
     reset_url = f"{settings.FRONTEND_HOST}/reset-password?token={token}&email={user.email}"
     data = {
         'app_name': settings.APP_NAME,
@@ -57,6 +57,6 @@ async def send_password_reset_email(user: User, background_tasks: BackgroundTask
         subject=subject,
         template_name="password-reset.html",
         context=data,
-        background_tasks=background_tasks
+        db=db
     )
 
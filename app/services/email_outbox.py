@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+
+from app.config.database import sessionmanager
+from app.config.email import MailConnection, render_message
+from app.config.settings import settings
+from app.models.email import EmailOutbox
+from app.utils.enum import EmailStatus
+
+# Seconds a claimed email stays hidden from other workers, if the worker
+# holding it dies the email is sent again after this
+CLAIM_LEASE_SECONDS = 300
+# Seconds between deletes of old sent emails
+RETENTION_INTERVAL = 3600
+
+
+@dataclass
+class OutboxStats:
+    batches: int = 0
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+    send_seconds: float = 0.0
+    connections: int = 0
+    last_batch_at: float = None
+
+    def as_dict(self) -> dict:
+        return {
+            "batches": self.batches,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "connections": self.connections,
+            "send_seconds": round(self.send_seconds, 3),
+            "emails_per_second": round(self.sent / self.send_seconds, 2) if self.send_seconds else None,
+            "last_batch_at": self.last_batch_at,
+        }
+
+
+outbox_stats = OutboxStats()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next attempt, doubling with each failed one."""
+    seconds = settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.EMAIL_OUTBOX_RETRY_MAX_SECONDS))
+
+
+async def claim_emails(db, limit: int) -> list:
+    """
+    Take up to `limit` due emails for this worker and commit the claim.
+
+    The claim pushes `next_attempt_at` past the lease and counts the attempt.
+    It only matches rows that are still due, so when workers race for a row
+    one of them gets it and the others skip it.
+    """
+    now = datetime.utcnow()
+    due = (
+        select(EmailOutbox.id)
+        .where(EmailOutbox.status == EmailStatus.PENDING.value, EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at)
+        .limit(limit)
+    )
+    result = await db.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(due.scalar_subquery()), EmailOutbox.next_attempt_at <= now)
+        .values(
+            attempts=EmailOutbox.attempts + 1,
+            next_attempt_at=now + timedelta(seconds=CLAIM_LEASE_SECONDS),
+        )
+        .returning(
+            EmailOutbox.id,
+            EmailOutbox.recipients,
+            EmailOutbox.subject,
+            EmailOutbox.template_name,
+            EmailOutbox.context,
+            EmailOutbox.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    emails = result.all()
+    await db.commit()
+    return emails
+
+
+async def send_outbox_batch(db, connection: MailConnection, limit: int = None) -> int:
+    """
+    Send one batch of due emails over `connection`.
+
+    Sent emails are marked in one statement. A failed email is retried after
+    `retry_delay`, or marked failed once it used EMAIL_OUTBOX_MAX_ATTEMPTS.
+    Returns the number of emails claimed.
+    """
+    emails = await claim_emails(db, limit or settings.EMAIL_OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0
+
+    sent, failures = [], []
+    connections = connection.connections
+    started = time.perf_counter()
+    for email in emails:
+        try:
+            message = await render_message(email.recipients, email.subject, email.context, email.template_name)
+            await connection.send(message)
+            sent.append(email.id)
+        except Exception as error:
+            logging.warning(f"Could not send email {email.id}, attempt {email.attempts}: {error!r}")
+            failures.append((email, repr(error)))
+    elapsed = time.perf_counter() - started
+
+    now = datetime.utcnow()
+    if sent:
+        await db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id.in_(sent))
+            .values(status=EmailStatus.SENT.value, sent_at=now, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+    for email, error in failures:
+        if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+            values = {"status": EmailStatus.FAILED.value}
+            outbox_stats.failed += 1
+        else:
+            values = {"next_attempt_at": now + retry_delay(email.attempts)}
+            outbox_stats.retried += 1
+        await db.execute(
+            update(EmailOutbox)
+            .where(EmailOutbox.id == email.id)
+            .values(last_error=error[:1000], **values)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+
+    outbox_stats.batches += 1
+    outbox_stats.sent += len(sent)
+    outbox_stats.send_seconds += elapsed
+    outbox_stats.connections += connection.connections - connections
+    outbox_stats.last_batch_at = time.time()
+    return len(emails)
+
+
+async def purge_sent_emails(db, retention: timedelta = None) -> int:
+    """Delete sent emails older than EMAIL_OUTBOX_RETENTION_DAYS."""
+    cutoff = datetime.utcnow() - (retention or timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS))
+    result = await db.execute(
+        delete(EmailOutbox).where(EmailOutbox.status == EmailStatus.SENT.value, EmailOutbox.sent_at < cutoff)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def run_outbox_worker(poll_interval: float = None, batch_size: int = None):
+    """
+    Send queued emails until cancelled.
+
+    Full batches are sent back to back over one SMTP connection, the outbox
+    is polled every `poll_interval` seconds once it is drained.
+    """
+    poll_interval = poll_interval or settings.EMAIL_OUTBOX_POLL_INTERVAL
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    connection = MailConnection()
+    purged_at = 0.0
+    try:
+        while True:
+            try:
+                async with sessionmanager.session() as db:
+                    claimed = await send_outbox_batch(db, connection, batch_size)
+                    if time.monotonic() - purged_at > RETENTION_INTERVAL:
+                        await purge_sent_emails(db)
+                        purged_at = time.monotonic()
+            except Exception:
+                logging.exception("Email outbox worker failed")
+                claimed = 0
+            if claimed < batch_size:
+                await asyncio.sleep(poll_interval)
+    finally:
+        await connection.close()
+
+
+async def outbox_status(db) -> dict:
+    """Emails in the outbox by status, and the age of the oldest pending one."""
+    counts = await db.execute(
+        select(EmailOutbox.status, func.count()).group_by(EmailOutbox.status)
+    )
+    oldest = await db.execute(
+        select(func.min(EmailOutbox.created_at)).where(EmailOutbox.status == EmailStatus.PENDING.value)
+    )
+    oldest = oldest.scalar()
+    return {
+        **{status.value: 0 for status in EmailStatus},
+        **dict(counts.all()),
+        "oldest_pending_seconds": round((datetime.utcnow() - oldest).total_seconds(), 1) if oldest else None,
+    }
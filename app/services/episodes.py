@@ -2,11 +2,27 @@
 from fastapi import HTTPException,status
 from sqlalchemy import delete, func, select,bindparam, Integer
 
-from app.models.episodes import Episode, Member
-from app.utils.episode import check_episode_condition
-
-from sqlalchemy import select, func
+import json
+
+from app.config.database import sessionmanager
+from app.config.response_cache import invalidate_episode_responses
+from app.config.security import invalidate_user_cache
+from app.models.episodes import Episode, Member, ReadingEvent
+from app.models.users import User
+from app.services.leaderboard import add_board_members, award_points, remove_board_members
+from app.utils.episode import (
+    MAX_EPISODE_MEMBERS,
+    MAX_JOIN_PROGRESS,
+    JUZ_PER_KHATMA,
+    POINTS_PER_JUZ,
+    check_episode_condition,
+    decode_episode_cursor,
+    encode_episode_cursor,
+)
+
+from sqlalchemy import insert, select, func, update
 from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import joinedload
 
 async def create_episode(data, db, user):
@@ -36,16 +52,14 @@ async def create_episode(data, db, user):
 
     if episode:
         # Check if the episode has reached the maximum number of members
-        query = select(func.count(Member.id)).where(Member.episode_id == episode.id)
-        member_count = await db.execute(query)
-        member_count = member_count.scalar_one()
+        member_count = episode.member_count
 
         # Allow creating a new episode if the current episode has 50 or more members
-        if member_count < 50:
+        if member_count < MAX_EPISODE_MEMBERS:
             raise HTTPException(status_code=400, detail="An active episode with fewer than 50 members already exists. Please join it instead of creating a new one.")
 
         # Set is_full to True if the current episode will be full after this user joins
-        if member_count == 49:
+        if member_count == MAX_EPISODE_MEMBERS - 1:
             is_full = True
 
     # Create a new episode, with is_full now properly initialized
@@ -54,21 +68,32 @@ async def create_episode(data, db, user):
         description=data.description,
         progress=0,
         is_full=is_full,
+        member_count=1,
         user_id=user_id
     )
     db.add(new_episode)
-    await db.commit()
     await db.flush()
 
-    # Add the user as the first member of the new episode
+    # Add the user as the first member of the new episode, in the same
+    # transaction so member_count never disagrees with the members table
     new_member = Member(
         user_id=user_id,
         episode_id=new_episode.id,
         joined_at=func.now(),
     )
     db.add(new_member)
-    await db.commit()
-    await db.flush()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent create or join of the same user committed first, the
+        # unique index on members.user_id rolls this episode back
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="You are already a member of an episode. Please exit your current episode before creating a new one."
+        )
+    await invalidate_episode_responses(new_episode.id)
+    await add_board_members(new_episode.id, new_episode.juz, [user_id])
 
     return new_episode
 
@@ -79,49 +104,62 @@ async def join_episode_service(data, db, user):
 
     user_id = user.id
 
-    # Check if the user is already a member of any episode
-    query = select(Member).where(Member.user_id == user_id)
-    existing_member = await db.execute(query)
-    existing_member = existing_member.scalar_one_or_none()
+    # Reserve a seat with one conditional UPDATE. It checks capacity and
+    # progress, takes the seat and flips is_full on the last one, and locks
+    # the episode row so concurrent joiners can never push it past the cap.
+    reserved = await db.execute(
+        update(Episode)
+        .where(
+            Episode.id == data.episode_id,
+            Episode.is_full == False,
+            Episode.member_count < MAX_EPISODE_MEMBERS,
+            Episode.progress <= MAX_JOIN_PROGRESS,
+        )
+        .values(
+            member_count=Episode.member_count + 1,
+            is_full=Episode.member_count + 1 >= MAX_EPISODE_MEMBERS,
+        )
+        .returning(Episode.juz)
+        .execution_options(synchronize_session=False)
+    )
+    juz = reserved.scalar_one_or_none()
+    if juz is None:
+        await db.rollback()
+        await _raise_join_refused(data.episode_id, db)
 
-    if existing_member:
+    # Add the user to the episode. The unique index on members.user_id
+    # enforces one episode per user and rolls the reserved seat back.
+    new_member = Member(
+        user_id=user_id,
+        episode_id=data.episode_id,
+        joined_at=func.now(),
+    )
+    db.add(new_member)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail="You are already a member of an episode. Please exit your current episode before creating a new one."
         )
+    await invalidate_episode_responses(data.episode_id)
+    await add_board_members(data.episode_id, juz, [user_id])
 
-    # Check if the episode is active
-    query = select(Episode).where(Episode.id == data.episode_id, Episode.is_full == False)
-    episode = await db.execute(query)
-    episode = episode.scalar_one_or_none()
+    return new_member
 
-    if not episode:
-        raise HTTPException(status_code=404, detail="Episode not found or already full")
+
+async def _raise_join_refused(episode_id, db):
+    # Only runs when the seat reservation failed, to explain why
+    query = select(Episode.progress).where(Episode.id == episode_id)
+    progress = await db.execute(query)
+    progress = progress.scalar_one_or_none()
 
     # Check if the episode is in progress and less than 6 juz
-    if episode.progress > 6:
+    if progress is not None and progress > MAX_JOIN_PROGRESS:
         raise HTTPException(status_code=400, detail=" you can`t join this episode because you can not catch up with the progress of more than 6 juz")
 
-    # Check if the episode has less than 50 members
-    query = select(func.count(Member.id)).where(Member.episode_id == episode.id)
-    member_count = await db.execute(query)
-    member_count = member_count.scalar_one()
-
-    if member_count >= 50:
-        episode.is_full = True
-
-
-    # Add the user to the episode
-    new_member = Member(
-        user_id=user_id,
-        episode_id=episode.id,
-        joined_at=func.now(),
-    )
-    db.add(new_member)
-    await db.commit()
-    await db.flush()
-
-    return new_member
+    raise HTTPException(status_code=404, detail="Episode not found or already full")
 
 
 #CHECK IF THE EPISODE IS ACTIVE
@@ -135,29 +173,103 @@ async def join_episode_service(data, db, user):
 
 
 #TODO-2: Get Episode
-async def get_all_episodes_service(db):
-    query = select(Episode)
-    episodes = await db.execute(query)
-    episodes = episodes.scalars().all()
-    return episodes
+# Reads select these columns rather than Episode entities, the rows are
+# plain tuples that skip the identity map and relationship state
+EPISODE_COLUMNS = (
+    Episode.id, Episode.juz, Episode.description, Episode.no_of_khatmis,
+    Episode.progress, Episode.created_at, Episode.is_full, Episode.member_count,
+    Episode.user_id,
+)
+
+
+def _filter_episodes(query, filters):
+    if filters.juz is not None:
+        query = query.where(Episode.juz == filters.juz)
+    if filters.is_full is not None:
+        query = query.where(Episode.is_full == filters.is_full)
+    if filters.min_progress is not None:
+        query = query.where(Episode.progress >= filters.min_progress)
+    if filters.max_progress is not None:
+        query = query.where(Episode.progress <= filters.max_progress)
+    # Ids grow with creation, unlike created_at they are unique and compare
+    # the same on every driver, SQLite stores func.now() without microseconds
+    return query.order_by(Episode.id.desc())
+
+
+async def get_all_episodes_service(db, filters, cursor=None, limit=20):
+    """
+    Return one page of episodes, newest first.
+
+    Pages are keyset paginated on the episode id: `cursor` is the
+    `next_cursor` of the previous page, and `next_cursor` is None on the
+    last page.
+    """
+    query = _filter_episodes(select(*EPISODE_COLUMNS), filters)
+    if cursor:
+        query = query.where(Episode.id < decode_episode_cursor(cursor))
+
+    # Fetch one extra row to know whether another page follows
+    episodes = await db.execute(query.limit(limit + 1))
+    episodes = episodes.all()
+    next_cursor = encode_episode_cursor(episodes[limit - 1]) if len(episodes) > limit else None
+    return {"items": episodes[:limit], "next_cursor": next_cursor}
+
+
+async def export_episodes_service(filters):
+    """
+    Stream every matching episode as a JSON array.
+
+    Rows are read from a server side cursor in batches, so memory stays flat
+    however many episodes exist. The session is opened here rather than taken
+    from a dependency because it has to outlive the route handler.
+    """
+    yield "["
+    async with sessionmanager.read_session() as db:
+        query = _filter_episodes(select(*EPISODE_COLUMNS), filters).execution_options(yield_per=500)
+        rows = await db.stream(query)
+        separator = ""
+        async for row in rows.mappings():
+            yield separator + json.dumps(dict(row), default=str)
+            separator = ","
+    yield "]"
 
 async def get_episode_by_juz_service(episode_juz, db):
-    query = select(Episode).where(Episode.juz == episode_juz)
+    query = select(*EPISODE_COLUMNS).where(Episode.juz == episode_juz)
     episodes = await db.execute(query)
-    episodes = episodes.scalars().all()
+    episodes = episodes.all()
     return episodes
 
 async def get_episode_by_id_service(episode_id, db):
-    query = select(Episode).where(Episode.id == episode_id)
+    query = select(*EPISODE_COLUMNS).where(Episode.id == episode_id)
     episode = await db.execute(query)
-    episode = episode.scalar_one_or_none()
+    episode = episode.one_or_none()
     return episode
 
 async def get_episode_members_service(episode_id, db):
-    query = select(Member).where(Member.episode_id == episode_id)
-    members = await db.execute(query)
-    members = members.scalars().all()
-    return len(members)
+    query = select(Episode.member_count).where(Episode.id == episode_id)
+    member_count = await db.execute(query)
+    return member_count.scalar_one_or_none() or 0
+
+
+async def repair_member_counts_service(db):
+    """
+    Recompute `Episode.member_count` from the members table where it drifted.
+
+    Returns the number of episodes that were corrected.
+    """
+    actual_count = (
+        select(func.count(Member.id))
+        .where(Member.episode_id == Episode.id)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(Episode)
+        .where(Episode.member_count != actual_count)
+        .values(member_count=actual_count, is_full=actual_count >= MAX_EPISODE_MEMBERS)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return result.rowcount
 
 
 
@@ -169,43 +281,281 @@ async def exit_episode_service(episode_id, db, user):
 
     user_id = user.id
 
-    # Fetch the episode owned by the user, with members loaded
-    query = (
-        select(Episode)
+    # Leave with one conditional DELETE, a repeated or concurrent exit of
+    # the same member removes nothing and gives no seat back
+    left = await db.execute(
+        delete(Member).where(Member.episode_id == episode_id, Member.user_id == user_id)
+    )
+    if left.rowcount != 1:
+        await db.rollback()
+        episode = await db.execute(select(Episode.id).where(Episode.id == episode_id))
+        if episode.scalar_one_or_none() is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Episode not found")
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of this episode")
+
+    # Give the seat back with an atomic decrement. It locks the episode row
+    # until the commit, so the count it returns already includes every join
+    # and exit that committed first, and those still running wait for it.
+    remaining = await db.execute(
+        update(Episode)
         .where(Episode.id == episode_id)
+        .values(member_count=Episode.member_count - 1, is_full=False)
+        .returning(Episode.member_count, Episode.juz)
+        .execution_options(synchronize_session=False)
     )
-    episode_result = await db.execute(query)
-    episode = episode_result.scalar_one_or_none()
+    member_count, juz = remaining.one()
+
+    if member_count <= 0:
+        # The last member left, the episode goes with them
+        await db.execute(
+            delete(Episode)
+            .where(Episode.id == episode_id, Episode.member_count <= 0)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        await invalidate_episode_responses(episode_id)
+        await remove_board_members(episode_id, juz, [user_id], episode_deleted=True)
+        return {"message": "Episode and last member deleted successfully"}
 
-    if not episode:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Episode not found")
+    await db.commit()
+    await invalidate_episode_responses(episode_id)
+    await remove_board_members(episode_id, juz, [user_id])
+    return {"message": "User exited from the episode successfully"}
 
-    # Check if the user is a member of the episode
-    member_query = select(Member).where(Member.episode_id == episode_id, Member.user_id == user_id)
-    member_result = await db.execute(member_query)
-    member = member_result.scalar_one_or_none()
+#BULK MEMBERSHIP (admin)
+# Each bulk operation validates the whole batch with set-wise queries and
+# writes it with multi-row statements in one transaction, so its cost does not
+# grow with the number of users. Every user gets a status in the results.
 
-    if not member:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User is not a member of this episode")
+async def _lock_episode(episode_id, db):
+    query = select(Episode).where(Episode.id == episode_id).with_for_update()
+    episode = await db.execute(query)
+    episode = episode.scalar_one_or_none()
+    if not episode:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Episode {episode_id} not found")
+    return episode
 
-    # Check the number of members in the episode
-    member_count_query = select(func.count()).select_from(Member).where(Member.episode_id == episode_id)
-    member_count = await db.execute(member_count_query)
-    member_count = member_count.scalar()
 
-    if member_count == 1:
-        # If this is the last member, delete both the member and the episode
-        delete_member_query = delete(Member).where(Member.episode_id == episode_id)
-        await db.execute(delete_member_query)
+async def _change_member_count(episode, change, db):
+    member_count = episode.member_count + change
+    if member_count <= 0:
+        # Like a regular exit, an episode disappears with its last member
         await db.delete(episode)
+        return 0
+    await db.execute(
+        update(Episode)
+        .where(Episode.id == episode.id)
+        .values(member_count=Episode.member_count + change, is_full=member_count >= MAX_EPISODE_MEMBERS)
+        .execution_options(synchronize_session=False)
+    )
+    return member_count
+
+
+async def _commit_bulk(db):
+    try:
         await db.commit()
-        return {"message": "Episode and last member deleted successfully"}
-    else:
-        # If not the last member, remove the current user from the episode's members
-        delete_member_query = delete(Member).where(Member.episode_id == episode_id, Member.user_id == user_id)
-        await db.execute(delete_member_query)
-        await db.commit()
-        return {"message": "User exited from the episode successfully"}
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Memberships changed during the operation. Please try again.")
+
+
+async def bulk_join_episode_service(data, db):
+    user_ids = list(dict.fromkeys(data.user_ids))
+    episode = await _lock_episode(data.episode_id, db)
+
+    existing_users = await db.execute(select(User.id).where(User.id.in_(user_ids)))
+    existing_users = set(existing_users.scalars())
+    members = await db.execute(select(Member.user_id).where(Member.user_id.in_(user_ids)))
+    members = set(members.scalars())
+
+    seats = max(MAX_EPISODE_MEMBERS - episode.member_count, 0)
+    results, joining = [], []
+    for user_id in user_ids:
+        if user_id not in existing_users:
+            results.append({"user_id": user_id, "status": "user_not_found"})
+        elif user_id in members:
+            results.append({"user_id": user_id, "status": "already_member"})
+        elif len(joining) >= seats:
+            results.append({"user_id": user_id, "status": "episode_full"})
+        else:
+            joining.append(user_id)
+            results.append({"user_id": user_id, "status": "joined"})
+
+    member_count = episode.member_count
+    if joining:
+        await db.execute(
+            insert(Member),
+            [{"user_id": user_id, "episode_id": episode.id} for user_id in joining],
+        )
+        member_count = await _change_member_count(episode, len(joining), db)
+    await _commit_bulk(db)
+    if joining:
+        await invalidate_episode_responses(episode.id)
+        await add_board_members(episode.id, episode.juz, joining)
+    return {"episode_id": data.episode_id, "member_count": member_count, "results": results}
+
+
+async def bulk_exit_episode_service(data, db):
+    user_ids = list(dict.fromkeys(data.user_ids))
+    episode = await _lock_episode(data.episode_id, db)
+
+    removed = await db.execute(
+        delete(Member)
+        .where(Member.episode_id == episode.id, Member.user_id.in_(user_ids))
+        .returning(Member.user_id)
+    )
+    removed = set(removed.scalars())
+
+    member_count = episode.member_count
+    if removed:
+        member_count = await _change_member_count(episode, -len(removed), db)
+    await _commit_bulk(db)
+    if removed:
+        await invalidate_episode_responses(episode.id)
+        await remove_board_members(episode.id, episode.juz, list(removed), episode_deleted=member_count == 0)
+    results = [
+        {"user_id": user_id, "status": "exited" if user_id in removed else "not_member"}
+        for user_id in user_ids
+    ]
+    return {"episode_id": data.episode_id, "member_count": member_count, "results": results}
+
+
+async def bulk_transfer_episode_service(data, db):
+    if data.from_episode_id == data.to_episode_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Source and target episode must differ")
+
+    user_ids = list(dict.fromkeys(data.user_ids))
+    # Lock both episodes in id order so concurrent transfers cannot deadlock
+    episodes = {}
+    for episode_id in sorted((data.from_episode_id, data.to_episode_id)):
+        episodes[episode_id] = await _lock_episode(episode_id, db)
+    source, target = episodes[data.from_episode_id], episodes[data.to_episode_id]
+
+    members = await db.execute(
+        select(Member.user_id).where(Member.episode_id == source.id, Member.user_id.in_(user_ids))
+    )
+    members = set(members.scalars())
+
+    seats = max(MAX_EPISODE_MEMBERS - target.member_count, 0)
+    results, moving = [], []
+    for user_id in user_ids:
+        if user_id not in members:
+            results.append({"user_id": user_id, "status": "not_member"})
+        elif len(moving) >= seats:
+            results.append({"user_id": user_id, "status": "episode_full"})
+        else:
+            moving.append(user_id)
+            results.append({"user_id": user_id, "status": "transferred"})
+
+    member_count = target.member_count
+    if moving:
+        await db.execute(
+            update(Member)
+            .where(Member.episode_id == source.id, Member.user_id.in_(moving))
+            .values(episode_id=target.id, joined_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        member_count = await _change_member_count(target, len(moving), db)
+        source_count = await _change_member_count(source, -len(moving), db)
+    await _commit_bulk(db)
+    if moving:
+        await invalidate_episode_responses(source.id, target.id)
+        await remove_board_members(source.id, source.juz, moving, episode_deleted=source_count == 0)
+        await add_board_members(target.id, target.juz, moving)
+    return {"episode_id": data.to_episode_id, "member_count": member_count, "results": results}
+
+
+#READING PROGRESS
+async def ingest_progress_service(data, db, user):
+    """
+    Record a batch of finished juz and advance the member's episode.
+
+    Events already received, by client event id, are skipped, so clients can
+    resend a batch until it is acknowledged. The batch costs the same few
+    statements however many events it holds: one multi-row insert, one update
+    of the episode's progress and khatmis, and one award of points.
+    """
+    events = {}
+    for event in data.events:
+        events.setdefault(event.client_event_id, event)
+
+    membership = await db.execute(select(Member.episode_id).where(Member.user_id == user.id))
+    episode_id = membership.scalar_one_or_none()
+    seen = await db.execute(
+        select(ReadingEvent.client_event_id)
+        .where(ReadingEvent.user_id == user.id, ReadingEvent.client_event_id.in_(list(events)))
+    )
+    seen = set(seen.scalars())
+
+    results, accepted = [], []
+    for client_event_id, event in events.items():
+        if client_event_id in seen:
+            results.append({"client_event_id": client_event_id, "status": "duplicate"})
+        elif event.episode_id != episode_id:
+            results.append({"client_event_id": client_event_id, "status": "not_member"})
+        else:
+            accepted.append(event)
+            results.append({"client_event_id": client_event_id, "status": "accepted"})
+    if not accepted:
+        return {"episode_id": episode_id, "results": results}
+
+    try:
+        await db.execute(insert(ReadingEvent), [
+            {
+                "user_id": user.id,
+                "client_event_id": event.client_event_id,
+                "episode_id": episode_id,
+                "juz": event.juz,
+                "read_at": event.read_at,
+            }
+            for event in accepted
+        ])
+    except IntegrityError:
+        # The same events arrived concurrently, the retry will see them
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Events are already being recorded. Please try again.")
+
+    # Progress wraps around at the end of a khatma. The update is a single
+    # atomic statement, so concurrent batches of one episode never lose juz.
+    read = len(accepted)
+    episode = await db.execute(
+        update(Episode)
+        .where(Episode.id == episode_id)
+        .values(
+            progress=(Episode.progress + read) % JUZ_PER_KHATMA,
+            no_of_khatmis=Episode.no_of_khatmis + (Episode.progress + read) // JUZ_PER_KHATMA,
+        )
+        .returning(Episode.progress, Episode.no_of_khatmis)
+        .execution_options(synchronize_session=False)
+    )
+    progress, no_of_khatmis = episode.one()
+    completed = ((progress - read) % JUZ_PER_KHATMA + read) // JUZ_PER_KHATMA
+
+    members = []
+    if completed:
+        # Every member shares in a finished khatma
+        members = await db.execute(
+            update(User)
+            .where(User.id.in_(select(Member.user_id).where(Member.episode_id == episode_id)))
+            .values(no_of_khatmis=User.no_of_khatmis + completed)
+            .returning(User.id)
+            .execution_options(synchronize_session=False)
+        )
+        members = members.scalars().all()
+
+    # Commits the whole batch
+    points = await award_points(user.id, read * POINTS_PER_JUZ, db)
+    await invalidate_episode_responses(episode_id)
+    for member_id in members:
+        await invalidate_user_cache(member_id)
+    return {
+        "episode_id": episode_id,
+        "progress": progress,
+        "no_of_khatmis": no_of_khatmis,
+        "points": points,
+        "results": results,
+    }
+
 
 #TODO-3: Update Episode
 #TODO-4: Delete Episode
@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config.database import sessionmanager
+from app.config.security import invalidate_user_cache
+from app.config.settings import settings
+from app.config.storage import storage
+from app.models.images import StoredImage
+from app.models.users import User
+from app.utils.executor import BoundedExecutor
+from app.utils.images import render_profile_derivatives
+from app.utils.profile import IMMUTABLE_CACHE_CONTROL, SUPPORTED_IMAGE_FORMATS, s3_copy
+
+# Decoding and encoding images is CPU bound, so it runs in worker processes
+image_processor = BoundedExecutor(
+    "images",
+    settings.IMAGE_WORKERS,
+    kind="process",
+    max_pending=settings.IMAGE_MAX_PENDING,
+)
+# Stored images purged per batch, S3 deletes at most 1000 keys at once
+PURGE_BATCH_SIZE = 100
+
+
+def content_key(digest, content_type: str) -> str:
+    """Storage key of an image, from the SHA-256 `digest` of its content."""
+    return f"{digest.hexdigest()}.{SUPPORTED_IMAGE_FORMATS[content_type]}"
+
+
+def derivative_key(key: str, name: str, extension: str) -> str:
+    """Key of a derivative, stored next to the original it was made from."""
+    return f"{key.rsplit('.', 1)[0]}_{name}.{extension}"
+
+
+async def acquire_image(key: str, source_key: str, size: int, content_type: str, db):
+    """
+    Take a reference on a stored image, copying it from the upload at
+    `source_key` if it is new.
+
+    The caller commits. Returns the image's derivative URLs, None if they are
+    not made yet.
+    """
+    stored = await db.execute(
+        update(StoredImage)
+        .where(StoredImage.key == key)
+        .values(refcount=StoredImage.refcount + 1, released_at=None)
+        .returning(StoredImage.variants)
+        .execution_options(synchronize_session=False)
+    )
+    stored = stored.first()
+    if stored:
+        # Same content as an image already stored, skip the upload
+        return stored.variants
+
+    # Store before adding the row, so a row always has its object
+    await s3_copy(source_key, key, content_type, IMMUTABLE_CACHE_CONTROL)
+    try:
+        async with db.begin_nested():
+            db.add(StoredImage(key=key, content_type=content_type, size=size, refcount=1))
+    except IntegrityError:
+        # The same image was uploaded concurrently and its row won
+        await db.execute(
+            update(StoredImage)
+            .where(StoredImage.key == key)
+            .values(refcount=StoredImage.refcount + 1, released_at=None)
+            .execution_options(synchronize_session=False)
+        )
+    return None
+
+
+async def release_image(key: str, db) -> bool:
+    """
+    Drop a reference on a stored image. The caller commits.
+
+    Returns False if the key is not a stored image, e.g. an image uploaded
+    before images were content addressed, which the caller deletes itself.
+    """
+    released = await db.execute(
+        update(StoredImage)
+        .where(StoredImage.key == key, StoredImage.refcount > 0)
+        .values(
+            refcount=StoredImage.refcount - 1,
+            released_at=case((StoredImage.refcount == 1, datetime.utcnow()), else_=StoredImage.released_at),
+        )
+        .returning(StoredImage.key)
+        .execution_options(synchronize_session=False)
+    )
+    return released.first() is not None
+
+
+async def purge_released_images(db, grace: timedelta = None) -> int:
+    """
+    Delete images nobody has used for `grace` from storage and the table.
+
+    Rows are locked while their objects are deleted, so an upload of the same
+    image waits and then stores it anew. Returns the number of images purged.
+    """
+    if grace is None:
+        grace = timedelta(hours=settings.IMAGE_PURGE_GRACE_HOURS)
+    cutoff = datetime.utcnow() - grace
+    purged = 0
+    while True:
+        images = await db.execute(
+            select(StoredImage)
+            .where(StoredImage.refcount == 0, StoredImage.released_at < cutoff)
+            .limit(PURGE_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )
+        images = images.scalars().all()
+        if not images:
+            return purged
+
+        keys = []
+        for image in images:
+            keys.append(image.key)
+            keys += [storage.key_from_url(url) for url in (image.variants or {}).values()]
+        await storage.delete_objects(*keys)
+        await db.execute(delete(StoredImage).where(StoredImage.key.in_([image.key for image in images])))
+        await db.commit()
+        purged += len(images)
+
+
+async def generate_profile_derivatives(user_id: int, key: str):
+    """
+    Make the thumbnails of an uploaded profile image and record their URLs.
+
+    Runs after the upload response was sent. The URLs are kept on the stored
+    image, so identical uploads reuse them, and on the user if they still
+    show this image. Failures are logged, the user keeps the original.
+    """
+    try:
+        content = await storage.get_object(key)
+        derivatives = await image_processor.run(render_profile_derivatives, content)
+        keys = {name: derivative_key(key, *name.split("_", 1)) for name in derivatives}
+        await asyncio.gather(*(
+            storage.put_object(keys[name], data, content_type, IMMUTABLE_CACHE_CONTROL)
+            for name, (data, content_type, _) in derivatives.items()
+        ))
+        variants = {name: storage.url(derivative) for name, derivative in keys.items()}
+
+        async with sessionmanager.session() as db:
+            await db.execute(
+                update(StoredImage).where(StoredImage.key == key).values(variants=variants)
+            )
+            result = await db.execute(
+                update(User)
+                .where(User.id == user_id, User.profile_image == storage.url(key))
+                .values(profile_image_variants=variants)
+            )
+            await db.commit()
+        if result.rowcount:
+            await invalidate_user_cache(user_id)
+    except Exception:
+        logging.exception(f"Could not make the thumbnails of {key}")
+
+
+def profile_image_keys(user) -> list:
+    """Keys of a user's profile image and of its derivatives."""
+    keys = [storage.key_from_url(url) for url in (user.profile_image_variants or {}).values()]
+    if user.profile_image:
+        keys.append(storage.key_from_url(user.profile_image))
+    return keys
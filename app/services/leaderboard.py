@@ -0,0 +1,403 @@
+import logging
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy import func, insert, or_, select, update
+
+from app.config.redis import redis_client
+from app.config.security import invalidate_user_cache
+from app.models.episodes import Episode, Member
+from app.models.leaderboard import LeaderboardSnapshot, ScoreCheckpoint
+from app.models.users import User
+from app.utils.enum import LeaderboardPeriod
+from app.utils.leaderboard import window_start
+
+# Boards are Redis sorted sets of user ids scored by User.points. The global
+# board holds every user; juz and episode boards hold the members of the
+# episodes they stand for, with the score copied from the global board.
+GLOBAL_BOARD = "leaderboard:global"
+REBUILD_PREFIX = "leaderboard:rebuild:"
+REBUILD_BATCH_SIZE = 1000
+SNAPSHOT_BATCH_SIZE = 1000
+SNAPSHOT_LOCK = "leaderboard:snapshot:lock"
+SNAPSHOT_LOCK_TIMEOUT = 600
+
+# Copy a user's global score onto the boards in KEYS[2..]
+COPY_SCORE_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1]) or 0
+for i = 2, #KEYS do
+    redis.call('ZADD', KEYS[i], score, ARGV[1])
+end
+return score
+"""
+
+# Set a user's score on every board that already holds them, plus the global one
+SET_SCORE_SCRIPT = """
+for i = 1, #KEYS do
+    if i == 1 or redis.call('ZSCORE', KEYS[i], ARGV[1]) then
+        redis.call('ZADD', KEYS[i], ARGV[2], ARGV[1])
+    end
+end
+"""
+
+copy_score = redis_client.register_script(COPY_SCORE_SCRIPT)
+set_score = redis_client.register_script(SET_SCORE_SCRIPT)
+
+
+def juz_board(juz: int) -> str:
+    return f"leaderboard:juz:{juz}"
+
+
+def episode_board(episode_id: int) -> str:
+    return f"leaderboard:episode:{episode_id}"
+
+
+async def add_board_members(episode_id, juz, user_ids):
+    """Put new members of an episode on its episode and juz boards."""
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                await copy_score(keys=[GLOBAL_BOARD, episode_board(episode_id), juz_board(juz)], args=[user_id], client=pipe)
+            await pipe.execute()
+    except Exception as exc:
+        logging.warning(f"Leaderboard update failed, rebuild to repair: {exc}")
+
+
+async def remove_board_members(episode_id, juz, user_ids, episode_deleted=False):
+    """Take members that left an episode off its episode and juz boards."""
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            if user_ids:
+                pipe.zrem(juz_board(juz), *user_ids)
+                pipe.zrem(episode_board(episode_id), *user_ids)
+            if episode_deleted:
+                pipe.delete(episode_board(episode_id))
+            await pipe.execute()
+    except Exception as exc:
+        logging.warning(f"Leaderboard update failed, rebuild to repair: {exc}")
+
+
+async def award_points(user_id, points, db):
+    """
+    Add `points` to a user and move them up their boards.
+
+    The database update is atomic and committed here; the boards are then set
+    to the new total, so a failed Redis write heals on the next award or rebuild.
+    Returns the user's new total.
+    """
+    total = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(points=User.points + points)
+        .returning(User.points)
+    )
+    total = total.scalar_one_or_none()
+    if total is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    membership = await db.execute(
+        select(Member.episode_id, Episode.juz)
+        .join(Episode, Episode.id == Member.episode_id)
+        .where(Member.user_id == user_id)
+    )
+    membership = membership.first()
+    await db.commit()
+    await invalidate_user_cache(user_id)
+
+    boards = [GLOBAL_BOARD]
+    if membership:
+        boards += [episode_board(membership.episode_id), juz_board(membership.juz)]
+    try:
+        await set_score(keys=boards, args=[user_id, total])
+    except Exception as exc:
+        logging.warning(f"Leaderboard update failed, rebuild to repair: {exc}")
+    return total
+
+
+def _thumbnail(variants):
+    # list views show the small avatar rather than the original upload
+    return (variants or {}).get("small_webp")
+
+
+async def get_top_service(board, offset, limit, db):
+    """Return one page of a board, best first, with the users' names."""
+    try:
+        entries = await redis_client.zrevrange(board, offset, offset + limit - 1, withscores=True)
+    except Exception:
+        logging.exception("Leaderboard read failed")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Leaderboard is unavailable")
+
+    user_ids = [int(user_id) for user_id, _ in entries]
+    users = await db.execute(
+        select(User.id, User.first_name, User.last_name, User.profile_image, User.profile_image_variants)
+        .where(User.id.in_(user_ids))
+    )
+    users = {user.id: user for user in users}
+    return [
+        {
+            "rank": offset + position + 1,
+            "user_id": user_id,
+            "first_name": users[user_id].first_name,
+            "last_name": users[user_id].last_name,
+            "profile_image": users[user_id].profile_image,
+            "profile_image_thumbnail": _thumbnail(users[user_id].profile_image_variants),
+            "points": int(score),
+        }
+        for position, (user_id, (_, score)) in enumerate(zip(user_ids, entries))
+        # A user deleted since the last rebuild is skipped, keeping ranks intact
+        if user_id in users
+    ]
+
+
+async def get_my_ranks_service(user, db):
+    """Rank of the user on the global board and on their episode and juz boards."""
+    membership = await db.execute(
+        select(Member.episode_id, Episode.juz)
+        .join(Episode, Episode.id == Member.episode_id)
+        .where(Member.user_id == user.id)
+    )
+    membership = membership.first()
+
+    boards = {"global": GLOBAL_BOARD}
+    if membership:
+        boards["episode"] = episode_board(membership.episode_id)
+        boards["juz"] = juz_board(membership.juz)
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for board in boards.values():
+                pipe.zrevrank(board, user.id)
+                pipe.zscore(board, user.id)
+            results = await pipe.execute()
+    except Exception:
+        logging.exception("Leaderboard read failed")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Leaderboard is unavailable")
+
+    ranks = {}
+    for position, name in enumerate(boards):
+        rank, score = results[2 * position], results[2 * position + 1]
+        ranks[name] = {
+            "rank": rank + 1 if rank is not None else None,
+            "points": int(score) if score is not None else None,
+        }
+    if membership:
+        ranks["episode"]["episode_id"] = membership.episode_id
+        ranks["juz"]["juz"] = membership.juz
+    return ranks
+
+
+async def rebuild_leaderboards(db):
+    """
+    Rebuild every board from the users and members tables.
+
+    Boards are written under staging keys and renamed over the live ones at
+    the end, so readers never see a half built board. Boards of episodes or
+    juz without members anymore are removed. Returns the number of users.
+    """
+    rows = await db.stream(
+        select(User.id, User.points, Member.episode_id, Episode.juz)
+        .outerjoin(Member, Member.user_id == User.id)
+        .outerjoin(Episode, Episode.id == Member.episode_id)
+        .execution_options(yield_per=REBUILD_BATCH_SIZE)
+    )
+
+    boards = set()
+    users = 0
+    async for batch in rows.partitions():
+        scores = {}
+        for user_id, points, episode_id, juz in batch:
+            users += 1
+            scores.setdefault(GLOBAL_BOARD, {})[user_id] = points
+            if episode_id is not None:
+                scores.setdefault(episode_board(episode_id), {})[user_id] = points
+                scores.setdefault(juz_board(juz), {})[user_id] = points
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for board, mapping in scores.items():
+                if board not in boards:
+                    pipe.delete(REBUILD_PREFIX + board)
+                    boards.add(board)
+                pipe.zadd(REBUILD_PREFIX + board, mapping)
+            await pipe.execute()
+
+    stale = []
+    for pattern in ("leaderboard:juz:*", "leaderboard:episode:*"):
+        async for key in redis_client.scan_iter(match=pattern, count=REBUILD_BATCH_SIZE):
+            key = key.decode() if isinstance(key, bytes) else key
+            if key not in boards:
+                stale.append(key)
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for board in boards:
+            pipe.rename(REBUILD_PREFIX + board, board)
+        if GLOBAL_BOARD not in boards:
+            stale.append(GLOBAL_BOARD)
+        if stale:
+            pipe.delete(*stale)
+        await pipe.execute()
+    return users
+
+
+#SNAPSHOTS
+async def _snapshot_batch(deltas, windows, db):
+    user_ids = list(deltas)
+
+    checkpoints = await db.execute(select(ScoreCheckpoint.user_id).where(ScoreCheckpoint.user_id.in_(user_ids)))
+    checkpoints = set(checkpoints.scalars())
+    taken_at = datetime.utcnow()
+    totals = [
+        {"user_id": user_id, "points": points, "no_of_khatmis": khatmis, "taken_at": taken_at}
+        for user_id, (points, khatmis, _, _) in deltas.items()
+    ]
+    updated = [row for row in totals if row["user_id"] in checkpoints]
+    if updated:
+        await db.execute(update(ScoreCheckpoint), updated)
+    if len(updated) < len(totals):
+        await db.execute(insert(ScoreCheckpoint), [row for row in totals if row["user_id"] not in checkpoints])
+
+    earned = {user_id: delta[2:] for user_id, delta in deltas.items() if delta[2:] != (0, 0)}
+    if not earned:
+        return
+    for period, start in windows:
+        existing = await db.execute(
+            select(LeaderboardSnapshot.id, LeaderboardSnapshot.user_id, LeaderboardSnapshot.points, LeaderboardSnapshot.no_of_khatmis)
+            .where(
+                LeaderboardSnapshot.period == period.value,
+                LeaderboardSnapshot.period_start == start,
+                LeaderboardSnapshot.user_id.in_(list(earned)),
+            )
+        )
+        existing = {row.user_id: row for row in existing}
+        if existing:
+            await db.execute(update(LeaderboardSnapshot), [
+                {
+                    "id": row.id,
+                    "points": row.points + earned[user_id][0],
+                    "no_of_khatmis": row.no_of_khatmis + earned[user_id][1],
+                }
+                for user_id, row in existing.items()
+            ])
+        if len(existing) < len(earned):
+            await db.execute(insert(LeaderboardSnapshot), [
+                {
+                    "period": period.value,
+                    "period_start": start,
+                    "user_id": user_id,
+                    "points": points,
+                    "no_of_khatmis": khatmis,
+                }
+                for user_id, (points, khatmis) in earned.items()
+                if user_id not in existing
+            ])
+
+
+async def _rank_window(period, start, db):
+    ranked = (
+        select(
+            LeaderboardSnapshot.id,
+            func.rank().over(
+                order_by=(LeaderboardSnapshot.points.desc(), LeaderboardSnapshot.no_of_khatmis.desc())
+            ).label("rank"),
+        )
+        .where(LeaderboardSnapshot.period == period.value, LeaderboardSnapshot.period_start == start)
+        .subquery()
+    )
+    await db.execute(
+        update(LeaderboardSnapshot)
+        .where(LeaderboardSnapshot.id == ranked.c.id)
+        .values(rank=ranked.c.rank)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def snapshot_leaderboards(db, today=None):
+    """
+    Fold the points and khatmis earned since the last run into the current
+    daily, weekly and monthly windows, then rerank those windows.
+
+    Only users whose totals moved since their `ScoreCheckpoint` are read, so a
+    run costs as much as the activity since the previous one. Users without
+    a checkpoint signed up after the migration seeded them, and count from
+    zero.
+
+    Earnings count towards the windows the run falls in, so run it every few
+    minutes. Runs take a Redis lock; returns None if another run holds it,
+    else the number of users whose totals changed.
+    """
+    lock = redis_client.lock(SNAPSHOT_LOCK, timeout=SNAPSHOT_LOCK_TIMEOUT)
+    if not await lock.acquire(blocking=False):
+        return None
+    try:
+        today = today or datetime.utcnow().date()
+        windows = [(period, window_start(period, today)) for period in LeaderboardPeriod]
+        rows = await db.stream(
+            select(
+                User.id,
+                User.points,
+                User.no_of_khatmis,
+                func.coalesce(ScoreCheckpoint.points, 0),
+                func.coalesce(ScoreCheckpoint.no_of_khatmis, 0),
+            )
+            .outerjoin(ScoreCheckpoint, ScoreCheckpoint.user_id == User.id)
+            .where(or_(
+                ScoreCheckpoint.user_id.is_(None),
+                User.points != ScoreCheckpoint.points,
+                User.no_of_khatmis != ScoreCheckpoint.no_of_khatmis,
+            ))
+            .execution_options(yield_per=SNAPSHOT_BATCH_SIZE)
+        )
+        # Read everything first, the batches write to the tables being read
+        deltas = {
+            user_id: (points, khatmis, points - last_points, khatmis - last_khatmis)
+            async for user_id, points, khatmis, last_points, last_khatmis in rows
+        }
+        user_ids = list(deltas)
+        for position in range(0, len(user_ids), SNAPSHOT_BATCH_SIZE):
+            batch = user_ids[position:position + SNAPSHOT_BATCH_SIZE]
+            await _snapshot_batch({user_id: deltas[user_id] for user_id in batch}, windows, db)
+        if any(delta[2:] != (0, 0) for delta in deltas.values()):
+            for period, start in windows:
+                await _rank_window(period, start, db)
+        await db.commit()
+        return len(deltas)
+    finally:
+        await lock.release()
+
+
+async def get_snapshot_service(period, day, offset, limit, db):
+    """One page of the window of `period` holding `day`, today if None."""
+    start = window_start(period, day or datetime.utcnow().date())
+    rows = await db.execute(
+        select(
+            LeaderboardSnapshot.rank,
+            LeaderboardSnapshot.user_id,
+            User.first_name,
+            User.last_name,
+            User.profile_image,
+            User.profile_image_variants,
+            LeaderboardSnapshot.points,
+            LeaderboardSnapshot.no_of_khatmis,
+        )
+        .join(User, User.id == LeaderboardSnapshot.user_id)
+        .where(LeaderboardSnapshot.period == period.value, LeaderboardSnapshot.period_start == start)
+        .order_by(LeaderboardSnapshot.rank, LeaderboardSnapshot.user_id)
+        .offset(offset)
+        .limit(limit)
+    )
+    items = [
+        {**row, "profile_image_thumbnail": _thumbnail(row["profile_image_variants"])}
+        for row in rows.mappings()
+    ]
+    return {"period": period, "period_start": start, "items": items}
+
+
+async def get_my_snapshots_service(user, period, limit, db):
+    """The user's latest windows of `period`, newest first."""
+    rows = await db.execute(
+        select(
+            LeaderboardSnapshot.period_start,
+            LeaderboardSnapshot.rank,
+            LeaderboardSnapshot.points,
+            LeaderboardSnapshot.no_of_khatmis,
+        )
+        .where(LeaderboardSnapshot.user_id == user.id, LeaderboardSnapshot.period == period.value)
+        .order_by(LeaderboardSnapshot.period_start.desc())
+        .limit(limit)
+    )
+    return rows.mappings().all()
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from datetime import datetime
+from sqlalchemy import delete, or_, select
+
+from app.config.database import sessionmanager
+from app.config.settings import settings
+from app.models.users import UserToken
+
+
+async def trim_user_sessions(db, user_id: int, keep: int = None) -> list[int]:
+    """
+    Delete the sessions of a user beyond the `keep` most recently used ones,
+    AUTH_MAX_SESSIONS by default, along with their expired ones.
+
+    Refreshing a session moves its expiry forward, so the sessions dropped are
+    the ones left unused the longest. Returns the ids of the live sessions that
+    were deleted, so their access tokens can be revoked once committed.
+    """
+    keep = keep or settings.AUTH_MAX_SESSIONS
+    now = datetime.utcnow()
+    over_cap = await db.execute(
+        select(UserToken.id)
+        .where(UserToken.user_id == user_id, UserToken.expires_at > now)
+        .order_by(UserToken.expires_at.desc())
+        .offset(keep)
+    )
+    over_cap = over_cap.scalars().all()
+    await db.execute(
+        delete(UserToken).where(
+            UserToken.user_id == user_id,
+            or_(UserToken.expires_at <= now, UserToken.id.in_(over_cap)),
+        )
+    )
+    return over_cap
+
+
+async def purge_expired_tokens(db, batch_size: int = None) -> int:
+    """
+    Delete expired user tokens, `batch_size` rows per transaction.
+
+    Deleting in small batches keeps each transaction short, so a large
+    backlog never holds locks on the table the logins write to for long.
+    """
+    batch_size = batch_size or settings.AUTH_TOKEN_PURGE_BATCH_SIZE
+    purged = 0
+    while True:
+        expired = (
+            select(UserToken.id)
+            .where(UserToken.expires_at <= datetime.utcnow())
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = await db.execute(delete(UserToken).where(UserToken.id.in_(expired)))
+        await db.commit()
+        purged += result.rowcount
+        if result.rowcount < batch_size:
+            return purged
+        # let the requests sharing the database through between batches
+        await asyncio.sleep(0)
+
+
+async def run_token_purger(interval: float = None):
+    """Purge expired user tokens every `interval` seconds until cancelled."""
+    interval = interval or settings.AUTH_TOKEN_PURGE_INTERVAL
+    while True:
+        try:
+            async with sessionmanager.session() as db:
+                purged = await purge_expired_tokens(db)
+            if purged:
+                logging.info(f"Purged {purged} expired user tokens")
+        except Exception:
+            logging.exception("User token purge failed")
+        await asyncio.sleep(interval)
@@ -1,40 +1,48 @@
+import hashlib
 import logging
-from urllib.parse import urlparse
-import uuid
 import magic
-from sqlalchemy import select, bindparam, func
+from sqlalchemy import delete, select, bindparam, func
 from fastapi import HTTPException, status
 from app.config.security import (
         get_token_payload,
         is_password_strong_enough,
-        hash_password,
+        hash_password_async,
+        invalidate_user_cache,
         load_user,
-        verify_password,
+        revoke_token,
+        verify_context_token,
+        verify_password_async,
         str_encode,
         str_decode,
         generate_token
         )
+from app.config.storage import StorageNotFound, storage
 from app.models.users import (
     User,
     UserToken
 )
 from fastapi.responses import JSONResponse
-from app.config.security import hash_password
 from app.services.email import send_account_verification_email, send_password_reset_email
+from app.services.tokens import trim_user_sessions
+from app.services.images import (
+    acquire_image,
+    content_key,
+    generate_profile_derivatives,
+    profile_image_keys,
+    release_image
+)
 from app.utils.profile import (
-    MB,
+    SNIFF_SIZE,
     SUPPORTED_IMAGE_FORMATS,
     delete_s3_image,
-    s3_upload
+    open_image_stream,
+    s3_upload_stream
 )
 from app.utils.string import unique_string
 from sqlalchemy.orm import joinedload
 
 # 2
 from app.utils.email_context import FORGOT_PASSWORD, USER_VERIFY_ACCOUNT
-from app.config.security import (
-    verify_password
-)
 from datetime import datetime
 
 from app.services.email import send_account_activation_confirmation_email
@@ -45,7 +53,7 @@ from app.config.settings import settings
 
 
 
-async def create_user(data, background_tasks, db):
+async def create_user(data, db):
     """
     Create a new user.
 
@@ -56,7 +64,7 @@ async def create_user(data, background_tasks, db):
     4. Creates a new user.
     5. Adds the new user to the database.
     6. Refreshes the user object.
-    7. Sends an account verification email.
+    7. Queues an account verification email in the same transaction.
 
     If any of the above steps fail, the transaction is rolled back and an HTTPException is raised.
     """
@@ -91,7 +99,7 @@ async def create_user(data, background_tasks, db):
                 first_name=data.first_name,
                 last_name=data.last_name,
                 email=data.email,
-                password=hash_password(data.password),
+                password=await hash_password_async(data.password),
                 is_active=False,
                 is_firstlogin=False,
                 is_superuser=False,
@@ -101,22 +109,14 @@ async def create_user(data, background_tasks, db):
             # Add the new user to the database
             db.add(new_user)
 
-            # The commit will be handled automatically when the context manager exits
+            # Load the id and timestamps the verification token is made from
+            await db.flush()
+            await db.refresh(new_user)
 
-        # Now that the transaction is complete, refresh the user object
-        await db.refresh(new_user)
+            # Queue the account verification email, it is only sent if the user is created
+            await send_account_verification_email(user=new_user, db=db)
 
-        # Send the account verification email
-        try:
-            await send_account_verification_email(
-                user=new_user, background_tasks=background_tasks
-            )
-
-        except Exception:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="User created, but failed to send verification email. Please contact support.",
-            )
+            # The commit will be handled automatically when the context manager exits
 
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
@@ -143,7 +143,7 @@ async def create_user(data, background_tasks, db):
             detail="An unexpected error occurred during user creation. Please try again later.",
         )
 
-async def activate_user_account(data, db, background_tasks):
+async def activate_user_account(data, db):
     """
     Activate a user account given an activation token and an email address.
 
@@ -151,7 +151,7 @@ async def activate_user_account(data, db, background_tasks):
     1. Retrieve the user by email.
     2. Verify the token.
     3. Activate the user account.
-    4. Send an account activation confirmation email.
+    4. Queue an account activation confirmation email in the same transaction.
 
     If an error occurs, the transaction is rolled back and an HTTPException is raised.
     """
@@ -169,9 +169,11 @@ async def activate_user_account(data, db, background_tasks):
                 )
 
             # Verify the token
-            user_token = user_result.get_context_string(context=USER_VERIFY_ACCOUNT)
             try:
-                token_valid = verify_password(user_token, data.token)
+                token_valid = await verify_context_token(user_result, USER_VERIFY_ACCOUNT, data.token)
+            except HTTPException:
+                # A busy password hasher is not an invalid link
+                raise
             except Exception:
                 logging.exception("Token verification failed")
                 token_valid = False
@@ -191,17 +193,12 @@ async def activate_user_account(data, db, background_tasks):
             db.add(user_result)
             await db.flush()  # Not usually awaited, but for completeness
 
+            # Queue the account activation confirmation email
+            await send_account_activation_confirmation_email(user_result, db)
+
             # Commit is handled by the async with context manager
 
-        # Send the account activation confirmation email
-        try:
-            await send_account_activation_confirmation_email(user_result, background_tasks)
-        except Exception:
-            logging.exception("Failed to send confirmation email")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="User activated, but failed to send confirmation email. Please contact support.",
-            )
+        await invalidate_user_cache(user_result.id)
 
         return user_result
 
@@ -224,65 +221,149 @@ async def activate_user_account(data, db, background_tasks):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An unexpected error occurred during account activation. Please try again later.",
         )
-async def upload_profile(profile_image, db, user):
+async def upload_profile(chunks, db, user, background_tasks):
+    """
+    Store a new profile image and replace the user's current one.
 
-    if not profile_image:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No profile image provided")
+    `chunks` is an async iterator over the uploaded bytes. It is checked as
+    it streams, so a bad upload is rejected from its first bytes or as soon
+    as it grows past the size limit. The bytes are hashed while they stream
+    to a staging key, then copied to the key of their content, so memory
+    stays bounded by the chunk size.
+    """
+    file_type, chunks = await open_image_stream(chunks, settings.PROFILE_IMAGE_MAX_SIZE)
+    digest = hashlib.sha256()
+    size = 0
+
+    async def hashed_chunks():
+        nonlocal size
+        async for chunk in chunks:
+            digest.update(chunk)
+            size += len(chunk)
+            yield chunk
+
+    staging_key = f"{_staging_prefix(user)}{unique_string(32)}"
+    try:
+        await s3_upload_stream(hashed_chunks(), filename=staging_key, content_type=file_type)
+        return await _set_profile_image(
+            content_key(digest, file_type), size, file_type, db, user, background_tasks, source_key=staging_key
+        )
+    finally:
+        await _discard_upload(staging_key)
 
-    # Read the image content
-    content = await profile_image.read()
-    size = len(content)
 
-    if size > 1 * MB:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Profile image is too large")
+async def _discard_upload(key):
+    """Delete a staged upload. A failure is only logged, the bucket expires staged uploads anyway."""
+    try:
+        await delete_s3_image(key)
+    except HTTPException:
+        pass
 
-    file_type = magic.from_buffer(content, mime=True)
-    if file_type not in SUPPORTED_IMAGE_FORMATS:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image format")
 
-    filename = f"{uuid.uuid4()}.{SUPPORTED_IMAGE_FORMATS[file_type]}"
+async def _set_profile_image(filename, size, file_type, db, user, background_tasks, source_key):
+    """
+    Images are stored under the hash of their content: re-uploading the
+    current image changes nothing and an image already stored for anyone is
+    not stored again, only a new image is copied from the upload at
+    `source_key`. Thumbnails are made in the background once the response was
+    sent.
+
+    The user row stays locked until the commit, so concurrent uploads by one
+    user cannot both release the same previous image.
+    """
+    image_url = storage.url(filename)
 
     user_id = user.id
     if not user_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid user token")
 
     # Fetch the user from the database
-    user = await db.execute(select(User).where(User.id == user_id))
+    user = await db.execute(
+        select(User)
+        .where(User.id == user_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
     user = user.scalar_one_or_none()
 
     if user:
-        # Check if there is an existing profile image
-        if user.profile_image:
-            # Extract the filename from the existing URL
-            existing_url = user.profile_image
-            parsed_url = urlparse(existing_url)
-            existing_filename = parsed_url.path.lstrip('/')  # Remove leading '/'
-
-            # Delete the existing image from S3
-            await delete_s3_image(existing_filename)
+        if user.profile_image == image_url:
+            return {"message": "Profile image uploaded successfully", "image_url": image_url}
+        existing_url, existing_keys = user.profile_image, profile_image_keys(user)
 
-        # Upload the new image to S3
-        await s3_upload(content=content, filename=filename, content_type=file_type)
-
-        # Construct the new image URL
-        image_url = f"https://{settings.AWS_S3_BUCKET_NAME}.s3.amazonaws.com/{filename}"
+        variants = await acquire_image(filename, source_key, size, file_type, db)
+        legacy = existing_url and not await release_image(storage.key_from_url(existing_url), db)
 
         # Update the profile image URL in the database
         user.profile_image = image_url
+        user.profile_image_variants = variants
         await db.commit()  # Commit the transaction to save the changes
-        await db.flush()
+        await invalidate_user_cache(user.id)
+        if variants is None:
+            background_tasks.add_task(generate_profile_derivatives, user.id, filename)
+
+        # Images from before content addressing belong to this user alone
+        if legacy:
+            await delete_s3_image(*existing_keys)
     else:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
     return {"message": "Profile image uploaded successfully", "image_url": image_url}
 
 
+def _staging_prefix(user):
+    return f"uploads/{user.id}/"
+
+
+async def create_profile_upload(data, user):
+    """
+    Issue a presigned upload of a profile image straight to storage.
+
+    The client posts the image with the returned fields to the returned URL,
+    then calls `confirm_profile_upload` with the key. Storage enforces the
+    content type and the size limit. Staged uploads that are never confirmed
+    should be expired by a bucket lifecycle rule on the uploads/ prefix.
+    """
+    key = f"{_staging_prefix(user)}{unique_string(32)}"
+    expires_in = settings.PROFILE_UPLOAD_EXPIRE_SECONDS
+    upload = storage.presigned_post(key, data.content_type, settings.PROFILE_IMAGE_MAX_SIZE, expires_in)
+    return {"url": upload["url"], "fields": upload["fields"], "key": key, "expires_in": expires_in}
+
+
+async def confirm_profile_upload(data, db, user, background_tasks):
+    """Check a presigned upload and make it the user's profile image."""
+    if not data.key.startswith(_staging_prefix(user)) or ".." in data.key:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid upload key")
+
+    try:
+        size = await storage.head_object(data.key)
+        if size > settings.PROFILE_IMAGE_MAX_SIZE:
+            await delete_s3_image(data.key)
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Profile image is too large")
+        content = await storage.get_object(data.key)
+    except StorageNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+
+    # The type the client declared is not trusted, check the bytes
+    file_type = magic.from_buffer(content[:SNIFF_SIZE], mime=True)
+    if file_type not in SUPPORTED_IMAGE_FORMATS:
+        await delete_s3_image(data.key)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image format")
+
+    result = await _set_profile_image(
+        content_key(hashlib.sha256(content), file_type), len(content), file_type, db, user, background_tasks,
+        source_key=data.key,
+    )
+    await delete_s3_image(data.key)
+    return result
+
+
 async def get_login_token(data, db, response):
     user = await load_user(data.username, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail="This email is not associated with any registered account")
-    if not verify_password(data.password, user.password):
+    if not await verify_password_async(data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid credentials")
     if not user.is_active:
@@ -295,28 +376,44 @@ async def get_login_token(data, db, response):
     return await _generate_tokens(user, db, response)
 
 
-async def _generate_tokens(user, db, response):
-    refresh_key = unique_string(100)
-    access_key = unique_string(50)
-    rt_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
-
-    user_token = UserToken(
+def _new_user_token(user) -> UserToken:
+    return UserToken(
         user_id=user.id,
-        refresh_token=refresh_key,
-        access_token=access_key,
-        expires_at=datetime.utcnow() + rt_expires,
+        refresh_token=unique_string(100),
+        access_token=unique_string(50),
+        expires_at=datetime.utcnow() + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES),
         created_at=datetime.utcnow(),
     )
 
+
+async def _generate_tokens(user, db, response):
+    """Open a new session for the user, ending their oldest beyond AUTH_MAX_SESSIONS."""
+    user_token = _new_user_token(user)
     db.add(user_token)
+    await db.flush()
+    ended = await trim_user_sessions(db, user.id)
     await db.commit()
-    await db.flush()  # Flush changes to the database without committing
+
+    for user_token_id in ended:
+        await revoke_token(user_token_id)
+
+    return _issue_tokens(user, user_token, response)
+
+
+def _issue_tokens(user, user_token, response):
+    refresh_key = user_token.refresh_token
+    access_key = user_token.access_token
+    rt_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
 
     at_payload = {
         "sub": str_encode(str(user.id)),
         "a": access_key,
         "r": str_encode(str(user_token.id)),
         "n": str_encode(f"{user.first_name}"),
+        # Claims trusted by the stateless authentication mode
+        "act": user.is_active,
+        "vrf": user.verified_at is not None,
+        "su": user.is_superuser,
     }
 
     at_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -326,6 +423,7 @@ async def _generate_tokens(user, db, response):
         "sub": str_encode(str(user.id)),
         "t": refresh_key,
         "a": access_key,
+        "r": str_encode(str(user_token.id)),
     }
     refresh_token = generate_token(rt_payload, settings.JWT_SECRET, settings.JWT_ALGORITHM, rt_expires)
 
@@ -363,7 +461,7 @@ async def get_refresh_token(request, response, db):
 
     refresh_key = token_payload.get("t")
     access_key = token_payload.get("a")
-    user_id = token_payload.get("sub")
+    user_id = str_decode(token_payload.get("sub"))
 
     async with db.begin():  # Start a transaction
         query = select(UserToken).options(joinedload(UserToken.user)).filter(
@@ -373,25 +471,58 @@ async def get_refresh_token(request, response, db):
             UserToken.expires_at > datetime.utcnow(),
         )
 
-        user_token = await db.execute(query).scalars().first()
+        user_token = (await db.execute(query)).scalars().first()
 
         if not user_token:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid refresh token."
             )
 
-        # Update the expiration time of the user token
-        user_token.expires_at = datetime.utcnow(
-        ) + timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
+        # Rotate the session: its row is replaced, so the table holds one row
+        # per session however often it is refreshed. The delete is conditional
+        # so only one of two concurrent refreshes with the same token wins.
+        rotated = await db.execute(
+            delete(UserToken).where(
+                UserToken.id == user_token.id,
+                UserToken.refresh_token == refresh_key,
+            )
+        )
+        if rotated.rowcount != 1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid refresh token."
+            )
+
+        user = user_token.user
+        new_user_token = _new_user_token(user)
+        db.add(new_user_token)
+        await db.flush()
+
+    # The old token is being rotated out, so its access tokens stop working
+    await revoke_token(user_token.id)
+
+    return _issue_tokens(user, new_user_token, response)
+
 
-        # No need to call db.add(user_token) if you are just updating the existing entity
-        await db.flush()  # Flush changes to the database
+async def logout(request, response):
+    """
+    Log the user out by clearing the refresh token cookie.
 
-    # Generate new tokens for the user
-    return await _generate_tokens(user_token.user, db, response)
+    Cached token lookups of the user are dropped as well, so the next request
+    with one of their access tokens is checked against the database again,
+    and the session's token is revoked for the stateless authentication mode.
+    """
+    refresh_token = request.cookies.get("refresh_token")
+    if refresh_token:
+        token_payload = get_token_payload(
+            refresh_token, settings.JWT_SECRET, settings.JWT_ALGORITHM)
+        if token_payload and token_payload.get("sub"):
+            await invalidate_user_cache(str_decode(token_payload["sub"]))
+        if token_payload and token_payload.get("r"):
+            await revoke_token(str_decode(token_payload["r"]))
+    response.delete_cookie(key="refresh_token")
 
 
-async def email_forgot_password_link(data, background_tasks, db):
+async def email_forgot_password_link(data, db):
     user = await load_user(data.email, db)
     if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
@@ -402,7 +533,8 @@ async def email_forgot_password_link(data, background_tasks, db):
     if not user.verified_at:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Account is not verified")
-    await send_password_reset_email(user, background_tasks)
+    await send_password_reset_email(user, db)
+    await db.commit()
 
 
 async def reset_user_password(data, db):
@@ -417,15 +549,27 @@ async def reset_user_password(data, db):
        raise HTTPException(
            status_code=status.HTTP_400_BAD_REQUEST, detail="Account is not verified")
 
-   user_token = user.get_context_string(context=FORGOT_PASSWORD)
-   token_valid = verify_password(user_token, data.token)
+   token_valid = await verify_context_token(user, FORGOT_PASSWORD, data.token)
    if not token_valid:
        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid token")
 
-   user.password = hash_password(data.password)
+   user.password = await hash_password_async(data.password)
    user.updated_at = datetime.now()
 
-   await db.flush()
+   await db.commit()
+   # Only once committed, a lookup in between would cache the old row again
+   await invalidate_user_cache(user.id)
+
+   # Sessions opened with the old password must not outlive it
+   if settings.AUTH_STATELESS:
+       active_tokens = await db.execute(
+           select(UserToken.id).where(
+               UserToken.user_id == user.id,
+               UserToken.expires_at > datetime.utcnow(),
+           )
+       )
+       for user_token_id in active_tokens.scalars():
+           await revoke_token(user_token_id)
 
 
 async def fetch_user_details(user_id, db):
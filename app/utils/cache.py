@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from redis.exceptions import WatchError
+
+MISSING = object()
+
+
+@dataclass
+class CacheStats:
+    local_hits: int = 0
+    redis_hits: int = 0
+    misses: int = 0
+    redis_errors: int = 0
+    # lookups that waited for a value another caller was already computing
+    coalesced: int = 0
+
+    def as_dict(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "redis_errors": self.redis_errors,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+class LocalTTLCache:
+    """
+    In-process LRU cache whose entries expire after a time to live.
+
+    The least recently used entry is evicted once `maxsize` is reached.
+    Keys can carry tags so a group of entries can be dropped at once.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._tags = {}
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return MISSING
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self.delete(key)
+            return MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value, ttl: float = None, tags: list[str] = ()):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self.delete(key)
+        self._entries[key] = (value, time.monotonic() + ttl, tuple(tags))
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self.delete(next(iter(self._entries)))
+
+    def delete(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tag(self, tag: str):
+        for key in list(self._tags.get(tag, ())):
+            self.delete(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TwoTierCache:
+    """
+    Cache with an in-process tier in front of an optional shared Redis tier.
+
+    Values must be JSON serializable. Lookups try the local tier first, then
+    Redis, and a Redis hit is copied into the local tier. Redis errors are
+    logged and treated as misses, so the cache never takes a request down.
+
+    Invalidations only reach the local tier of the process that issues them,
+    so other processes can serve a stale local entry for up to `local_ttl`.
+    Each invalidation moves its tag to a new generation, and a value computed
+    while one of its tags moved is returned but not cached, so a read that
+    raced a write cannot store the rows from before it.
+
+    Args:
+        namespace (str): Prefix for every Redis key written by this cache.
+        maxsize (int): Maximum number of entries in the local tier.
+        ttl (float): Time to live in seconds for the Redis tier.
+        local_ttl (float): Time to live in seconds for the local tier,
+            defaults to `ttl`.
+        redis_client: An async Redis client, or None for a local-only cache.
+    """
+
+    def __init__(self, namespace: str, maxsize: int, ttl: float, local_ttl: float = None, redis_client=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LocalTTLCache(maxsize, local_ttl or ttl)
+        self.redis = redis_client
+        self.stats = CacheStats()
+        self._flights = {}
+        # Tag generations of this process, only kept while something is computed
+        self._generations = {}
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    def _generation_key(self, tag: str) -> str:
+        return f"{self.namespace}:generation:{tag}"
+
+    def _local_generation(self, tags: list[str]) -> tuple:
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    async def _generation(self, tags: list[str]) -> tuple:
+        """
+        Generations of `tags` in this process and in Redis. The Redis part is
+        None without Redis or if it cannot be read.
+        """
+        local = self._local_generation(tags)
+        if self.redis is None or not tags:
+            return local, None
+        try:
+            shared = await self.redis.mget(*(self._generation_key(tag) for tag in tags))
+        except Exception as exc:
+            self.stats.redis_errors += 1
+            logging.warning(f"Cache {self.namespace} generation read failed: {exc}")
+            return local, None
+        return local, tuple(shared)
+
+    async def get(self, key: str):
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.stats.local_hits += 1
+            return value
+
+        if self.redis is not None:
+            try:
+                raw = await self.redis.get(self._key(key))
+            except Exception as exc:
+                self.stats.redis_errors += 1
+                logging.warning(f"Cache {self.namespace} read failed: {exc}")
+                raw = None
+            if raw is not None:
+                self.stats.redis_hits += 1
+                entry = json.loads(raw)
+                self.local.set(key, entry["value"], tags=entry["tags"])
+                return entry["value"]
+
+        self.stats.misses += 1
+        return MISSING
+
+    async def set(self, key: str, value, ttl: float = None, tags: list[str] = (), generation: tuple = None):
+        """
+        Store a value in both tiers.
+
+        `generation` is the generation of `tags` read before the value was
+        computed. If one of the tags was invalidated since, nothing is stored.
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        local_generation, shared_generation = generation or (None, None)
+        if local_generation is not None and local_generation != self._local_generation(tags):
+            return
+        if self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    if shared_generation is not None:
+                        # The write is dropped if a tag moves before it runs
+                        generation_keys = [self._generation_key(tag) for tag in tags]
+                        await pipe.watch(*generation_keys)
+                        if tuple(await pipe.mget(*generation_keys)) != shared_generation:
+                            return
+                        pipe.multi()
+                    pipe.set(self._key(key), json.dumps({"value": value, "tags": list(tags)}), px=int(ttl * 1000))
+                    for tag in tags:
+                        pipe.sadd(self._tag_key(tag), key)
+                        pipe.expire(self._tag_key(tag), int(self.ttl) + 1)
+                    await pipe.execute()
+            except WatchError:
+                return
+            except Exception as exc:
+                self.stats.redis_errors += 1
+                logging.warning(f"Cache {self.namespace} write failed: {exc}")
+        if local_generation is None or local_generation == self._local_generation(tags):
+            self.local.set(key, value, ttl, tags)
+
+    async def get_or_set(self, key: str, compute, ttl: float = None, tags: list[str] = (), refresh: bool = False):
+        """
+        Read-through lookup: return the cached value, or compute and cache it.
+
+        Concurrent misses of one key in this process share a single call of
+        `compute`, so an expired entry does not send every waiting request to
+        the database at once. `refresh` skips the lookup and recomputes.
+        """
+        if not refresh:
+            value = await self.get(key)
+            if value is not MISSING:
+                return value
+
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.stats.coalesced += 1
+            value = await asyncio.shield(flight)
+            if value is not MISSING:
+                return value
+            # The shared computation failed, try on our own
+            return await compute()
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[key] = flight
+        value = MISSING
+        try:
+            generation = await self._generation(tags)
+            value = await compute()
+            await self.set(key, value, ttl, tags, generation)
+            return value
+        finally:
+            del self._flights[key]
+            if not self._flights:
+                # Nothing holds a generation any more
+                self._generations.clear()
+            flight.set_result(value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.local.delete(key)
+        if self.redis is None or not keys:
+            return
+        try:
+            await self.redis.delete(*(self._key(key) for key in keys))
+        except Exception as exc:
+            self.stats.redis_errors += 1
+            logging.warning(f"Cache {self.namespace} delete failed: {exc}")
+
+    async def invalidate_tag(self, tag: str):
+        if self._flights:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+        self.local.invalidate_tag(tag)
+        if self.redis is None:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.incr(self._generation_key(tag))
+                pipe.expire(self._generation_key(tag), int(self.ttl) + 1)
+                await pipe.execute()
+            keys = await self.redis.smembers(self._tag_key(tag))
+            await self.redis.delete(
+                self._tag_key(tag),
+                *(self._key(key.decode() if isinstance(key, bytes) else key) for key in keys),
+            )
+        except Exception as exc:
+            self.stats.redis_errors += 1
+            logging.warning(f"Cache {self.namespace} invalidation failed: {exc}")
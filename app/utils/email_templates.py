@@ -0,0 +1,75 @@
+import html
+import os
+import re
+from jinja2 import Environment, FileSystemLoader, FunctionLoader, select_autoescape
+
+_DROPPED_BLOCKS = re.compile(r"<!DOCTYPE[^>]*>|<(head|style|script)\b.*?</\1>", re.IGNORECASE | re.DOTALL)
+_LINKS = re.compile(r"<a\b[^>]*\bhref=\"([^\"]*)\"[^>]*>(.*?)</a>", re.IGNORECASE | re.DOTALL)
+_LINE_BREAKS = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_BLOCK_ENDS = re.compile(r"</?(p|div|h[1-6]|li|tr|table)\b[^>]*>", re.IGNORECASE)
+_TAGS = re.compile(r"<[^>]+>")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _link_text(match) -> str:
+    url, text = match.group(1), _TAGS.sub("", match.group(2)).strip()
+    return url if not text or text == url else f"{text}: {url}"
+
+
+def html_to_text_template(source: str) -> str:
+    """
+    Derive a plain text template from an HTML email template.
+
+    Markup is stripped and links are spelled out, Jinja expressions are kept
+    as they are, so the result renders with the same context.
+    """
+    text = _DROPPED_BLOCKS.sub("", source)
+    text = _LINKS.sub(_link_text, text)
+    text = _LINE_BREAKS.sub("\n", text)
+    text = _BLOCK_ENDS.sub("\n\n", text)
+    text = html.unescape(_TAGS.sub("", text))
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip() + "\n"
+
+
+class EmailTemplates:
+    """
+    Compiled HTML email templates and their plain text alternates.
+
+    Both are compiled once by `load_all` and kept for good. With `reload`,
+    every lookup checks the file's modification time first and recompiles a
+    changed template, which is meant for editing templates in development.
+    """
+
+    def __init__(self, folder, reload: bool = False):
+        self.folder = str(folder)
+        self.html = Environment(
+            loader=FileSystemLoader(self.folder),
+            autoescape=select_autoescape(["html"]),
+            auto_reload=reload,
+            cache_size=-1,
+        )
+        self.text = Environment(
+            loader=FunctionLoader(self._text_source),
+            autoescape=False,
+            auto_reload=reload,
+            cache_size=-1,
+        )
+
+    def _text_source(self, name: str):
+        source, filename, uptodate = self.html.loader.get_source(self.html, name)
+        return html_to_text_template(source), filename, uptodate
+
+    def load_all(self) -> list:
+        names = [name for name in os.listdir(self.folder) if name.endswith(".html")]
+        for name in names:
+            self.html.get_template(name)
+            self.text.get_template(name)
+        return names
+
+    def render(self, template_name: str, context: dict) -> tuple:
+        """Returns the HTML and the plain text body of an email."""
+        return (
+            self.html.get_template(template_name).render(**context),
+            self.text.get_template(template_name).render(**context),
+        )
@@ -6,3 +6,15 @@ class Juz(Enum):
     THREE = 3
     FOUR = 4
    
+
+
+class LeaderboardPeriod(str, Enum):
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+
+
+class EmailStatus(str, Enum):
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
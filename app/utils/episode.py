@@ -1,4 +1,14 @@
+import base64
+from fastapi import HTTPException, status
 
+# Members allowed in one episode
+MAX_EPISODE_MEMBERS = 50
+# Juz of progress after which newcomers can no longer catch up and join
+MAX_JOIN_PROGRESS = 6
+# Juz in one khatma, an episode's progress wraps around after it
+JUZ_PER_KHATMA = 30
+# Points a member earns for each juz read
+POINTS_PER_JUZ = 1
 
 
 async def check_episode_condition(episode):
@@ -8,3 +18,16 @@ async def check_episode_condition(episode):
 
     ]
     return all(condition(episode) for condition in conditions)
+
+
+def encode_episode_cursor(episode) -> str:
+    """Encode the keyset position after `episode` for the next page."""
+    return base64.urlsafe_b64encode(str(episode.id).encode()).decode("ascii")
+
+
+def decode_episode_cursor(cursor: str) -> int:
+    """Decode a cursor from `encode_episode_cursor` into the episode id."""
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode("ascii")).decode())
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
@@ -0,0 +1,33 @@
+import hashlib
+from typing import Optional
+from fastapi import Response, status
+
+EPISODE_VERSION_FIELDS = ("id", "progress", "no_of_khatmis", "member_count", "is_full")
+PROFILE_VERSION_FIELDS = (
+    "id", "first_name", "email", "profile_image", "profile_image_variants", "points",
+    "no_of_khatmis", "is_active", "created_at", "updated_at",
+)
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag over the values that make up a representation's version."""
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest() + '"'
+
+
+def row_etag(row, fields: tuple) -> str:
+    """ETag of a row, given as an object or a dict, from the fields that change with it."""
+    get = row.get if isinstance(row, dict) else lambda field: getattr(row, field)
+    return make_etag(*(get(field) for field in fields))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses the weak comparison, a W/ prefix is ignored."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
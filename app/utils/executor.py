@@ -0,0 +1,105 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+class ExecutorBusy(Exception):
+    """Raised when a `BoundedExecutor` already has `max_pending` calls waiting."""
+
+
+@dataclass
+class ExecutorStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    waiting: int = 0
+    running: int = 0
+    max_waiting: int = 0
+    total_wait: float = 0.0
+    total_run: float = 0.0
+
+    def as_dict(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "running": self.running,
+            "avg_wait_ms": round(self.total_wait / finished * 1000, 3) if finished else 0.0,
+            "avg_run_ms": round(self.total_run / finished * 1000, 3) if finished else 0.0,
+        }
+
+
+class BoundedExecutor:
+    """
+    Run blocking calls off the event loop with bounded concurrency.
+
+    At most `max_workers` calls run at once; the rest wait in line, and once
+    `max_pending` calls are waiting new ones are rejected with `ExecutorBusy`
+    instead of piling up. The pool is created on first use.
+
+    Args:
+        name (str): Name used for worker threads.
+        max_workers (int): Number of calls allowed to run at the same time.
+        kind (str): "thread" for a thread pool, "process" for a process pool.
+            Process pools need picklable, module level functions.
+        max_pending (int): Maximum number of waiting calls, None for no limit.
+    """
+
+    def __init__(self, name: str, max_workers: int, kind: str = "thread", max_pending: int = None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.max_workers = max_workers
+        self.kind = kind
+        self.max_pending = max_pending
+        self.stats = ExecutorStats()
+        self._executor: Executor = None
+        self._semaphore = asyncio.Semaphore(max_workers)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    async def run(self, fn, *args):
+        if self.max_pending is not None and self.stats.waiting >= self.max_pending:
+            self.stats.rejected += 1
+            raise ExecutorBusy(f"{self.name} has {self.stats.waiting} calls waiting")
+
+        self.stats.submitted += 1
+        self.stats.waiting += 1
+        self.stats.max_waiting = max(self.stats.max_waiting, self.stats.waiting)
+        queued = time.perf_counter()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.stats.waiting -= 1
+        started = time.perf_counter()
+        self.stats.total_wait += started - queued
+        self.stats.running += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        except Exception:
+            self.stats.failed += 1
+            raise
+        else:
+            self.stats.completed += 1
+            return result
+        finally:
+            self.stats.running -= 1
+            self.stats.total_run += time.perf_counter() - started
+            self._semaphore.release()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,37 @@
+import io
+
+from PIL import Image, ImageOps
+
+# Square derivatives made of every profile image, by name and edge in pixels
+PROFILE_IMAGE_SIZES = {
+    "small": 64,
+    "medium": 256,
+}
+# Formats each size is encoded in, with their content type and save options
+DERIVATIVE_FORMATS = {
+    "webp": ("image/webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    "jpg": ("image/jpeg", {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def render_profile_derivatives(content: bytes) -> dict:
+    """
+    Decode an image once and encode every size in every derivative format.
+
+    Runs in a worker process, so it only takes and returns plain bytes.
+
+    Returns:
+        dict: `{"small_webp": (bytes, "image/webp", "webp"), ...}`
+    """
+    with Image.open(io.BytesIO(content)) as image:
+        image.draft("RGB", (max(PROFILE_IMAGE_SIZES.values()),) * 2)
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    derivatives = {}
+    for name, edge in PROFILE_IMAGE_SIZES.items():
+        resized = ImageOps.fit(image, (edge, edge), Image.Resampling.LANCZOS)
+        for extension, (content_type, options) in DERIVATIVE_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, **options)
+            derivatives[f"{name}_{extension}"] = (buffer.getvalue(), content_type, extension)
+    return derivatives
@@ -0,0 +1,11 @@
+from datetime import date, timedelta
+from app.utils.enum import LeaderboardPeriod
+
+
+def window_start(period: LeaderboardPeriod, day: date) -> date:
+    """First day of the daily, weekly (from Monday) or monthly window holding `day`."""
+    if period == LeaderboardPeriod.WEEKLY:
+        return day - timedelta(days=day.weekday())
+    if period == LeaderboardPeriod.MONTHLY:
+        return day.replace(day=1)
+    return day
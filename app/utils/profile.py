@@ -1,6 +1,7 @@
-import boto3
+import logging
+import magic
 from fastapi import HTTPException, status
-from app.config.settings import settings
+from app.config.storage import StorageTimeout, storage
 
 
 KB = 1024
@@ -12,37 +13,88 @@ SUPPORTED_IMAGE_FORMATS = {
     "image/webp": "webp",
 }
 
-s3_client = boto3.resource("s3", aws_access_key_id=settings.AWS_ACCESS_KEY_ID, aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY)
+# Bytes read at a time from an upload
+UPLOAD_CHUNK_SIZE = 64 * KB
+# Bytes python-magic needs to recognise the supported formats
+SNIFF_SIZE = 2 * KB
+# Content addressed objects never change, caches may keep them for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
-bucket = s3_client.Bucket(settings.AWS_S3_BUCKET_NAME)
 
-async def s3_upload(content: bytes, filename: str, content_type: str):
-    bucket.put_object(Key=filename, Body=content, ContentType=content_type)
+async def iter_upload_file(upload, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    while chunk := await upload.read(chunk_size):
+        yield chunk
 
 
-async def delete_s3_image(filename):
+async def open_image_stream(chunks, max_size: int):
+    """
+    Check an image upload as it streams in.
+
+    The type is sniffed from the first bytes before anything is stored, and
+    the returned chunks raise as soon as the running size passes `max_size`,
+    so a bad upload is rejected without being buffered.
+
+    Returns:
+        tuple: The sniffed MIME type and an async iterator over all chunks.
+    """
+    chunks = aiter(chunks)
+    head = b""
+    async for chunk in chunks:
+        head += chunk
+        if len(head) >= SNIFF_SIZE:
+            break
+    if not head:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No profile image provided")
+    if len(head) > max_size:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Profile image is too large")
+
+    file_type = magic.from_buffer(head, mime=True)
+    if file_type not in SUPPORTED_IMAGE_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported image format")
+
+    async def checked_chunks():
+        size = len(head)
+        yield head
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Profile image is too large")
+            yield chunk
+
+    return file_type, checked_chunks()
+
+
+async def s3_upload_stream(chunks, filename: str, content_type: str):
     try:
-        # Specify the bucket name (ensure settings.AWS_S3_BUCKET_NAME is defined)
-        bucket_name = settings.AWS_S3_BUCKET_NAME
-
-        # Delete the object from S3
-        response = bucket.delete_objects(
-            Delete={
-                'Objects': [
-                    {
-                        'Key': filename
-                    }
-                ]
-            }
-        )
-
-        # Optionally, check if the delete was successful (e.g., check response code)
-        if response['ResponseMetadata']['HTTPStatusCode'] == 204:
-            print(f"Successfully deleted {filename} from {bucket_name}")
-        else:
-            print(f"Failed to delete {filename} from {bucket_name}, response: {response}")
-
-    except Exception as e:
-        # Handle any errors that occur during the deletion process
-        print(f"Error occurred while trying to delete {filename} from S3: {e}")
+        await storage.upload_stream(filename, chunks, content_type)
+    except HTTPException:
+        # The upload itself was rejected while streaming
+        raise
+    except StorageTimeout:
+        logging.warning(f"Timed out uploading {filename} to S3")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Image storage timed out")
+    except Exception:
+        logging.exception(f"Error occurred while trying to upload {filename} to S3")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error uploading image to S3")
+
+
+async def s3_copy(source_key: str, filename: str, content_type: str, cache_control: str = None):
+    try:
+        await storage.copy_object(source_key, filename, content_type, cache_control)
+    except StorageTimeout:
+        logging.warning(f"Timed out copying {source_key} to {filename} in S3")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Image storage timed out")
+    except Exception:
+        logging.exception(f"Error occurred while trying to copy {source_key} to {filename} in S3")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Error uploading image to S3")
+
+
+async def delete_s3_image(*filenames):
+    try:
+        response = await storage.delete_objects(*filenames)
+    except Exception:
+        logging.exception(f"Error occurred while trying to delete {filenames} from S3")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error deleting image from S3")
+
+    if response.get("Errors"):
+        logging.warning(f"Failed to delete {filenames} from {storage.bucket}, response: {response['Errors']}")
@@ -0,0 +1,91 @@
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+
+@dataclass
+class RateLimitStats:
+    allowed: int = 0
+    limited: int = 0
+    local_limited: int = 0
+    redis_errors: int = 0
+    failed_open: int = 0
+    failed_closed: int = 0
+    redis_checks: int = 0
+    redis_seconds: float = 0.0
+    redis_max_seconds: float = 0.0
+    # latest Redis check latencies, for percentiles
+    redis_samples: deque = field(default_factory=lambda: deque(maxlen=1024))
+
+    def record_check(self, seconds: float):
+        self.redis_checks += 1
+        self.redis_seconds += seconds
+        self.redis_max_seconds = max(self.redis_max_seconds, seconds)
+        self.redis_samples.append(seconds)
+
+    def as_dict(self) -> dict:
+        samples = sorted(self.redis_samples)
+
+        def percentile(p: float) -> float:
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3) if samples else 0.0
+
+        return {
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "local_limited": self.local_limited,
+            "redis_errors": self.redis_errors,
+            "failed_open": self.failed_open,
+            "failed_closed": self.failed_closed,
+            "redis_checks": self.redis_checks,
+            "redis_avg_ms": round(self.redis_seconds / self.redis_checks * 1000, 3) if self.redis_checks else 0.0,
+            "redis_p50_ms": percentile(0.5),
+            "redis_p99_ms": percentile(0.99),
+            "redis_max_ms": round(self.redis_max_seconds * 1000, 3),
+        }
+
+
+class LocalBuckets:
+    """
+    In-process token buckets, one per client, for a single rate limit.
+
+    A bucket holds up to `times` tokens and refills at `times` per `period`,
+    which never allows fewer requests than a sliding window of the same limit.
+    An empty bucket therefore means the shared limit is exceeded as well, and
+    the request can be refused without asking Redis. Clients the shared limit
+    refused are blocked here until their window frees up.
+
+    The least recently seen client is dropped once `maxsize` is reached.
+    """
+
+    def __init__(self, times: int, period: float, maxsize: int):
+        self.capacity = times
+        self.rate = times / period
+        self.maxsize = maxsize
+        self._buckets = {}
+
+    def take(self, key: str) -> float:
+        """Take a token. Returns 0 if there was one, else the seconds until there is."""
+        now = time.monotonic()
+        tokens, updated, blocked_until = self._buckets.pop(key, (self.capacity, now, 0.0))
+        if blocked_until > now:
+            self._store(key, (tokens, updated, blocked_until))
+            return blocked_until - now
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._store(key, (tokens, now, 0.0))
+            return (1 - tokens) / self.rate
+        self._store(key, (tokens - 1, now, 0.0))
+        return 0.0
+
+    def block(self, key: str, seconds: float):
+        now = time.monotonic()
+        tokens, updated, _ = self._buckets.pop(key, (self.capacity, now, 0.0))
+        self._store(key, (tokens, updated, now + seconds))
+
+    def _store(self, key: str, bucket: tuple):
+        self._buckets[key] = bucket
+        while len(self._buckets) > self.maxsize:
+            del self._buckets[next(iter(self._buckets))]
+
+    def __len__(self):
+        return len(self._buckets)
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import time
+
+
+class RevokedTokens:
+    """
+    Set of revoked `UserToken` ids shared through Redis and mirrored in-process.
+
+    Revocations live in a Redis sorted set scored by the time the revoked
+    access token would expire anyway, so entries can be pruned once they are
+    harmless and the set stays as small as the number of revocations within
+    one access token lifetime. Lookups only read the local mirror, which
+    `sync()` refreshes from Redis.
+
+    Args:
+        redis_client: An async Redis client.
+        key (str): The Redis key of the sorted set.
+    """
+
+    def __init__(self, redis_client, key: str = "auth:revoked"):
+        self.redis = redis_client
+        self.key = key
+        self._revoked = {}
+
+    async def revoke(self, user_token_id, expires_at: float):
+        user_token_id = str(user_token_id)
+        self._revoked[user_token_id] = expires_at
+        await self.redis.zadd(self.key, {user_token_id: expires_at})
+
+    def is_revoked(self, user_token_id) -> bool:
+        expires_at = self._revoked.get(str(user_token_id))
+        return expires_at is not None and expires_at > time.time()
+
+    async def sync(self):
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(self.key, "-inf", now)
+            pipe.zrangebyscore(self.key, now, "+inf", withscores=True)
+            _, members = await pipe.execute()
+        # Revocations are never undone, so keep local ones a concurrent
+        # revoke() may have added after the read was issued
+        revoked = {key: value for key, value in self._revoked.items() if value > now}
+        revoked.update(
+            ((member.decode() if isinstance(member, bytes) else member), score)
+            for member, score in members
+        )
+        self._revoked = revoked
+
+    async def run(self, interval: float):
+        """Call `sync()` every `interval` seconds until cancelled."""
+        while True:
+            try:
+                await self.sync()
+            except Exception as exc:
+                logging.warning(f"Revoked token sync failed: {exc}")
+            await asyncio.sleep(interval)
+
+    def __len__(self):
+        return len(self._revoked)
@@ -0,0 +1,82 @@
+"""
+Compare the cost of resolving the current user from an access token.
+
+Runs against a throwaway SQLite database and times three paths:
+the database lookup in `get_token_user`, the same lookup served from the
+in-process user cache, and the stateless claims check in `get_claims_user`.
+
+Usage:
+    poetry run python -m benchmarks.auth_hot_path [iterations]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ["DATABASE_URI"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from app.config.database import sessionmanager
+from app.config.security import generate_token, get_claims_user, get_token_user, str_encode, user_cache
+from app.config.settings import settings
+from app.models import episodes  # noqa: F401
+from app.models.users import User, UserToken
+
+
+async def setup() -> str:
+    async with sessionmanager.connect() as connection:
+        await sessionmanager.create_all(connection)
+
+    async with sessionmanager.session() as session:
+        user = User(
+            first_name="Bench", last_name="User", email="bench@example.com", password="x",
+            is_active=True, verified_at=datetime.utcnow(),
+        )
+        session.add(user)
+        await session.flush()
+        user_token = UserToken(
+            user_id=user.id, access_token="access", refresh_token="refresh",
+            expires_at=datetime.utcnow() + timedelta(hours=1),
+        )
+        session.add(user_token)
+        await session.commit()
+
+    payload = {
+        "sub": str_encode(str(user.id)), "a": "access", "r": str_encode(str(user_token.id)),
+        "n": str_encode(user.first_name), "act": True, "vrf": True, "su": False,
+    }
+    return generate_token(payload, settings.JWT_SECRET, settings.JWT_ALGORITHM, timedelta(hours=1))
+
+
+async def time_path(name: str, resolve, iterations: int):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        assert await resolve() is not None
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24} {elapsed / iterations * 1_000_000:10.1f} us/request {iterations / elapsed:12.0f} requests/s")
+
+
+async def main(iterations: int):
+    token = await setup()
+
+    async def database():
+        user_cache.local.clear()
+        async with sessionmanager.session() as session:
+            return await get_token_user(token, session)
+
+    async def cached():
+        async with sessionmanager.session() as session:
+            return await get_token_user(token, session)
+
+    async def stateless():
+        return get_claims_user(token)
+
+    await time_path("database lookup", database, iterations)
+    await time_path("cached lookup", cached, iterations)
+    await time_path("stateless claims", stateless, iterations)
+    await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
@@ -0,0 +1,49 @@
+"""
+Compare the cost of rendering an email.
+
+Times rendering the account verification email the way fastapi-mail does it
+per send, with a new Jinja environment that loads and compiles the template
+each time, against the compiled template cache, and the cache plus building
+the full message with its plain text alternate.
+
+Usage:
+    poetry run python -m benchmarks.email_render [iterations]
+"""
+import sys
+import time
+
+from app.config.email import build_message, conf, templates
+
+TEMPLATE = "account-verification.html"
+CONTEXT = {
+    "app_name": "Mustaqeer",
+    "name": "Bench",
+    "activate_url": "https://example.com/auth/account-verify?token=1700000000.signature&email=bench@example.com",
+}
+
+
+def time_path(name: str, render, iterations: int):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<24} {elapsed / iterations * 1_000_000:10.1f} us/email {iterations / elapsed:12.0f} emails/s")
+
+
+def main(iterations: int):
+    def per_send():
+        return conf.template_engine().get_template(TEMPLATE).render(**CONTEXT)
+
+    def cached():
+        return templates.render(TEMPLATE, CONTEXT)
+
+    def full_message():
+        return build_message(["bench@example.com"], "Account Verification", CONTEXT, TEMPLATE).as_bytes()
+
+    time_path("compile per send", per_send, iterations)
+    time_path("cached html + text", cached, iterations)
+    time_path("cached full message", full_message, iterations)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,82 @@
+"""
+Fire many simultaneous joins at one episode and check the member cap holds.
+
+Each joiner uses its own session, like concurrent requests would. The run
+reports join throughput and fails if more members got in than the cap allows
+or if `member_count` disagrees with the members table.
+
+Runs against a throwaway SQLite database unless BENCH_DATABASE_URI points at
+a scratch database, e.g. a local Postgres, whose tables it will create.
+
+Usage:
+    poetry run python -m benchmarks.episode_join_concurrency [joiners]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URI"] = os.environ.get(
+    "BENCH_DATABASE_URI", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+)
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, select
+
+from app.config.database import sessionmanager
+from app.models.episodes import Episode, Member
+from app.models.users import User
+from app.schemas.episodes import JoinEpisodeRequest
+from app.services.episodes import join_episode_service
+from app.utils.episode import MAX_EPISODE_MEMBERS
+
+
+async def setup(joiners: int) -> int:
+    async with sessionmanager.connect() as connection:
+        await sessionmanager.create_all(connection)
+
+    async with sessionmanager.session() as session:
+        result = await session.execute(
+            insert(User).returning(User.id),
+            [
+                {"first_name": "Joiner", "last_name": str(i), "email": f"joiner{i}@example.com", "password": "x"}
+                for i in range(joiners + 1)
+            ],
+        )
+        owner_id = result.scalars().first()
+        episode = Episode(juz=1, description="Concurrency benchmark", user_id=owner_id)
+        session.add(episode)
+        await session.commit()
+        return episode.id
+
+
+async def join(episode_id: int, user_id: int) -> bool:
+    async with sessionmanager.session() as session:
+        try:
+            await join_episode_service(JoinEpisodeRequest(episode_id=episode_id), session, User(id=user_id))
+            return True
+        except HTTPException:
+            return False
+
+
+async def main(joiners: int):
+    episode_id = await setup(joiners)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(join(episode_id, user_id) for user_id in range(2, joiners + 2)))
+    elapsed = time.perf_counter() - started
+
+    async with sessionmanager.session() as session:
+        member_count = await session.scalar(select(Episode.member_count).where(Episode.id == episode_id))
+        members = await session.scalar(select(func.count(Member.id)).where(Member.episode_id == episode_id))
+    await sessionmanager.close()
+
+    print(f"{joiners} joiners in {elapsed:.2f}s ({joiners / elapsed:.0f} joins/s)")
+    print(f"admitted {sum(results)}, refused {joiners - sum(results)}, cap {MAX_EPISODE_MEMBERS}")
+    print(f"member_count {member_count}, member rows {members}")
+    assert sum(results) == members == member_count == min(joiners, MAX_EPISODE_MEMBERS)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 300))
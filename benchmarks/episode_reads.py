@@ -0,0 +1,98 @@
+"""
+Compare the cost of reading and encoding a list of episodes.
+
+Runs against a throwaway SQLite database holding 10k episodes and times two
+paths: the former one, loading `Episode` entities and encoding them with
+FastAPI's `jsonable_encoder` and the json module, and the current one,
+selecting only the response columns as rows and encoding them with the
+response model straight to JSON in pydantic-core. Peak memory is measured
+with tracemalloc.
+
+Usage:
+    poetry run python -m benchmarks.episode_reads [episodes] [rounds]
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ["DATABASE_URI"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import insert, select
+
+from app.config.database import sessionmanager
+from app.models import leaderboard  # noqa: F401
+from app.models.episodes import Episode
+from app.models.users import User
+from app.responses.episodes import episode_list_adapter
+from app.services.episodes import EPISODE_COLUMNS
+
+
+async def setup(episodes: int):
+    async with sessionmanager.connect() as connection:
+        await sessionmanager.create_all(connection)
+
+    async with sessionmanager.session() as session:
+        user = User(first_name="Bench", last_name="User", email="bench@example.com", password="x")
+        session.add(user)
+        await session.flush()
+        now = datetime.utcnow()
+        await session.execute(insert(Episode), [
+            {
+                "juz": i % 30 + 1, "description": f"Benchmark episode number {i}", "no_of_khatmis": i % 7,
+                "progress": i % 30, "created_at": now, "is_full": False, "member_count": i % 50 + 1,
+                "user_id": user.id,
+            }
+            for i in range(episodes)
+        ])
+        await session.commit()
+
+
+async def entities() -> bytes:
+    async with sessionmanager.session() as session:
+        episodes = await session.execute(select(Episode))
+        episodes = episodes.scalars().all()
+        return json.dumps(jsonable_encoder(episodes)).encode()
+
+
+async def rows() -> bytes:
+    async with sessionmanager.session() as session:
+        episodes = await session.execute(select(*EPISODE_COLUMNS))
+        episodes = episode_list_adapter.validate_python(episodes.all())
+        return episode_list_adapter.dump_json(episodes)
+
+
+async def time_path(name: str, read, episodes: int, rounds: int):
+    tracemalloc.start()
+    await read()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await read()
+    elapsed = time.perf_counter() - started
+    print(
+        f"{name:<24} {episodes * rounds / elapsed:12.0f} rows/s"
+        f" {peak / 1024 / 1024 * 10_000 / episodes:10.1f} MiB peak per 10k rows"
+    )
+
+
+async def main(episodes: int, rounds: int):
+    await setup(episodes)
+    assert json.loads(await entities()) == json.loads(await rows())
+    await time_path("entities + json", entities, episodes, rounds)
+    await time_path("rows + pydantic-core", rows, episodes, rounds)
+    await sessionmanager.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10_000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5,
+    ))
@@ -0,0 +1,73 @@
+import os
+import tempfile
+
+# Settings are read when the app is imported, so give the required ones
+# test values first. Nothing listens on the Redis port: the Redis paths
+# fail open, and the tests only exercise the database.
+os.environ.update(
+    APP_NAME="mustaqeer-test",
+    DATABASE_URI="sqlite+aiosqlite://",
+    DATABASE_POOL_MODE="null",
+    FRONTEND_HOST="http://localhost:3000",
+    EMAIL_USER="test",
+    EMAIL_PASSWORD="test",
+    EMAIL_FROM="test@example.com",
+    EMAIL_PORT="1025",
+    EMAIL_SERVER="localhost",
+    EMAIL_OUTBOX_IN_APP="false",
+    JWT_SECRET="test-secret-that-is-long-enough-for-hs256",
+    JWT_ALGORITHM="HS256",
+    ACCESS_TOKEN_EXPIRE_MINUTES="5",
+    REFRESH_TOKEN_EXPIRE_MINUTES="60",
+    SECRET_KEY="test-secret-key",
+    REDIS_URI="redis://127.0.0.1:1/0",
+    RESPONSE_CACHE_REDIS="false",
+    AWS_ACCESS_KEY_ID="test",
+    AWS_SECRET_ACCESS_KEY="test",
+    AWS_S3_BUCKET_NAME="test",
+    STORAGE_BACKEND="local",
+    STORAGE_LOCAL_PATH=tempfile.mkdtemp(),
+)
+
+import pytest
+
+from app.config.database import DatabaseSessionManager
+from app.models import email, episodes, images, leaderboard, users  # noqa: F401
+from app.models.users import User
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database(tmp_path):
+    """A session manager on a fresh SQLite database with every table created."""
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/test.db")
+    async with manager.connect() as connection:
+        await manager.create_all(connection)
+    yield manager
+    await manager.close()
+
+
+@pytest.fixture
+async def db(database):
+    async with database.session() as session:
+        yield session
+
+
+@pytest.fixture
+def make_users(db):
+    async def make_users(count: int, points: int = 0) -> list[User]:
+        created = [
+            User(
+                first_name=f"user{i}", last_name="test", email=f"user{i}@example.com",
+                password="unused", is_active=True, points=points,
+            )
+            for i in range(count)
+        ]
+        db.add_all(created)
+        await db.commit()
+        return created
+    return make_users
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.config import security
+from app.config.security import generate_context_token, hash_password
+from app.models.users import User
+from app.schemas.users import VerifyUserRequest
+from app.services.user import activate_user_account
+from app.utils.email_context import USER_VERIFY_ACCOUNT
+from app.utils.executor import ExecutorBusy
+
+pytestmark = pytest.mark.anyio
+
+
+async def inactive_user(db, make_users) -> User:
+    (user,) = await make_users(1)
+    user.is_active = False
+    await db.commit()
+    await db.refresh(user)
+    return user
+
+
+async def activate(database, token: str, email: str):
+    async with database.session() as db:
+        return await activate_user_account(VerifyUserRequest(token=token, email=email), db)
+
+
+async def is_active(database, user_id: int) -> bool:
+    async with database.session() as db:
+        active = await db.execute(select(User.is_active).where(User.id == user_id))
+        return active.scalar()
+
+
+async def test_valid_link_activates_the_account(database, db, make_users):
+    user = await inactive_user(db, make_users)
+    token = generate_context_token(user, USER_VERIFY_ACCOUNT, timedelta(minutes=10))
+
+    await activate(database, token, user.email)
+
+    assert await is_active(database, user.id)
+
+
+async def test_invalid_link_is_refused(database, db, make_users):
+    user = await inactive_user(db, make_users)
+
+    with pytest.raises(HTTPException) as refused:
+        await activate(database, "0.forged", user.email)
+
+    assert refused.value.status_code == 400
+    assert not await is_active(database, user.id)
+
+
+async def test_busy_password_hasher_is_not_reported_as_an_invalid_link(database, db, make_users, monkeypatch):
+    user = await inactive_user(db, make_users)
+    # links sent before signed tokens are checked with bcrypt in the hasher pool
+    token = hash_password(user.get_context_string(context=USER_VERIFY_ACCOUNT))
+
+    async def busy(fn, *args):
+        raise ExecutorBusy("password-hash has 1 calls waiting")
+    monkeypatch.setattr(security.password_hasher, "run", busy)
+
+    with pytest.raises(HTTPException) as refused:
+        await activate(database, token, user.email)
+
+    assert refused.value.status_code == 503
+    assert not await is_active(database, user.id)
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from app.utils.cache import MISSING, TwoTierCache
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_value_computed_across_an_invalidation_is_not_stored():
+    cache = TwoTierCache("test", maxsize=10, ttl=60)
+    reading, written = asyncio.Event(), asyncio.Event()
+
+    async def compute():
+        reading.set()
+        # the write commits and invalidates while the old rows are in hand
+        await written.wait()
+        return "before the write"
+
+    async def write():
+        await reading.wait()
+        await cache.invalidate_tag("episodes")
+        written.set()
+
+    value, _ = await asyncio.gather(cache.get_or_set("page", compute, tags=["episodes"]), write())
+
+    assert value == "before the write"
+    assert await cache.get("page") is MISSING
+    assert await cache.get_or_set("page", lambda: asyncio.sleep(0, "after the write"), tags=["episodes"]) == "after the write"
+    assert await cache.get("page") == "after the write"
+
+
+async def test_invalidating_another_tag_keeps_the_value():
+    cache = TwoTierCache("test", maxsize=10, ttl=60)
+
+    async def compute():
+        await cache.invalidate_tag("user:2")
+        return "user 1"
+
+    await cache.get_or_set("profile", compute, tags=["user:1"])
+
+    assert await cache.get("profile") == "user 1"
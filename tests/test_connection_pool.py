@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import NullPool, text
+from sqlalchemy.exc import TimeoutError
+
+from app.config import database as database_module
+from app.config.database import DatabaseSessionManager, InstrumentedQueuePool, PoolStats, engine_options
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def pool_mode(monkeypatch):
+    def set_mode(mode: str):
+        monkeypatch.setattr(database_module.settings, "DATABASE_POOL_MODE", mode)
+    return set_mode
+
+
+@pytest.fixture
+async def pooled(tmp_path, pool_mode):
+    pool_mode("queue")
+    manager = DatabaseSessionManager(
+        f"sqlite+aiosqlite:///{tmp_path}/pool.db",
+        engine_kwargs={"pool_size": 1, "max_overflow": 1, "pool_timeout": 0.2},
+    )
+    yield manager
+    await manager.close()
+
+
+def test_null_mode_opens_a_connection_per_checkout(pool_mode):
+    pool_mode("null")
+
+    options = engine_options({})
+
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+
+
+def test_queue_mode_is_sized_by_the_settings_unless_overridden(pool_mode):
+    pool_mode("queue")
+
+    options = engine_options({"pool_size": 3})
+
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == database_module.settings.DATABASE_MAX_OVERFLOW
+
+
+async def test_checkouts_overflow_and_timeouts_are_counted(pooled):
+    async with pooled.connect() as first, pooled.connect() as second:
+        await first.execute(text("SELECT 1"))
+        await second.execute(text("SELECT 1"))
+        status = pooled.pool_status()
+        assert (status["pool"], status["checked_out"], status["overflow"]) == ("InstrumentedQueuePool", 2, 1)
+
+        with pytest.raises(TimeoutError):
+            async with pooled.connect():
+                pass
+
+    status = pooled.pool_status()
+    assert (status["checkouts"], status["checkins"], status["timeouts"]) == (2, 2, 1)
+    assert status["checked_out"] == 0
+    assert status["max_wait_ms"] >= status["avg_wait_ms"] > 0
+
+
+async def test_counters_survive_the_pool_being_recreated(pooled):
+    async with pooled.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+    stats = pooled._engine.pool.stats
+
+    await pooled._engine.dispose()
+
+    assert pooled._engine.pool.stats is stats
+    assert pooled.pool_status()["checkouts"] == 1
+
+
+def test_average_wait_is_zero_before_any_checkout():
+    stats = PoolStats()
+    assert stats.as_dict()["avg_wait_ms"] == 0.0
+
+    stats.record_checkout(0.002)
+    stats.record_checkout(0.004)
+    assert (stats.as_dict()["avg_wait_ms"], stats.as_dict()["max_wait_ms"]) == (3.0, 4.0)
@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.config import security
+from app.config.security import generate_context_token, hash_password, verify_context_token
+from app.models.users import User
+from app.utils.email_context import FORGOT_PASSWORD, USER_VERIFY_ACCOUNT
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def user() -> User:
+    return User(id=7, password="$2b$12$storedpasswordhash", updated_at=datetime(2026, 10, 1, 12, 30))
+
+
+async def test_token_round_trips_for_its_purpose(user):
+    token = generate_context_token(user, USER_VERIFY_ACCOUNT, timedelta(minutes=10))
+
+    assert await verify_context_token(user, USER_VERIFY_ACCOUNT, token)
+    assert not await verify_context_token(user, FORGOT_PASSWORD, token)
+
+
+async def test_expired_token_is_refused(user):
+    token = generate_context_token(user, USER_VERIFY_ACCOUNT, timedelta(seconds=-1))
+
+    assert not await verify_context_token(user, USER_VERIFY_ACCOUNT, token)
+
+
+async def test_tampered_token_is_refused(user):
+    token = generate_context_token(user, USER_VERIFY_ACCOUNT, timedelta(minutes=10))
+    expires_at, signature = token.split(".")
+
+    for tampered in (f"{int(expires_at) + 3600}.{signature}", f"{expires_at}.{signature[::-1]}", signature, ""):
+        assert not await verify_context_token(user, USER_VERIFY_ACCOUNT, tampered)
+
+
+async def test_token_stops_working_once_the_user_changes(user):
+    token = generate_context_token(user, FORGOT_PASSWORD, timedelta(minutes=10))
+
+    user.updated_at += timedelta(seconds=1)
+
+    assert not await verify_context_token(user, FORGOT_PASSWORD, token)
+
+
+async def test_token_is_bound_to_the_user(user):
+    token = generate_context_token(user, FORGOT_PASSWORD, timedelta(minutes=10))
+    other = User(id=8, password=user.password, updated_at=user.updated_at)
+
+    assert not await verify_context_token(other, FORGOT_PASSWORD, token)
+
+
+@pytest.mark.parametrize("accept_legacy", [True, False])
+async def test_legacy_bcrypt_token_depends_on_the_setting(user, monkeypatch, accept_legacy):
+    monkeypatch.setattr(security.settings, "EMAIL_TOKEN_ACCEPT_LEGACY", accept_legacy)
+    token = hash_password(user.get_context_string(context=USER_VERIFY_ACCOUNT))
+
+    assert await verify_context_token(user, USER_VERIFY_ACCOUNT, token) is accept_legacy
+    assert not await verify_context_token(user, FORGOT_PASSWORD, token)
@@ -0,0 +1,184 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app.config.email import MailConnection, conf
+from app.models.email import EmailOutbox
+from app.services.email_outbox import CLAIM_LEASE_SECONDS, claim_emails, retry_delay, send_outbox_batch
+from app.services.email_outbox import settings as outbox_settings
+from app.utils.enum import EmailStatus
+
+pytestmark = pytest.mark.anyio
+
+
+class SMTPStub:
+    """
+    Just enough of an SMTP server to accept mail on a local port.
+
+    Recipients containing "bounce" are refused. With `drop_after`, the first
+    connection is cut without a reply when it starts the message after that
+    many, like a server closing a connection in the middle of a batch.
+    """
+
+    def __init__(self, drop_after: int = None):
+        self.drop_after = drop_after
+        self.messages = []
+        self.connections = 0
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_server(self.serve, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.server.close()
+
+    async def serve(self, reader, writer):
+        self.connections += 1
+        accepted = 0
+        writer.write(b"220 stub ESMTP\r\n")
+        await writer.drain()
+        while line := await reader.readline():
+            command = line.decode().strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                reply = "250-stub\r\n250 AUTH PLAIN LOGIN"
+            elif verb == "AUTH":
+                reply = "235 authenticated"
+            elif verb == "MAIL" and self.drop_after is not None and accepted >= self.drop_after:
+                self.drop_after = None
+                break
+            elif verb == "RCPT" and "bounce" in command:
+                reply = "550 no such user"
+            elif verb == "DATA":
+                writer.write(b"354 go ahead\r\n")
+                await writer.drain()
+                body = []
+                while (data := await reader.readline()) not in (b".\r\n", b""):
+                    body.append(data)
+                self.messages.append(b"".join(body))
+                accepted += 1
+                reply = "250 queued"
+            elif verb == "QUIT":
+                writer.write(b"221 bye\r\n")
+                await writer.drain()
+                break
+            else:
+                reply = "250 ok"
+            writer.write(f"{reply}\r\n".encode())
+            await writer.drain()
+        writer.close()
+
+
+def mail_connection(stub: SMTPStub) -> MailConnection:
+    return MailConnection(conf.model_copy(update={
+        "MAIL_SERVER": "127.0.0.1", "MAIL_PORT": stub.port, "MAIL_STARTTLS": False, "MAIL_SSL_TLS": False,
+    }))
+
+
+async def queue(db, *recipients: str, due: datetime = None) -> list[int]:
+    emails = [
+        EmailOutbox(
+            recipients=[recipient],
+            subject="Reset Password",
+            template_name="password-reset.html",
+            context={"app_name": "mustaqeer", "name": "user", "activate_url": "http://localhost/reset"},
+            next_attempt_at=due or datetime.utcnow() - timedelta(seconds=1),
+        )
+        for recipient in recipients
+    ]
+    db.add_all(emails)
+    await db.commit()
+    return [email.id for email in emails]
+
+
+async def outbox(database) -> dict:
+    async with database.session() as db:
+        rows = await db.execute(select(EmailOutbox))
+        return {email.id: email for email in rows.scalars()}
+
+
+async def test_claims_take_due_emails_once_and_hide_them_for_the_lease(database, db):
+    due = await queue(db, "a@example.com", "b@example.com", "c@example.com")
+    await queue(db, "later@example.com", due=datetime.utcnow() + timedelta(minutes=5))
+
+    async def claim():
+        async with database.session() as session:
+            return [email.id for email in await claim_emails(session, limit=2)]
+
+    first, second = await asyncio.gather(claim(), claim())
+
+    assert sorted(first + second) == due
+    emails = await outbox(database)
+    for email_id in due:
+        assert emails[email_id].attempts == 1
+        assert emails[email_id].next_attempt_at > datetime.utcnow() + timedelta(seconds=CLAIM_LEASE_SECONDS - 60)
+    async with database.session() as session:
+        assert await claim_emails(session, limit=10) == []
+
+
+async def test_batch_is_sent_over_one_connection(database, db):
+    queued = await queue(db, "a@example.com", "b@example.com", "c@example.com")
+
+    async with SMTPStub() as stub:
+        connection = mail_connection(stub)
+        assert await send_outbox_batch(db, connection) == 3
+        await connection.close()
+
+    assert stub.connections == 1
+    assert len(stub.messages) == 3
+    emails = await outbox(database)
+    assert {emails[email_id].status for email_id in queued} == {EmailStatus.SENT.value}
+
+
+async def test_refused_email_is_retried_with_backoff_then_failed(database, db, monkeypatch):
+    monkeypatch.setattr(outbox_settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 2)
+    (bounced,) = await queue(db, "bounce@example.com")
+    (delivered,) = await queue(db, "a@example.com")
+
+    async with SMTPStub() as stub:
+        connection = mail_connection(stub)
+        started = datetime.utcnow()
+        await send_outbox_batch(db, connection)
+
+        email = (await outbox(database))[bounced]
+        assert (email.status, email.attempts) == (EmailStatus.PENDING.value, 1)
+        assert "550" in email.last_error
+        assert started + retry_delay(1) <= email.next_attempt_at <= datetime.utcnow() + retry_delay(1)
+        # the refusal does not hold up the rest of the batch
+        assert (await outbox(database))[delivered].status == EmailStatus.SENT.value
+
+        async with database.session() as session:
+            await session.execute(
+                update(EmailOutbox).where(EmailOutbox.id == bounced).values(next_attempt_at=started)
+            )
+            await session.commit()
+        await send_outbox_batch(db, connection)
+        await connection.close()
+
+    email = (await outbox(database))[bounced]
+    assert (email.status, email.attempts) == (EmailStatus.FAILED.value, 2)
+
+
+def test_retry_delay_doubles_up_to_the_maximum(monkeypatch):
+    monkeypatch.setattr(outbox_settings, "EMAIL_OUTBOX_RETRY_BASE_SECONDS", 30.0)
+    monkeypatch.setattr(outbox_settings, "EMAIL_OUTBOX_RETRY_MAX_SECONDS", 3600.0)
+
+    assert [retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 8, 20)] == [30, 60, 120, 3600, 3600]
+
+
+async def test_disconnect_in_the_middle_of_a_batch_reconnects_once(database, db):
+    queued = await queue(db, *(f"user{i}@example.com" for i in range(4)))
+
+    async with SMTPStub(drop_after=2) as stub:
+        connection = mail_connection(stub)
+        await send_outbox_batch(db, connection)
+        await connection.close()
+
+    assert stub.connections == 2
+    assert len(stub.messages) == 4
+    emails = await outbox(database)
+    assert {emails[email_id].status for email_id in queued} == {EmailStatus.SENT.value}
+    assert {emails[email_id].attempts for email_id in queued} == {1}
@@ -0,0 +1,73 @@
+import os
+
+from app.config.email import build_message
+from app.utils.email_templates import EmailTemplates, html_to_text_template
+
+CONTEXT = {"app_name": "mustaqeer", "name": "Amina & Omar", "activate_url": "http://localhost/reset?token=1"}
+
+
+def write_template(folder, name: str, source: str, mtime: int):
+    path = folder / name
+    path.write_text(source)
+    os.utime(path, (mtime, mtime))
+
+
+def count_loads(templates: EmailTemplates) -> list:
+    loads = []
+    get_source = templates.html.loader.get_source
+
+    def counted(environment, name):
+        loads.append(name)
+        return get_source(environment, name)
+    templates.html.loader.get_source = counted
+    return loads
+
+
+def test_templates_are_compiled_once(tmp_path):
+    write_template(tmp_path, "hello.html", "<p>Hello {{ name }}</p>", mtime=1_000_000)
+    templates = EmailTemplates(tmp_path)
+    assert templates.load_all() == ["hello.html"]
+    loads = count_loads(templates)
+
+    write_template(tmp_path, "hello.html", "<p>Bye {{ name }}</p>", mtime=2_000_000)
+    for _ in range(3):
+        assert templates.render("hello.html", CONTEXT) == ("<p>Hello Amina &amp; Omar</p>", "Hello Amina & Omar")
+
+    assert loads == []
+
+
+def test_reload_recompiles_an_edited_template(tmp_path):
+    write_template(tmp_path, "hello.html", "<p>Hello {{ name }}</p>", mtime=1_000_000)
+    templates = EmailTemplates(tmp_path, reload=True)
+    templates.load_all()
+
+    write_template(tmp_path, "hello.html", "<p>Bye {{ name }}</p>", mtime=2_000_000)
+
+    assert templates.render("hello.html", CONTEXT) == ("<p>Bye Amina &amp; Omar</p>", "Bye Amina & Omar")
+
+
+def test_plain_text_is_derived_from_the_html():
+    source = (
+        "<!DOCTYPE html><head><title>Reset</title><style>p { color: red; }</style></head>"
+        "<body><p>Dear {{ name }},</p><p>Click <a href=\"{{ url }}\" class=\"button\">Reset Password</a>"
+        " or open <a href=\"{{ url }}\">{{ url }}</a></p><p>Best Regards,<br>{{ app_name }} &mdash; team</p></body>"
+    )
+
+    assert html_to_text_template(source) == (
+        "Dear {{ name }},\n\n"
+        "Click Reset Password: {{ url }} or open {{ url }}\n\n"
+        "Best Regards,\n{{ app_name }} — team\n"
+    )
+
+
+def test_message_carries_the_plain_text_alternate_first():
+    message = build_message(["user@example.com"], "Reset Password", CONTEXT, "password-reset.html")
+
+    text, html = message.get_payload()
+    assert message.get_content_type() == "multipart/alternative"
+    assert (text.get_content_type(), html.get_content_type()) == ("text/plain", "text/html")
+    text = text.get_payload(decode=True).decode()
+    assert "<" not in text and "color" not in text
+    assert "Dear Amina & Omar," in text
+    assert f"Reset Password: {CONTEXT['activate_url']}" in text
+    assert "Amina &amp; Omar" in html.get_payload(decode=True).decode()
@@ -0,0 +1,231 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import func, select
+
+from app.models.episodes import Episode, Member
+from app.schemas.episodes import AddEpisodeRequest, BulkMembershipRequest, BulkTransferRequest, JoinEpisodeRequest
+from app.services.episodes import (
+    bulk_exit_episode_service,
+    bulk_join_episode_service,
+    bulk_transfer_episode_service,
+    create_episode,
+    exit_episode_service,
+    join_episode_service,
+)
+from app.utils.enum import Juz
+from app.utils.episode import MAX_EPISODE_MEMBERS
+
+pytestmark = pytest.mark.anyio
+
+
+async def new_episode(db, owner, *joiners, juz: Juz = Juz.ONE):
+    episode = await create_episode(AddEpisodeRequest(juz=juz, description="an episode to read together"), db, owner)
+    for user in joiners:
+        await join_episode_service(JoinEpisodeRequest(episode_id=episode.id), db, user)
+    return episode.id
+
+
+async def episode_state(database, episode_id):
+    """The stored member_count, or None once the episode is gone, and the actual members."""
+    async with database.session() as db:
+        member_count = await db.execute(select(Episode.member_count).where(Episode.id == episode_id))
+        members = await db.execute(select(func.count()).where(Member.episode_id == episode_id))
+        return member_count.scalar_one_or_none(), members.scalar()
+
+
+async def test_repeated_exit_does_not_free_another_seat(database, db, make_users):
+    owner, first, second = await make_users(3)
+    episode_id = await new_episode(db, owner, first, second)
+
+    async def leave():
+        async with database.session() as session:
+            try:
+                return await exit_episode_service(episode_id, session, first)
+            except HTTPException as refused:
+                return refused
+
+    results = await asyncio.gather(leave(), leave())
+
+    assert sorted(getattr(result, "status_code", 200) for result in results) == [200, 403]
+    assert await episode_state(database, episode_id) == (2, 2)
+
+
+async def test_last_exit_deletes_the_episode(database, db, make_users):
+    owner, member = await make_users(2)
+    episode_id = await new_episode(db, owner, member)
+
+    await exit_episode_service(episode_id, db, owner)
+    result = await exit_episode_service(episode_id, db, member)
+
+    assert result["message"] == "Episode and last member deleted successfully"
+    assert await episode_state(database, episode_id) == (None, 0)
+
+
+async def test_concurrent_exits_of_the_last_members_delete_the_episode(database, db, make_users):
+    owner, member = await make_users(2)
+    episode_id = await new_episode(db, owner, member)
+
+    async def leave(user):
+        async with database.session() as session:
+            return await exit_episode_service(episode_id, session, user)
+
+    await asyncio.gather(leave(owner), leave(member))
+
+    assert await episode_state(database, episode_id) == (None, 0)
+
+
+async def test_join_during_the_last_exit_keeps_counts_consistent(database, db, make_users):
+    owner, joiner = await make_users(2)
+    episode_id = await new_episode(db, owner)
+
+    async def leave():
+        async with database.session() as session:
+            return await exit_episode_service(episode_id, session, owner)
+
+    async def join():
+        async with database.session() as session:
+            try:
+                return await join_episode_service(JoinEpisodeRequest(episode_id=episode_id), session, joiner)
+            except HTTPException as refused:
+                return refused
+
+    await asyncio.gather(leave(), join())
+
+    member_count, members = await episode_state(database, episode_id)
+    # Either the join won and the episode lives on with the joiner, or the
+    # exit won and neither the episode nor a dangling membership is left
+    assert (member_count, members) in ((1, 1), (None, 0))
+
+
+async def test_concurrent_creates_by_one_user_make_one_episode(database, db, make_users):
+    (owner,) = await make_users(1)
+
+    async def create(juz):
+        async with database.session() as session:
+            try:
+                return await create_episode(AddEpisodeRequest(juz=juz, description="an episode to read together"), session, owner)
+            except HTTPException as refused:
+                return refused
+
+    results = await asyncio.gather(create(Juz.ONE), create(Juz.TWO))
+
+    assert sorted(getattr(result, "status_code", 200) for result in results) == [200, 400]
+    episodes = await db.execute(select(func.count()).select_from(Episode))
+    members = await db.execute(select(func.count()).where(Member.user_id == owner.id))
+    assert (episodes.scalar(), members.scalar()) == (1, 1)
+
+
+async def test_concurrent_joins_never_overfill_an_episode(database, db, make_users):
+    owner, *users = await make_users(MAX_EPISODE_MEMBERS + 1)
+    episode_id = await new_episode(db, owner, *users[:MAX_EPISODE_MEMBERS - 2])
+
+    async def join(user):
+        async with database.session() as session:
+            try:
+                return await join_episode_service(JoinEpisodeRequest(episode_id=episode_id), session, user)
+            except HTTPException as refused:
+                return refused
+
+    results = await asyncio.gather(*(join(user) for user in users[MAX_EPISODE_MEMBERS - 2:]))
+
+    assert sorted(getattr(result, "status_code", 200) for result in results) == [200, 404]
+    assert await episode_state(database, episode_id) == (MAX_EPISODE_MEMBERS, MAX_EPISODE_MEMBERS)
+    is_full = await db.execute(select(Episode.is_full).where(Episode.id == episode_id))
+    assert is_full.scalar() is True
+
+
+def statuses(result) -> list:
+    return [(entry["user_id"], entry["status"]) for entry in result["results"]]
+
+
+async def test_bulk_join_fills_the_free_seats_and_reports_every_user(database, db, make_users):
+    owner, member, *users = await make_users(MAX_EPISODE_MEMBERS + 2)
+    episode_id = await new_episode(db, owner)
+    await bulk_join_episode_service(BulkMembershipRequest(episode_id=episode_id, user_ids=[u.id for u in users[2:]]), db)
+    other_episode = await new_episode(db, member, juz=Juz.TWO)
+    assert await episode_state(database, episode_id) == (MAX_EPISODE_MEMBERS - 1, MAX_EPISODE_MEMBERS - 1)
+
+    first, second = users[:2]
+    result = await bulk_join_episode_service(
+        BulkMembershipRequest(episode_id=episode_id, user_ids=[first.id, member.id, 9999, second.id, first.id]), db,
+    )
+
+    assert statuses(result) == [
+        (first.id, "joined"), (member.id, "already_member"), (9999, "user_not_found"), (second.id, "episode_full"),
+    ]
+    assert result["member_count"] == MAX_EPISODE_MEMBERS
+    assert await episode_state(database, episode_id) == (MAX_EPISODE_MEMBERS, MAX_EPISODE_MEMBERS)
+    assert await episode_state(database, other_episode) == (1, 1)
+    is_full = await db.execute(select(Episode.is_full).where(Episode.id == episode_id))
+    assert is_full.scalar() is True
+
+
+async def test_bulk_exit_of_the_last_members_deletes_the_episode(database, db, make_users):
+    owner, member, outsider = await make_users(3)
+    episode_id = await new_episode(db, owner, member)
+
+    result = await bulk_exit_episode_service(
+        BulkMembershipRequest(episode_id=episode_id, user_ids=[member.id, outsider.id, owner.id]), db,
+    )
+
+    assert statuses(result) == [(member.id, "exited"), (outsider.id, "not_member"), (owner.id, "exited")]
+    assert result["member_count"] == 0
+    assert await episode_state(database, episode_id) == (None, 0)
+
+
+async def test_bulk_transfer_moves_members_until_the_target_is_full(database, db, make_users):
+    source_owner, target_owner, outsider, *users = await make_users(MAX_EPISODE_MEMBERS + 3)
+    source_id = await new_episode(db, source_owner, *users[:3])
+    target_id = await new_episode(db, target_owner, juz=Juz.TWO)
+    await bulk_join_episode_service(BulkMembershipRequest(episode_id=target_id, user_ids=[u.id for u in users[3:]]), db)
+    assert await episode_state(database, target_id) == (MAX_EPISODE_MEMBERS - 2, MAX_EPISODE_MEMBERS - 2)
+
+    moving = [users[0].id, outsider.id, users[1].id, users[2].id]
+    result = await bulk_transfer_episode_service(
+        BulkTransferRequest(from_episode_id=source_id, to_episode_id=target_id, user_ids=moving), db,
+    )
+
+    assert statuses(result) == [
+        (users[0].id, "transferred"), (outsider.id, "not_member"), (users[1].id, "transferred"), (users[2].id, "episode_full"),
+    ]
+    assert await episode_state(database, target_id) == (MAX_EPISODE_MEMBERS, MAX_EPISODE_MEMBERS)
+    assert await episode_state(database, source_id) == (2, 2)
+    moved = await db.execute(select(Member.episode_id).where(Member.user_id.in_([users[0].id, users[1].id])))
+    assert set(moved.scalars()) == {target_id}
+
+
+async def test_bulk_transfer_of_every_member_deletes_the_source(database, db, make_users):
+    source_owner, target_owner = await make_users(2)
+    source_id = await new_episode(db, source_owner)
+    target_id = await new_episode(db, target_owner, juz=Juz.TWO)
+
+    await bulk_transfer_episode_service(
+        BulkTransferRequest(from_episode_id=source_id, to_episode_id=target_id, user_ids=[source_owner.id]), db,
+    )
+
+    assert await episode_state(database, source_id) == (None, 0)
+    assert await episode_state(database, target_id) == (2, 2)
+
+
+async def test_bulk_transfer_to_the_same_episode_is_refused(database, db, make_users):
+    owner, member = await make_users(2)
+    episode_id = await new_episode(db, owner, member)
+
+    with pytest.raises(HTTPException) as refused:
+        await bulk_transfer_episode_service(
+            BulkTransferRequest(from_episode_id=episode_id, to_episode_id=episode_id, user_ids=[member.id]), db,
+        )
+
+    assert refused.value.status_code == 400
+    assert await episode_state(database, episode_id) == (2, 2)
+
+
+async def test_bulk_operations_on_a_missing_episode_are_not_found(db, make_users):
+    (user,) = await make_users(1)
+
+    for operation in (bulk_join_episode_service, bulk_exit_episode_service):
+        with pytest.raises(HTTPException) as refused:
+            await operation(BulkMembershipRequest(episode_id=9999, user_ids=[user.id]), db)
+        assert refused.value.status_code == 404
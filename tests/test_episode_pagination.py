@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import insert
+
+from app.models.episodes import Episode
+from app.schemas.episodes import EpisodeFilters
+from app.services.episodes import get_all_episodes_service
+
+pytestmark = pytest.mark.anyio
+
+
+async def walk_pages(db, filters, limit):
+    pages, cursor = [], None
+    while True:
+        page = await get_all_episodes_service(db, filters, cursor, limit)
+        pages.append([episode.id for episode in page["items"]])
+        cursor = page["next_cursor"]
+        if cursor is None or len(pages) > 20:
+            return pages
+
+
+async def test_pages_walk_episodes_created_in_the_same_second(db, make_users):
+    (user,) = await make_users(1)
+    # one statement, so every row gets the same func.now() second
+    await db.execute(insert(Episode), [
+        {"juz": i % 30 + 1, "description": f"episode {i}", "user_id": user.id} for i in range(10)
+    ])
+    await db.commit()
+
+    pages = await walk_pages(db, EpisodeFilters(), limit=3)
+
+    assert [len(page) for page in pages] == [3, 3, 3, 1]
+    ids = [episode_id for page in pages for episode_id in page]
+    assert ids == sorted(ids, reverse=True)
+    assert len(set(ids)) == 10
+
+
+async def test_pages_apply_filters(db, make_users):
+    (user,) = await make_users(1)
+    await db.execute(insert(Episode), [
+        {"juz": 1 if i % 2 else 2, "description": f"episode {i}", "user_id": user.id} for i in range(7)
+    ])
+    await db.commit()
+
+    pages = await walk_pages(db, EpisodeFilters(juz=1), limit=2)
+
+    assert [len(page) for page in pages] == [2, 1]
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import update
+
+from app.models.episodes import Episode
+from app.routes.episodes import get_all_episodes, get_episode_by_id, get_episode_by_juz
+from app.schemas.episodes import AddEpisodeRequest, EpisodeFilters
+from app.services.episodes import create_episode, get_all_episodes_service, get_episode_by_id_service
+from app.utils.enum import Juz
+
+pytestmark = pytest.mark.anyio
+
+EPISODE_FIELDS = {
+    "id", "juz", "description", "no_of_khatmis", "progress", "created_at", "is_full", "member_count", "user_id",
+}
+
+
+async def new_episode(db, owner, juz: Juz) -> int:
+    episode = await create_episode(AddEpisodeRequest(juz=juz, description="an episode to read together"), db, owner)
+    return episode.id
+
+
+def body(response):
+    return json.loads(response.body)
+
+
+async def test_episode_is_read_as_its_response_fields(database, make_users, db):
+    (owner,) = await make_users(1)
+    episode_id = await new_episode(db, owner, Juz.THREE)
+    await db.execute(update(Episode).values(progress=4))
+    await db.commit()
+
+    async with database.session() as session:
+        row = await get_episode_by_id_service(episode_id, session)
+        # a column row, no Episode entity is loaded into the session
+        assert not isinstance(row, Episode) and len(session.identity_map) == 0
+        response = await get_episode_by_id(episode_id, session, bypass=True, if_none_match=None)
+
+    episode = body(response)
+    assert set(episode) == EPISODE_FIELDS
+    assert (episode["id"], episode["juz"], episode["progress"], episode["member_count"]) == (episode_id, 3, 4, 1)
+    assert response.headers["ETag"]
+
+
+async def test_missing_episode_is_null(database):
+    async with database.session() as session:
+        response = await get_episode_by_id(9999, session, bypass=True, if_none_match=None)
+
+    assert body(response) is None
+    assert "ETag" not in response.headers
+
+
+async def test_episodes_of_a_juz_are_listed(database, make_users, db):
+    first_owner, other_owner, second_owner = await make_users(3)
+    first = await new_episode(db, first_owner, Juz.TWO)
+    await new_episode(db, other_owner, Juz.FOUR)
+    # a second episode of the same juz is only opened once the first is full
+    await db.execute(update(Episode).where(Episode.id == first).values(is_full=True, member_count=50))
+    await db.commit()
+    second = await new_episode(db, second_owner, Juz.TWO)
+
+    async with database.session() as session:
+        response = await get_episode_by_juz(2, session)
+
+    episodes = body(response)
+    assert response.media_type == "application/json"
+    assert sorted(episode["id"] for episode in episodes) == [first, second]
+    assert all(set(episode) == EPISODE_FIELDS and episode["juz"] == 2 for episode in episodes)
+    with pytest.raises(HTTPException) as missing:
+        await get_episode_by_juz(30, session)
+    assert missing.value.status_code == 404
+
+
+async def test_episode_page_is_encoded_from_rows(database, make_users, db):
+    owners = await make_users(3)
+    episode_ids = [await new_episode(db, owner, juz) for owner, juz in zip(owners, (Juz.ONE, Juz.TWO, Juz.THREE))]
+
+    async with database.session() as session:
+        response = await get_all_episodes(session, EpisodeFilters(), bypass=True, cursor=None, limit=2, if_none_match=None)
+        rows = await get_all_episodes_service(session, EpisodeFilters(), limit=2)
+
+    page = body(response)
+    assert [episode["id"] for episode in page["items"]] == episode_ids[:0:-1]
+    assert all(set(episode) == EPISODE_FIELDS for episode in page["items"])
+    assert page["next_cursor"] == rows["next_cursor"] is not None
+    assert not isinstance(rows["items"][0], Episode)
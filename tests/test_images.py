@@ -0,0 +1,128 @@
+import io
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+from PIL import Image
+from sqlalchemy import select
+
+from app.config.storage import StorageNotFound, storage
+from app.models.images import StoredImage
+from app.models.users import User
+from app.services import images
+from app.services.images import generate_profile_derivatives, purge_released_images, release_image
+from app.utils.executor import BoundedExecutor
+from app.utils.images import PROFILE_IMAGE_SIZES
+
+pytestmark = pytest.mark.anyio
+
+
+async def stored_image(db, name: str, refcount: int, released_at: datetime = None) -> StoredImage:
+    key = f"{name}.png"
+    variants = {"small_webp": storage.url(f"{name}_small.webp")}
+    for object_key in (key, f"{name}_small.webp"):
+        await storage.put_object(object_key, b"image", "image/png")
+    image = StoredImage(
+        key=key, content_type="image/png", size=5, refcount=refcount, variants=variants, released_at=released_at,
+    )
+    db.add(image)
+    await db.commit()
+    return image
+
+
+async def exists(key: str) -> bool:
+    try:
+        await storage.get_object(key)
+    except StorageNotFound:
+        return False
+    return True
+
+
+async def remaining(database) -> set:
+    async with database.session() as db:
+        keys = await db.execute(select(StoredImage.key))
+        return set(keys.scalars())
+
+
+async def test_purge_removes_released_images_and_keeps_referenced_ones(database, db):
+    long_ago = datetime.utcnow() - timedelta(days=2)
+    released = await stored_image(db, "released", refcount=0, released_at=long_ago)
+    referenced = await stored_image(db, "referenced", refcount=1, released_at=long_ago)
+    recent = await stored_image(db, "recent", refcount=0, released_at=datetime.utcnow())
+
+    assert await purge_released_images(db, grace=timedelta(hours=1)) == 1
+
+    assert await remaining(database) == {referenced.key, recent.key}
+    assert not await exists(released.key)
+    assert not await exists("released_small.webp")
+    assert await exists(referenced.key) and await exists("referenced_small.webp")
+    assert await exists(recent.key)
+
+
+async def test_released_image_waits_for_the_grace_period(database, db):
+    image = await stored_image(db, "shared", refcount=2)
+
+    assert await release_image(image.key, db)
+    await db.commit()
+    assert await purge_released_images(db, grace=timedelta(0)) == 0
+
+    assert await release_image(image.key, db)
+    await db.commit()
+    assert await purge_released_images(db, grace=timedelta(hours=1)) == 0
+    assert await purge_released_images(db, grace=timedelta(0)) == 1
+    assert await remaining(database) == set()
+
+
+@pytest.fixture
+def processor(database, monkeypatch):
+    """Derivatives are made in a thread, on the test database."""
+    executor = BoundedExecutor("images", 1)
+    monkeypatch.setattr(images, "image_processor", executor)
+    monkeypatch.setattr(images, "sessionmanager", database)
+    yield executor
+    executor.shutdown()
+
+
+async def profile_upload(db, make_users, name: str, content: bytes) -> tuple[User, str]:
+    (user,) = await make_users(1)
+    key = f"{name}.png"
+    await storage.put_object(key, content, "image/png")
+    db.add(StoredImage(key=key, content_type="image/png", size=len(content), refcount=1))
+    user.profile_image = storage.url(key)
+    await db.commit()
+    return user, key
+
+
+async def stored_variants(database, user_id: int, key: str) -> tuple:
+    async with database.session() as db:
+        image = await db.scalar(select(StoredImage.variants).where(StoredImage.key == key))
+        profile = await db.scalar(select(User.profile_image_variants).where(User.id == user_id))
+        return image, profile
+
+
+async def test_derivatives_are_made_in_every_size_and_format(database, db, make_users, processor):
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 120), "teal").save(buffer, format="PNG")
+    user, key = await profile_upload(db, make_users, "teal", buffer.getvalue())
+
+    await generate_profile_derivatives(user.id, key)
+
+    image_variants, profile_variants = await stored_variants(database, user.id, key)
+    assert image_variants == profile_variants
+    assert set(profile_variants) == {f"{name}_{extension}" for name in PROFILE_IMAGE_SIZES for extension in ("webp", "jpg")}
+    for variant, url in profile_variants.items():
+        name, extension = variant.split("_")
+        with Image.open(io.BytesIO(await storage.get_object(storage.key_from_url(url)))) as derivative:
+            edge = PROFILE_IMAGE_SIZES[name]
+            assert (derivative.size, derivative.format) == ((edge, edge), {"webp": "WEBP", "jpg": "JPEG"}[extension])
+
+
+async def test_content_that_is_not_an_image_gets_no_derivatives(database, db, make_users, processor, caplog):
+    user, key = await profile_upload(db, make_users, "corrupt", b"\x89PNG\r\n\x1a\n but not really")
+
+    with caplog.at_level(logging.ERROR):
+        await generate_profile_derivatives(user.id, key)
+
+    assert await stored_variants(database, user.id, key) == (None, None)
+    assert not await exists("corrupt_small.webp")
+    assert "Could not make the thumbnails of corrupt.png" in caplog.text
@@ -0,0 +1,148 @@
+import fnmatch
+import logging
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.models.users import User
+from app.schemas.episodes import AddEpisodeRequest, JoinEpisodeRequest
+from app.services import leaderboard
+from app.services.episodes import create_episode, join_episode_service
+from app.services.leaderboard import (
+    GLOBAL_BOARD,
+    REBUILD_PREFIX,
+    award_points,
+    episode_board,
+    get_top_service,
+    juz_board,
+    rebuild_leaderboards,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class Boards:
+    """
+    Stands in for the sorted sets a rebuild touches, the tests run without Redis.
+
+    Every pipeline that runs is kept in `executed`, with the commands it queued.
+    """
+
+    def __init__(self, boards: dict = None):
+        self.boards = {key: dict(members) for key, members in (boards or {}).items()}
+        self.executed = []
+
+    def pipeline(self, transaction=True):
+        return Pipeline(self, transaction)
+
+    async def scan_iter(self, match, count=None):
+        for key in list(self.boards):
+            if fnmatch.fnmatchcase(key, match):
+                yield key.encode()
+
+
+class Pipeline:
+    def __init__(self, redis: Boards, transaction: bool):
+        self.redis, self.transaction, self.commands = redis, transaction, []
+
+    def keys(self) -> set:
+        """Every key the queued commands touch."""
+        touched = set()
+        for command, *args in self.commands:
+            touched.update(args[0] if command == "delete" else args[:1] if command == "zadd" else args)
+        return touched
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def delete(self, *keys):
+        self.commands.append(("delete", keys))
+
+    def zadd(self, key, mapping):
+        self.commands.append(("zadd", key, mapping))
+
+    def rename(self, source, destination):
+        self.commands.append(("rename", source, destination))
+
+    async def execute(self):
+        boards = self.redis.boards
+        for command, *args in self.commands:
+            if command == "delete":
+                for key in args[0]:
+                    boards.pop(key, None)
+            elif command == "zadd":
+                boards.setdefault(args[0], {}).update(args[1])
+            else:
+                boards[args[1]] = boards.pop(args[0])
+        self.redis.executed.append(self)
+
+
+async def test_rebuild_stages_boards_then_renames_them_over_the_live_ones(db, make_users, monkeypatch):
+    owner, member, loner = await make_users(3, points=4)
+    episode = await create_episode(AddEpisodeRequest(description="an episode to read together"), db, owner)
+    await join_episode_service(JoinEpisodeRequest(episode_id=episode.id), db, member)
+    live = {
+        GLOBAL_BOARD: {"999": 50},
+        episode_board(episode.id + 1): {"999": 50},
+        REBUILD_PREFIX + GLOBAL_BOARD: {"999": 50},
+    }
+    redis = Boards(live)
+    monkeypatch.setattr(leaderboard, "redis_client", redis)
+
+    assert await rebuild_leaderboards(db) == 3
+
+    *staging, swap = redis.executed
+    # the live boards are only touched by the final, atomic pipeline
+    for pipeline in staging:
+        assert all(key.startswith(REBUILD_PREFIX) for key in pipeline.keys())
+    assert swap.transaction
+    assert {command[2] for command in swap.commands if command[0] == "rename"} == {
+        GLOBAL_BOARD, episode_board(episode.id), juz_board(episode.juz),
+    }
+    # a leftover staging board from an earlier run does not leak into the new one
+    assert redis.boards == {
+        GLOBAL_BOARD: {owner.id: 4, member.id: 4, loner.id: 4},
+        episode_board(episode.id): {owner.id: 4, member.id: 4},
+        juz_board(episode.juz): {owner.id: 4, member.id: 4},
+    }
+
+
+async def test_rebuild_without_users_clears_the_global_board(db, monkeypatch):
+    redis = Boards({GLOBAL_BOARD: {"999": 50}, juz_board(3): {"999": 50}})
+    monkeypatch.setattr(leaderboard, "redis_client", redis)
+
+    assert await rebuild_leaderboards(db) == 0
+
+    assert redis.boards == {}
+
+
+async def test_points_are_stored_when_redis_is_down(database, db, make_users, caplog):
+    (user,) = await make_users(1, points=4)
+
+    with caplog.at_level(logging.WARNING):
+        assert await award_points(user.id, 3, db) == 7
+
+    async with database.session() as session:
+        assert await session.scalar(select(User.points).where(User.id == user.id)) == 7
+    assert "rebuild to repair" in caplog.text
+
+
+async def test_joining_does_not_need_redis(db, make_users, caplog):
+    owner, member = await make_users(2)
+    episode = await create_episode(AddEpisodeRequest(description="an episode to read together"), db, owner)
+
+    with caplog.at_level(logging.WARNING):
+        await join_episode_service(JoinEpisodeRequest(episode_id=episode.id), db, member)
+
+    assert "rebuild to repair" in caplog.text
+
+
+async def test_board_reads_fail_with_503_when_redis_is_down(db):
+    with pytest.raises(HTTPException) as refused:
+        await get_top_service(GLOBAL_BOARD, 0, 10, db)
+
+    assert refused.value.status_code == 503
@@ -0,0 +1,84 @@
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import date
+from pathlib import Path
+
+import pytest
+from sqlalchemy import select, update
+
+from app.config.database import DatabaseSessionManager
+from app.models.leaderboard import LeaderboardSnapshot
+from app.models.users import User
+from app.services import leaderboard
+from app.utils.enum import LeaderboardPeriod
+
+pytestmark = pytest.mark.anyio
+
+ROOT = Path(__file__).resolve().parent.parent
+TODAY = date(2026, 10, 14)
+
+
+class Lock:
+    """Stands in for the Redis lock, the tests run without Redis."""
+
+    async def acquire(self, blocking=True):
+        return True
+
+    async def release(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def snapshot_lock(monkeypatch):
+    monkeypatch.setattr(leaderboard.redis_client, "lock", lambda *args, **kwargs: Lock())
+
+
+async def daily_points(db):
+    rows = await db.execute(
+        select(LeaderboardSnapshot.user_id, LeaderboardSnapshot.points)
+        .where(LeaderboardSnapshot.period == LeaderboardPeriod.DAILY.value)
+    )
+    return dict(rows.all())
+
+
+async def test_snapshots_count_points_earned_between_runs(db, make_users):
+    first, second = await make_users(2)
+    await leaderboard.snapshot_leaderboards(db, TODAY)
+
+    await db.execute(update(User).where(User.id == first.id).values(points=User.points + 5))
+    await db.commit()
+    await leaderboard.snapshot_leaderboards(db, TODAY)
+    # nothing new, nothing counted twice
+    await leaderboard.snapshot_leaderboards(db, TODAY)
+
+    assert await daily_points(db) == {first.id: 5}
+
+
+def alembic(database_uri, *args):
+    subprocess.run(
+        [sys.executable, "-m", "alembic", *args],
+        cwd=ROOT, env={**os.environ, "DATABASE_URI": database_uri}, check=True, capture_output=True,
+    )
+
+
+async def test_first_snapshot_after_the_migration_skips_past_points(tmp_path):
+    path = tmp_path / "migrated.db"
+    uri = f"sqlite+aiosqlite:///{path}"
+    alembic(uri, "upgrade", "f19c2e7b5a80")
+    with sqlite3.connect(path) as connection:
+        connection.execute(
+            "INSERT INTO users (first_name, last_name, email, password, points, no_of_khatmis, is_active,"
+            " is_firstlogin, is_superuser, created_at, updated_at)"
+            " VALUES ('old', 'user', 'old@example.com', 'unused', 120, 3, 1, 0, 0, '2026-01-01', '2026-01-01')"
+        )
+    alembic(uri, "upgrade", "a6c0d2f48e17")
+
+    manager = DatabaseSessionManager(uri)
+    try:
+        async with manager.session() as db:
+            assert await leaderboard.snapshot_leaderboards(db, TODAY) == 0
+            assert await daily_points(db) == {}
+    finally:
+        await manager.close()
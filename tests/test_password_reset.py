@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.config.security import generate_context_token, verify_password
+from app.models.users import User, UserToken
+from app.schemas.users import ResetRequest
+from app.services import user as user_service
+from app.services.user import reset_user_password
+from app.utils.email_context import FORGOT_PASSWORD
+
+pytestmark = pytest.mark.anyio
+
+NEW_PASSWORD = "N3w-passw0rd!"
+
+
+async def reset_request(db, make_users):
+    (user,) = await make_users(1)
+    user.verified_at = datetime.utcnow()
+    await db.commit()
+    await db.refresh(user)
+    token = generate_context_token(user, FORGOT_PASSWORD, timedelta(minutes=10))
+    return user, ResetRequest(token=token, email=user.email, password=NEW_PASSWORD)
+
+
+async def stored_password(database, user_id: int) -> str:
+    async with database.session() as db:
+        password = await db.execute(select(User.password).where(User.id == user_id))
+        return password.scalar()
+
+
+async def test_reset_stores_the_new_password(database, db, make_users):
+    user, data = await reset_request(db, make_users)
+
+    await reset_user_password(data, db)
+
+    assert verify_password(NEW_PASSWORD, await stored_password(database, user.id))
+
+
+async def test_stateless_reset_revokes_sessions_once_the_password_is_stored(database, db, make_users, monkeypatch):
+    user, data = await reset_request(db, make_users)
+    await db.execute(insert(UserToken), [{
+        "user_id": user.id, "access_token": "a", "refresh_token": "r",
+        "expires_at": datetime.utcnow() + timedelta(minutes=60),
+    }])
+    await db.commit()
+    monkeypatch.setattr(user_service.settings, "AUTH_STATELESS", True)
+    revoked = []
+
+    async def revoke_token(user_token_id):
+        revoked.append(verify_password(NEW_PASSWORD, await stored_password(database, user.id)))
+
+    monkeypatch.setattr(user_service, "revoke_token", revoke_token)
+
+    await reset_user_password(data, db)
+
+    assert revoked == [True]
+
+
+async def test_cached_lookups_are_dropped_after_the_commit(database, db, make_users, monkeypatch):
+    user, data = await reset_request(db, make_users)
+    invalidated = []
+
+    async def invalidate_user_cache(user_id):
+        # a lookup refilling the cache now must read the new row
+        invalidated.append(verify_password(NEW_PASSWORD, await stored_password(database, user_id)))
+
+    monkeypatch.setattr(user_service, "invalidate_user_cache", invalidate_user_cache)
+
+    await reset_user_password(data, db)
+
+    assert invalidated == [True]
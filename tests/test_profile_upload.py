@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import io
+import json
+import os
+from types import SimpleNamespace
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+from PIL import Image
+from sqlalchemy import select
+
+from app.config.storage import S3Storage, storage
+from app.models.images import StoredImage
+from app.models.users import User
+from app.schemas.users import ConfirmProfileUploadRequest, ProfileUploadRequest
+from app.services.user import confirm_profile_upload, create_profile_upload, upload_profile
+from app.utils.profile import SNIFF_SIZE
+
+pytestmark = pytest.mark.anyio
+
+
+def png(size: int) -> bytes:
+    buffer = io.BytesIO()
+    # noise does not compress, so the file ends up about as big as asked
+    Image.frombytes("L", (size, 1), os.urandom(size)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def stream(content: bytes, chunk_size: int = SNIFF_SIZE):
+    for start in range(0, len(content), chunk_size):
+        yield content[start:start + chunk_size]
+
+
+def stored_files() -> list[str]:
+    files = []
+    for directory, _, names in os.walk(storage.root):
+        files += [os.path.relpath(os.path.join(directory, name), storage.root) for name in names]
+    return files
+
+
+async def test_upload_is_stored_under_the_hash_of_its_content(db, make_users):
+    (user,) = await make_users(1)
+    content = png(20_000)
+    key = f"{hashlib.sha256(content).hexdigest()}.png"
+
+    staged = []
+
+    async def watched(chunks):
+        async for chunk in chunks:
+            staged.append(sum(
+                os.path.getsize(storage.path(name)) for name in stored_files() if name.endswith(".part")
+            ))
+            yield chunk
+
+    result = await upload_profile(watched(stream(content)), db, user, BackgroundTasks())
+
+    assert result["image_url"] == storage.url(key)
+    with open(storage.path(key), "rb") as file:
+        assert file.read() == content
+    stored = await db.execute(select(StoredImage.size, StoredImage.refcount).where(StoredImage.key == key))
+    assert stored.one() == (len(content), 1)
+    profile_image = await db.execute(select(User.profile_image).where(User.id == user.id))
+    assert profile_image.scalar() == storage.url(key)
+    # the upload reached storage while it was still streaming in
+    assert staged[-1] >= len(content) - 2 * SNIFF_SIZE
+    # the staged upload is gone once copied
+    assert not any(name.startswith(f"uploads/{user.id}/") for name in stored_files())
+
+
+async def test_upload_rejected_midway_leaves_nothing_stored(db, make_users, monkeypatch):
+    (user,) = await make_users(1)
+    monkeypatch.setattr("app.services.user.settings.PROFILE_IMAGE_MAX_SIZE", 10_000)
+    before = stored_files()
+
+    with pytest.raises(HTTPException) as rejected:
+        await upload_profile(stream(png(20_000)), db, user, BackgroundTasks())
+
+    assert rejected.value.detail == "Profile image is too large"
+    assert stored_files() == before
+
+
+async def test_failed_upload_removes_the_staged_object(db):
+    missing_user = SimpleNamespace(id=999)
+
+    with pytest.raises(HTTPException) as refused:
+        await upload_profile(stream(png(5_000)), db, missing_user, BackgroundTasks())
+
+    assert refused.value.status_code == 404
+    assert not any(name.startswith("uploads/999/") for name in stored_files())
+
+
+async def test_content_already_stored_is_not_copied_again(db, make_users, monkeypatch):
+    first, second = await make_users(2)
+    content = png(5_000)
+    key = f"{hashlib.sha256(content).hexdigest()}.png"
+    await upload_profile(stream(content), db, first, BackgroundTasks())
+    copies = []
+    copy_object = storage.copy_object
+
+    async def counted_copy(source_key, key, *args, **kwargs):
+        copies.append(key)
+        return await copy_object(source_key, key, *args, **kwargs)
+
+    monkeypatch.setattr(storage, "copy_object", counted_copy)
+
+    await upload_profile(stream(content), db, second, BackgroundTasks())
+
+    assert copies == []
+    refcount = await db.execute(select(StoredImage.refcount).where(StoredImage.key == key))
+    assert refcount.scalar() == 2
+
+
+async def presigned_upload(user, content: bytes) -> str:
+    upload = await create_profile_upload(ProfileUploadRequest(content_type="image/png"), user)
+    await storage.put_object(upload["key"], content, "image/png")
+    return upload["key"]
+
+
+async def test_presigned_upload_is_limited_to_the_users_prefix_type_and_size(make_users, monkeypatch):
+    (user,) = await make_users(1)
+    monkeypatch.setattr("app.services.user.settings.PROFILE_IMAGE_MAX_SIZE", 10_000)
+
+    upload = await create_profile_upload(ProfileUploadRequest(content_type="image/png"), user)
+
+    assert upload["key"].startswith(f"uploads/{user.id}/")
+    conditions = storage.verify_policy(upload["fields"]["policy"], upload["fields"]["signature"])
+    assert (conditions["key"], conditions["content_type"], conditions["max_size"]) == (upload["key"], "image/png", 10_000)
+
+
+def test_s3_presigned_post_enforces_the_type_and_size():
+    s3 = S3Storage("test", client_kwargs={
+        "aws_access_key_id": "test", "aws_secret_access_key": "test", "region_name": "us-east-1",
+    })
+
+    upload = s3.presigned_post("uploads/1/image", "image/png", 10_000, 60)
+
+    policy = json.loads(base64.b64decode(upload["fields"]["policy"]))
+    assert {"Content-Type": "image/png"} in policy["conditions"]
+    assert ["content-length-range", 1, 10_000] in policy["conditions"]
+    s3.shutdown()
+
+
+async def test_confirmed_upload_becomes_the_profile_image(db, make_users):
+    (user,) = await make_users(1)
+    content = png(5_000)
+    key = await presigned_upload(user, content)
+
+    await confirm_profile_upload(ConfirmProfileUploadRequest(key=key), db, user, BackgroundTasks())
+
+    profile_image = await db.execute(select(User.profile_image).where(User.id == user.id))
+    assert profile_image.scalar() == storage.url(f"{hashlib.sha256(content).hexdigest()}.png")
+    assert key not in stored_files()
+
+
+async def test_confirming_a_missing_upload_is_not_found(db, make_users):
+    (user,) = await make_users(1)
+
+    with pytest.raises(HTTPException) as refused:
+        await confirm_profile_upload(ConfirmProfileUploadRequest(key=f"uploads/{user.id}/never-posted"), db, user, BackgroundTasks())
+
+    assert refused.value.status_code == 404
+
+
+async def test_confirming_an_oversized_upload_deletes_it(db, make_users, monkeypatch):
+    (user,) = await make_users(1)
+    key = await presigned_upload(user, png(20_000))
+    monkeypatch.setattr("app.services.user.settings.PROFILE_IMAGE_MAX_SIZE", 10_000)
+
+    with pytest.raises(HTTPException) as refused:
+        await confirm_profile_upload(ConfirmProfileUploadRequest(key=key), db, user, BackgroundTasks())
+
+    assert refused.value.detail == "Profile image is too large"
+    assert key not in stored_files()
+
+
+async def test_confirming_another_users_upload_is_refused(db, make_users):
+    user, other = await make_users(2)
+    staged = await presigned_upload(other, png(5_000))
+
+    for key in (staged, f"uploads/{user.id}/../{staged.removeprefix('uploads/')}"):
+        with pytest.raises(HTTPException) as refused:
+            await confirm_profile_upload(ConfirmProfileUploadRequest(key=key), db, user, BackgroundTasks())
+        assert (refused.value.status_code, refused.value.detail) == (400, "Invalid upload key")
+
+    assert staged in stored_files()
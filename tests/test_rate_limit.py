@@ -0,0 +1,53 @@
+import ipaddress
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.config import rate_limit
+from app.config.rate_limit import RateLimit, client_identifier
+
+pytestmark = pytest.mark.anyio
+
+
+def request(client: str, forwarded: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({
+        "type": "http", "method": "POST", "path": "/auth/login", "headers": headers, "client": (client, 50000),
+    })
+
+
+@pytest.fixture
+def trusted_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "trusted_proxies", [ipaddress.ip_network("10.0.0.0/8")])
+
+
+async def test_spoofed_forwarded_for_does_not_reset_the_limit():
+    limit = RateLimit(times=2, seconds=60)
+    await limit(request("203.0.113.7", "198.51.100.1"))
+    await limit(request("203.0.113.7", "198.51.100.2"))
+
+    with pytest.raises(HTTPException) as refused:
+        await limit(request("203.0.113.7", "198.51.100.3"))
+    assert refused.value.status_code == 429
+
+
+def test_forwarded_for_is_ignored_from_untrusted_peers(trusted_proxy):
+    assert client_identifier(request("203.0.113.7", "198.51.100.1")) == "203.0.113.7"
+
+
+def test_client_is_the_right_most_hop_that_is_not_a_trusted_proxy(trusted_proxy):
+    # the client made up the first entry, the proxies appended the rest
+    forwarded = "198.51.100.1, 203.0.113.7, 10.0.0.2"
+
+    assert client_identifier(request("10.0.0.1", forwarded)) == "203.0.113.7"
+
+
+async def test_spoofed_forwarded_for_behind_a_proxy_does_not_reset_the_limit(trusted_proxy):
+    limit = RateLimit(times=2, seconds=60)
+    await limit(request("10.0.0.1", "198.51.100.1, 203.0.113.7"))
+    await limit(request("10.0.0.1", "198.51.100.2, 203.0.113.7"))
+
+    with pytest.raises(HTTPException) as refused:
+        await limit(request("10.0.0.1", "198.51.100.3, 203.0.113.7"))
+    assert refused.value.status_code == 429
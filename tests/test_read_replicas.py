@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import text
+
+from app.config import dependencies
+from app.config.database import DatabaseSessionManager
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def replicated(tmp_path, monkeypatch):
+    manager = DatabaseSessionManager(f"sqlite+aiosqlite:///{tmp_path}/primary.db")
+    manager.init(f"sqlite+aiosqlite:///{tmp_path}/primary.db", replica_hosts=[f"sqlite+aiosqlite:///{tmp_path}/replica.db"])
+    monkeypatch.setattr(dependencies, "sessionmanager", manager)
+    yield manager
+    await manager.close()
+
+
+async def served_by(session) -> str:
+    databases = await session.execute(text("PRAGMA database_list"))
+    return databases.first().file.rsplit("/", 1)[-1]
+
+
+async def read_from(manager) -> str:
+    async with manager.read_session() as session:
+        return await served_by(session)
+
+
+def write_position(monkeypatch, manager, position):
+    async def current():
+        return position
+    monkeypatch.setattr(manager, "write_position", current)
+
+
+async def test_reads_use_the_primary_until_replicas_were_checked(replicated, monkeypatch):
+    write_position(monkeypatch, replicated, 10.0)
+
+    assert await read_from(replicated) == "primary.db"
+    await replicated.check_replicas()
+    assert await read_from(replicated) == "replica.db"
+
+
+async def test_a_lagging_replica_is_skipped(replicated, monkeypatch):
+    await replicated.check_replicas()
+    replicated._replicas[0].replay_position = 5.0
+
+    write_position(monkeypatch, replicated, 10.0)
+    assert await read_from(replicated) == "primary.db"
+    write_position(monkeypatch, replicated, 5.0)
+    assert await read_from(replicated) == "replica.db"
+
+
+async def test_reads_use_the_primary_when_the_write_position_is_unknown(replicated, monkeypatch):
+    await replicated.check_replicas()
+    write_position(monkeypatch, replicated, None)
+
+    assert await read_from(replicated) == "primary.db"
+
+
+@pytest.mark.parametrize("cache_enabled, database", [(True, "primary.db"), (False, "replica.db")])
+async def test_cached_reads_use_replicas_only_without_the_cache(replicated, monkeypatch, cache_enabled, database):
+    await replicated.check_replicas()
+    write_position(monkeypatch, replicated, 10.0)
+    monkeypatch.setattr(dependencies.settings, "RESPONSE_CACHE_ENABLED", cache_enabled)
+
+    async for session in dependencies.get_cached_read_db():
+        assert await served_by(session) == database
@@ -0,0 +1,101 @@
+import pytest
+
+from app.config import storage as storage_module
+from app.config.storage import S3Storage
+
+pytestmark = pytest.mark.anyio
+
+PART_SIZE = 10
+
+
+class S3Stub:
+    """Records the calls made to it, like a boto3 S3 client that always succeeds."""
+
+    def __init__(self, fail: str = None):
+        self.fail = fail
+        self.calls = []
+
+    def __getattr__(self, operation):
+        def call(**kwargs):
+            self.calls.append((operation, kwargs))
+            if operation == self.fail:
+                raise RuntimeError(f"{operation} failed")
+            if operation == "create_multipart_upload":
+                return {"UploadId": "upload-1"}
+            if operation == "upload_part":
+                return {"ETag": f"etag-{kwargs['PartNumber']}"}
+            return {}
+        return call
+
+    def operations(self) -> list[str]:
+        return [operation for operation, _ in self.calls]
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(storage_module, "MULTIPART_PART_SIZE", PART_SIZE)
+    storage = S3Storage("test", max_pool_connections=2)
+    yield storage
+    storage.shutdown()
+
+
+async def chunks(*sizes, fail_after: int = None):
+    for index, size in enumerate(sizes):
+        if index == fail_after:
+            raise ValueError("Profile image is too large")
+        yield b"x" * size
+
+
+async def test_small_object_is_put_in_one_call(s3):
+    s3._client = S3Stub()
+
+    await s3.upload_stream("uploads/1/image", chunks(4, 5), "image/png")
+
+    ((operation, call),) = s3._client.calls
+    assert (operation, call["Key"], call["Body"], call["ContentType"]) == ("put_object", "uploads/1/image", b"x" * 9, "image/png")
+
+
+async def test_large_object_is_uploaded_in_parts(s3):
+    s3._client = S3Stub()
+
+    await s3.upload_stream("uploads/1/image", chunks(6, 6, 6, 7), "image/png")
+
+    assert s3._client.operations() == [
+        "create_multipart_upload", "upload_part", "upload_part", "complete_multipart_upload",
+    ]
+    parts = [call for operation, call in s3._client.calls if operation == "upload_part"]
+    assert [(part["PartNumber"], len(part["Body"])) for part in parts] == [(1, 12), (2, 13)]
+    assert all(part["UploadId"] == "upload-1" for part in parts)
+    _, complete = s3._client.calls[-1]
+    assert complete["MultipartUpload"] == {
+        "Parts": [{"PartNumber": 1, "ETag": "etag-1"}, {"PartNumber": 2, "ETag": "etag-2"}],
+    }
+
+
+async def test_rejected_stream_aborts_the_multipart_upload(s3):
+    s3._client = S3Stub()
+
+    with pytest.raises(ValueError):
+        await s3.upload_stream("uploads/1/image", chunks(12, 4, 4, fail_after=2), "image/png")
+
+    assert s3._client.operations() == ["create_multipart_upload", "upload_part", "abort_multipart_upload"]
+    assert s3._client.calls[-1][1]["UploadId"] == "upload-1"
+
+
+async def test_failed_part_aborts_the_multipart_upload(s3):
+    s3._client = S3Stub(fail="upload_part")
+
+    with pytest.raises(RuntimeError):
+        await s3.upload_stream("uploads/1/image", chunks(12), "image/png")
+
+    assert s3._client.operations() == ["create_multipart_upload", "upload_part", "abort_multipart_upload"]
+    assert s3.stats.operation("upload_part").errors == 1
+
+
+async def test_rejected_single_put_stores_nothing(s3):
+    s3._client = S3Stub()
+
+    with pytest.raises(ValueError):
+        await s3.upload_stream("uploads/1/image", chunks(4, 4, fail_after=1), "image/png")
+
+    assert s3._client.calls == []
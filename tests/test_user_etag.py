@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Response
+from sqlalchemy import update
+
+from app.models.users import User
+from app.routes.users import get_user_info
+
+pytestmark = pytest.mark.anyio
+
+
+async def user_with_image(db, make_users) -> User:
+    (user,) = await make_users(1)
+    # keep edits in the tests from landing in the same second as the insert
+    await db.execute(update(User).values(
+        profile_image="images/avatar.png", updated_at=datetime.utcnow() - timedelta(minutes=1),
+    ))
+    await db.commit()
+    return user
+
+
+async def profile(database, user_id: int, if_none_match: str = None):
+    response = Response()
+    async with database.session() as db:
+        body = await get_user_info(user_id, response, db, bypass=True, if_none_match=if_none_match)
+    return body, response
+
+
+async def test_any_edit_changes_the_profile_etag(database, db, make_users):
+    user = await user_with_image(db, make_users)
+    _, first = await profile(database, user.id)
+
+    # last_name is not part of the profile body, the edit only moves updated_at
+    await db.refresh(user)
+    user.last_name = "edited"
+    await db.commit()
+    body, second = await profile(database, user.id, if_none_match=first.headers["ETag"])
+
+    assert isinstance(body, dict)
+    assert second.headers["ETag"] != first.headers["ETag"]
+
+
+async def test_unchanged_profile_is_not_modified(database, db, make_users):
+    user = await user_with_image(db, make_users)
+    _, first = await profile(database, user.id)
+
+    body, _ = await profile(database, user.id, if_none_match=first.headers["ETag"])
+
+    assert body.status_code == 304
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+from http.cookies import SimpleCookie
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import func, insert, select
+
+from app.models.users import UserToken
+from app.services.tokens import purge_expired_tokens
+from app.services.user import _generate_tokens, get_refresh_token
+
+pytestmark = pytest.mark.anyio
+
+
+def refresh_cookie(response: Response) -> str:
+    return SimpleCookie(response.headers["set-cookie"])["refresh_token"].value
+
+
+async def log_in(db, user) -> str:
+    response = Response()
+    await _generate_tokens(user, db, response)
+    return refresh_cookie(response)
+
+
+async def refresh(database, cookie: str) -> str:
+    response = Response()
+    async with database.session() as db:
+        await get_refresh_token(SimpleNamespace(cookies={"refresh_token": cookie}), response, db)
+    return refresh_cookie(response)
+
+
+async def sessions(database, user_id: int) -> list[str]:
+    """Refresh keys of the user's sessions, ids can be reused once deleted."""
+    async with database.session() as db:
+        keys = await db.execute(select(UserToken.refresh_token).where(UserToken.user_id == user_id))
+        return keys.scalars().all()
+
+
+async def test_refresh_replaces_the_session_and_retires_the_old_token(database, db, make_users):
+    (user,) = await make_users(1)
+    cookie = await log_in(db, user)
+    (first,) = await sessions(database, user.id)
+
+    rotated = await refresh(database, cookie)
+
+    (second,) = await sessions(database, user.id)
+    assert second != first
+    with pytest.raises(HTTPException) as refused:
+        await refresh(database, cookie)
+    assert refused.value.detail == "Invalid refresh token."
+    # the new token keeps working
+    await refresh(database, rotated)
+    assert len(await sessions(database, user.id)) == 1
+
+
+async def test_concurrent_refreshes_with_one_token_open_one_session(database, db, make_users):
+    (user,) = await make_users(1)
+    cookie = await log_in(db, user)
+
+    async def attempt():
+        try:
+            return await refresh(database, cookie)
+        except HTTPException as refused:
+            return refused
+
+    results = await asyncio.gather(attempt(), attempt())
+
+    assert sorted(getattr(result, "status_code", 200) for result in results) == [200, 400]
+    assert len(await sessions(database, user.id)) == 1
+
+
+async def test_logins_beyond_the_cap_end_the_least_recently_used_sessions(database, db, make_users, monkeypatch):
+    (user,) = await make_users(1)
+    monkeypatch.setattr("app.services.tokens.settings.AUTH_MAX_SESSIONS", 2)
+    oldest = await log_in(db, user)
+    await log_in(db, user)
+    await log_in(db, user)
+
+    assert len(await sessions(database, user.id)) == 2
+    with pytest.raises(HTTPException):
+        await refresh(database, oldest)
+
+
+async def test_purge_deletes_expired_tokens_in_batches(database, db, make_users):
+    (user,) = await make_users(1)
+    now = datetime.utcnow()
+    await db.execute(insert(UserToken), [
+        {"user_id": user.id, "access_token": f"a{i}", "refresh_token": f"r{i}",
+         "expires_at": now + timedelta(minutes=-1 if i < 5 else 60)}
+        for i in range(7)
+    ])
+    await db.commit()
+
+    assert await purge_expired_tokens(db, batch_size=2) == 5
+
+    live = await db.execute(select(func.count()).select_from(UserToken))
+    assert live.scalar() == 2